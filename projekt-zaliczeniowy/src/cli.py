@@ -0,0 +1,293 @@
+# src/cli.py
+
+import argparse
+import getpass
+import json
+import os
+import re
+import time
+import numpy as np
+import rasterio
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import cpu_count
+from rasterio.transform import from_bounds
+from typing import Dict, Iterator, List, Optional
+
+from src.core.io.data_writer import open_index_geotiff
+from src.core.io.scene_cache import SceneCache
+from src.core.processing.cpu_single_thread_calculator import calculate_indices
+from src.core.processing.indices import validate_indices
+from src.core.processing.quantization import RESULT_DTYPES, dequantize
+from src.core.processing.streaming import stream_indices_to_geotiff
+
+DEFAULT_INDICES = ("NDVI", "NDMI")
+DEFAULT_CACHE_DIR = "data"
+SUMMARY_FILE = "summary.jsonl"
+# Sceny z manifestu od tylu pikseli są liczone strumieniowo z pliku w cache
+# (okno po oknie) zamiast w całości w pamięci.
+STREAM_ENTRY_PIXELS = 4096 * 4096
+# Hasło do zaszyfrowanych danych logowania (jak w oknie logowania aplikacji);
+# bez tej zmiennej CLI pyta o hasło.
+PASSWORD_ENV = "SENTINEL_CONFIG_PASSWORD"
+
+# Stan procesu roboczego (tworzony raz na proces w `_init_worker`).
+_worker_loader = None
+_worker_cache: Optional[SceneCache] = None
+
+
+def _safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("_") or "scene"
+
+
+class _IndexStats:
+    """Średnia, min, max i udział pikseli z danymi, liczone okno po oknie."""
+
+    def __init__(self):
+        self.total = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values: np.ndarray):
+        values = dequantize(values)
+        finite = values[np.isfinite(values)]
+        self.total += values.size
+        if finite.size:
+            self.count += finite.size
+            self.sum += float(finite.sum(dtype=np.float64))
+            self.min = min(self.min, float(finite.min()))
+            self.max = max(self.max, float(finite.max()))
+
+    def result(self) -> Dict[str, float]:
+        if self.count == 0:
+            return {"valid_fraction": 0.0}
+        return {
+            "mean": self.sum / self.count,
+            "min": self.min,
+            "max": self.max,
+            "valid_fraction": self.count / self.total,
+        }
+
+
+def _read_manifest(path: str) -> Iterator[Dict]:
+    """
+    Manifest JSONL - jedna scena na linię, np.:
+    {"name": "pole_1", "bbox": [20.9, 52.1, 21.0, 52.2], "size": [512, 512],
+     "time_interval": ["2025-05-01", "2025-06-01"], "indices": ["NDVI"]}
+    Pola "name", "indices" i "zoom" są opcjonalne.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            entry = json.loads(line)
+            for field in ("bbox", "size", "time_interval"):
+                if field not in entry:
+                    raise ValueError(f"{path}:{line_no}: brak pola '{field}'.")
+            entry.setdefault("name", f"scene_{line_no:05d}")
+            yield entry
+
+
+def _init_worker(credentials: Optional[tuple], cache_dir: Optional[str]):
+    global _worker_loader, _worker_cache
+    if cache_dir is not None:
+        _worker_cache = SceneCache(cache_dir)
+    if credentials is not None:
+        from sentinelhub import SHConfig
+        from src.core.data_loader.data_loader import SentinelDataLoader
+
+        config = SHConfig()
+        config.sh_client_id, config.sh_client_secret = credentials
+        _worker_loader = SentinelDataLoader(config=config)
+
+
+def _process_file(source: str, output: str, index_types: List[str], result_dtype: str) -> Dict:
+    """
+    Zadanie dla pliku GeoTIFF z cache: wyniki strumieniowane okno po oknie,
+    statystyki liczone z okien w trakcie zapisu (bez ponownego odczytu).
+    """
+    stats = {index_type: _IndexStats() for index_type in index_types}
+
+    def collect(window, results):
+        for index_type, values in zip(index_types, results):
+            stats[index_type].update(values)
+
+    stream_indices_to_geotiff(source, output, index_types, n_jobs=1, result_dtype=result_dtype, on_window=collect)
+    with rasterio.open(output) as dst:
+        width, height = dst.width, dst.height
+    return {
+        "width": width,
+        "height": height,
+        "stats": {index_type: stats[index_type].result() for index_type in index_types},
+    }
+
+
+def _process_entry(entry: Dict, output: str, index_types: List[str], result_dtype: str) -> Dict:
+    """
+    Zadanie dla sceny z manifestu: cache albo API, potem obliczenia i zapis.
+    Sceny od STREAM_ENTRY_PIXELS pikseli są liczone jak pliki (_process_file).
+    """
+    bbox = tuple(entry["bbox"])
+    image_size = tuple(entry["size"])
+    time_interval = tuple(entry["time_interval"])
+    zoom = entry.get("zoom", -1)
+
+    def fetch(*args):
+        if _worker_loader is None:
+            raise RuntimeError("Scena spoza cache, a nie podano danych logowania (--offline).")
+        return _worker_loader.fetch_data(*args)
+
+    width, height = image_size
+    if width * height >= STREAM_ENTRY_PIXELS:
+        # Duża scena: obliczenia strumieniowe z GeoTIFF-u w cache.
+        source = _worker_cache.get_path(bbox, image_size, time_interval, zoom)
+        if source is None:
+            bands = fetch(bbox, image_size, time_interval)
+            if not bands:
+                raise RuntimeError("Nie udało się pobrać danych.")
+            source = _worker_cache.put(bands, bbox, image_size, time_interval, zoom)
+            del bands
+        return _process_file(source, output, index_types, result_dtype)
+
+    bands = _worker_cache.get_or_fetch(bbox, image_size, time_interval, zoom, fetch)
+    if not bands:
+        raise RuntimeError("Nie udało się pobrać danych.")
+    # Piksele bez danych (dataMask == 0) są już NaN/nodata (band_math).
+    results, _ = calculate_indices(bands, index_types, result_dtype)
+    stats = {}
+    for index_type in index_types:
+        stats[index_type] = _IndexStats()
+        stats[index_type].update(results[index_type])
+    with open_index_geotiff(
+        output, width, height, "EPSG:4326", from_bounds(*bbox, width, height), index_types, result_dtype
+    ) as dst:
+        for k, index_type in enumerate(index_types, start=1):
+            dst.write(results[index_type], k)
+    return {
+        "width": width,
+        "height": height,
+        "stats": {index_type: stats[index_type].result() for index_type in index_types},
+    }
+
+
+def _run_task(kind: str, name: str, payload, output: str, index_types: List[str], result_dtype: str) -> Dict:
+    # Wykonywane w procesie roboczym; błędy trafiają do podsumowania, nie przerywają partii.
+    start = time.perf_counter()
+    record = {"name": name, "output": output, "indices": index_types}
+    try:
+        if kind == "file":
+            record["source"] = payload
+            record.update(_process_file(payload, output, index_types, result_dtype))
+        else:
+            record.update(bbox=payload["bbox"], time_interval=payload["time_interval"])
+            record.update(_process_entry(payload, output, index_types, result_dtype))
+        record["status"] = "ok"
+    except Exception as e:
+        record.update(status="error", error=f"{type(e).__name__}: {e}")
+    record["seconds"] = round(time.perf_counter() - start, 4)
+    record["pid"] = os.getpid()
+    return record
+
+
+def _load_credentials() -> tuple:
+    from src.core.auth.credentials_manager import CredentialsManager
+
+    password = os.environ.get(PASSWORD_ENV) or getpass.getpass("Hasło do danych logowania Sentinel Hub: ")
+    credentials = CredentialsManager().load_credentials(password)
+    if credentials is None:
+        raise SystemExit("Nie udało się odczytać danych logowania (złe hasło?).")
+    return credentials.client_id, credentials.client_secret
+
+
+def run_batch(tasks: List[tuple], out_dir: str, workers: int, credentials, cache_dir: str, skip_existing: bool) -> Dict:
+    """
+    Przetwarza zadania (kind, name, payload, indices, dtype) w puli procesów - po
+    jednym pliku na proces, każdy liczony jednowątkowo. Dla wielu małych
+    scen równoległość między plikami skaluje się lepiej niż wewnątrz obrazu.
+    Podsumowanie dopisywane jest do `out_dir/summary.jsonl` na bieżąco.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    summary_path = os.path.join(out_dir, SUMMARY_FILE)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+    start = time.perf_counter()
+    print(f"Batch: {len(tasks)} scenes, {workers} processes -> {out_dir}")
+
+    with open(summary_path, "a", encoding="utf-8") as summary, ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(credentials, cache_dir)
+    ) as executor:
+        futures = []
+        for kind, name, payload, index_types, result_dtype in tasks:
+            output = os.path.join(out_dir, f"{_safe_name(name)}.tif")
+            if skip_existing and os.path.exists(output):
+                counts["skipped"] += 1
+                continue
+            futures.append(executor.submit(_run_task, kind, name, payload, output, index_types, result_dtype))
+        for done, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            counts[record["status"]] += 1
+            summary.write(json.dumps(record, ensure_ascii=False) + "\n")
+            summary.flush()
+            if record["status"] != "ok":
+                print(f"   [{done}/{len(futures)}] {record['name']}: {record['error']}")
+            elif done % 10 == 0 or done == len(futures):
+                print(f"   [{done}/{len(futures)}] done")
+
+    elapsed = time.perf_counter() - start
+    print(
+        f"✅ Batch finished in {elapsed:.1f} s: {counts['ok']} ok, {counts['error']} failed, "
+        f"{counts['skipped']} skipped. Summary: {summary_path}"
+    )
+    return counts
+
+
+def main(argv: List[str] = None):
+    """
+    Wsadowe przetwarzanie scen bez GUI.
+    Uruchom: python -m src.cli manifest sceny.jsonl --out wyniki/
+             python -m src.cli directory data/ --out wyniki/ --indices NDVI SAVI
+    """
+    parser = argparse.ArgumentParser(prog="python -m src.cli", description="Wsadowe obliczanie wskaźników dla wielu scen.")
+    parser.add_argument("mode", choices=["manifest", "directory"], help="źródło scen: manifest JSONL albo katalog GeoTIFF-ów")
+    parser.add_argument("source", help="plik manifestu albo katalog z plikami .tif")
+    parser.add_argument("--out", required=True, help="katalog wyników (GeoTIFF na scenę + summary.jsonl)")
+    parser.add_argument("--indices", nargs="+", default=list(DEFAULT_INDICES), help="wskaźniki lub wyrażenia (domyślne dla manifestu)")
+    parser.add_argument("--dtype", choices=RESULT_DTYPES, default="float32", help="typ wyników (int16/uint8 - skwantyzowane)")
+    parser.add_argument("--workers", type=int, default=cpu_count(), help="liczba procesów (domyślnie wszystkie rdzenie)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="katalog cache scen (tryb manifest)")
+    parser.add_argument("--offline", action="store_true", help="tylko sceny z cache, bez logowania do API")
+    parser.add_argument("--skip-existing", action="store_true", help="pomiń sceny, dla których wynik już istnieje")
+    args = parser.parse_args(argv)
+
+    default_indices = validate_indices(args.indices)
+    credentials = None
+    if args.mode == "directory":
+        files = sorted(
+            (os.path.join(args.source, name) for name in os.listdir(args.source) if name.endswith(".tif")),
+            key=os.path.getsize,
+            reverse=True,  # największe najpierw - równiejsze obciążenie procesów
+        )
+        tasks = [
+            ("file", os.path.splitext(os.path.basename(path))[0], path, default_indices, args.dtype)
+            for path in files
+        ]
+    else:
+        tasks = [
+            ("entry", entry["name"], entry, validate_indices(entry.get("indices", default_indices)), args.dtype)
+            for entry in _read_manifest(args.source)
+        ]
+        if not args.offline:
+            credentials = _load_credentials()
+
+    if not tasks:
+        raise SystemExit("Brak scen do przetworzenia.")
+    cache_dir = args.cache_dir if args.mode == "manifest" else None
+    counts = run_batch(tasks, args.out, max(1, args.workers), credentials, cache_dir, args.skip_existing)
+    raise SystemExit(1 if counts["error"] else 0)
+
+
+if __name__ == "__main__":
+    from multiprocessing import freeze_support
+    freeze_support()
+    main()
@@ -0,0 +1,37 @@
+# src/core/cancellation.py
+
+import threading
+from typing import Optional
+
+
+class OperationCancelled(Exception):
+    """Operacja została przerwana przez CancellationToken."""
+
+
+class CancellationToken:
+    """
+    Flaga anulowania przekazywana w dół potoku (pobieranie, obliczenia,
+    rysowanie). Anulowanie jest kooperacyjne: kod sprawdza token między
+    kafelkami / blokami wierszy / zapytaniami i kończy się wyjątkiem
+    OperationCancelled, sprzątając po sobie w `finally`.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise OperationCancelled()
+
+
+def check_cancelled(token: Optional[CancellationToken]):
+    """Zgłasza OperationCancelled, jeśli (opcjonalny) token został anulowany."""
+    if token is not None:
+        token.raise_if_cancelled()
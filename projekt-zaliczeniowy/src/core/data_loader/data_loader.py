@@ -1,5 +1,7 @@
+import hashlib
 import numpy as np
-from typing import Dict, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Tuple, Optional
 
 from sentinelhub import (
     SentinelHubRequest,
@@ -8,14 +10,22 @@ from sentinelhub import (
     CRS,
     BBox,
     SHConfig,
+    SentinelHubDownloadClient,
 )
 
+from src.core.cancellation import CancellationToken, OperationCancelled, check_cancelled
+
 
 class SentinelDataLoader:
     """
     Handles fetching analytical bands (B04, B08, B11) and the data mask.
     """
 
+    # Limit pikseli (bok) jednego zapytania Process API; większe obszary są
+    # dzielone na siatkę kafelków pobieranych równolegle.
+    MAX_REQUEST_SIZE = 2500
+    MAX_PARALLEL_REQUESTS = 4
+
     EVALSCRIPT_BANDS = """
         //VERSION=3
         function setup() {
@@ -35,46 +45,143 @@ class SentinelDataLoader:
                 "SentinelDataLoader must be initialized with a SHConfig object."
             )
         self.config = config
+        self.data_collection = self._data_collection(config.sh_base_url)
+
+    @staticmethod
+    def _data_collection(base_url: str) -> DataCollection:
+        # Kolekcja ma własny adres usługi, który ma pierwszeństwo przed
+        # SHConfig.sh_base_url - dla innego wdrożenia (lub serwera testowego)
+        # definiujemy jej kopię wskazującą na adres z konfiguracji.
+        collection = DataCollection.SENTINEL2_L2A
+        if base_url.rstrip("/") == collection.service_url.rstrip("/"):
+            return collection
+        suffix = hashlib.md5(base_url.encode()).hexdigest()[:8]
+        return collection.define_from(f"SENTINEL2_L2A_{suffix}", service_url=base_url)
+
+    def _build_request(
+        self,
+        bbox: Tuple[float, float, float, float],
+        image_size: Tuple[int, int],
+        time_interval: Tuple[str, str],
+    ) -> SentinelHubRequest:
+        return SentinelHubRequest(
+            evalscript=self.EVALSCRIPT_BANDS,
+            input_data=[
+                SentinelHubRequest.input_data(
+                    data_collection=self.data_collection,
+                    time_interval=time_interval,
+                    mosaicking_order="leastCC",
+                )
+            ],
+            responses=[
+                SentinelHubRequest.output_response("default", MimeType.TIFF)
+            ],
+            bbox=BBox(bbox=bbox, crs=CRS.WGS84),
+            size=image_size,
+            config=self.config,
+        )
+
+    @staticmethod
+    def plan_tiles(
+        bbox: Tuple[float, float, float, float],
+        image_size: Tuple[int, int],
+        tile_size: int,
+    ) -> List[Tuple[Tuple[float, float, float, float], Tuple[int, int], Tuple[int, int]]]:
+        """
+        Dzieli obszar na siatkę kafelków o boku najwyżej `tile_size` pikseli.
+        Zwraca (bbox kafelka, (szerokość, wysokość), (wiersz, kolumna) lewego
+        górnego piksela w obrazie wynikowym). Granice kafelków leżą na
+        granicach pikseli całego obrazu, więc kafelki sklejają się bez szwów.
+        """
+        west, south, east, north = bbox
+        width, height = image_size
+        pixel_x = (east - west) / width
+        pixel_y = (north - south) / height
+        tiles = []
+        for row in range(0, height, tile_size):
+            tile_h = min(tile_size, height - row)
+            for col in range(0, width, tile_size):
+                tile_w = min(tile_size, width - col)
+                tile_bbox = (
+                    west + col * pixel_x,
+                    north - (row + tile_h) * pixel_y,
+                    west + (col + tile_w) * pixel_x,
+                    north - row * pixel_y,
+                )
+                tiles.append((tile_bbox, (tile_w, tile_h), (row, col)))
+        return tiles
 
     def fetch_data(
         self,
         bbox: Tuple[float, float, float, float],
         image_size: Tuple[int, int],
         time_interval: Tuple[str, str],
+        max_workers: int = None,
+        cancel_token: Optional[CancellationToken] = None,
     ) -> Optional[Dict[str, np.ndarray]]:
         """
         Fetches analytical bands for a given area and time.
+        Areas larger than MAX_REQUEST_SIZE are fetched as a grid of tiles
+        downloaded concurrently (at most `max_workers` at a time) and
+        stitched into one band-sequential buffer.
+        When `cancel_token` is cancelled, tiles that have not started are
+        dropped and OperationCancelled is raised (requests already in
+        flight finish, but their data is discarded).
         """
         try:
-            sentinel_bbox = BBox(bbox=bbox, crs=CRS.WGS84)
+            width, height = image_size
+            if width <= self.MAX_REQUEST_SIZE and height <= self.MAX_REQUEST_SIZE:
+                check_cancelled(cancel_token)
+                print(f"Requesting analytical bands for bbox {bbox}...")
+                bands_data = self._build_request(bbox, image_size, time_interval).get_data()[0]
+                check_cancelled(cancel_token)
+                print("Analytical bands received successfully.")
+                return {
+                    "B04": bands_data[:, :, 0],
+                    "B08": bands_data[:, :, 1],
+                    "B11": bands_data[:, :, 2],
+                    "dataMask": bands_data[:, :, 3],
+                }
 
-            request_bands = SentinelHubRequest(
-                evalscript=self.EVALSCRIPT_BANDS,
-                input_data=[
-                    SentinelHubRequest.input_data(
-                        data_collection=DataCollection.SENTINEL2_L2A,
-                        time_interval=time_interval,
-                        mosaicking_order="leastCC",
-                    )
-                ],
-                responses=[
-                    SentinelHubRequest.output_response("default", MimeType.TIFF)
-                ],
-                bbox=sentinel_bbox,
-                size=image_size,
-                config=self.config,
+            tiles = self.plan_tiles(bbox, image_size, self.MAX_REQUEST_SIZE)
+            max_workers = max_workers or self.MAX_PARALLEL_REQUESTS
+            print(
+                f"Requesting analytical bands for bbox {bbox} as {len(tiles)} tiles "
+                f"({max_workers} concurrent requests)..."
             )
-            
-            print(f"Requesting analytical bands for bbox {bbox}...")
-            bands_data = request_bands.get_data()[0]
-            print("Analytical bands received successfully.")
+            client = SentinelHubDownloadClient(config=self.config)
+
+            def download_tile(tile_bbox, tile_size):
+                # Token sprawdzany przed każdym zapytaniem: po anulowaniu
+                # kolejne kafelki nie zużywają już limitu API.
+                check_cancelled(cancel_token)
+                request = self._build_request(tile_bbox, tile_size, time_interval).download_list[0]
+                return client.download([request], max_threads=1)[0]
+
+            stack = np.empty((4, height, width), dtype=np.uint16)
+            executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="sentinel-tiles")
+            try:
+                futures = {
+                    executor.submit(download_tile, tile_bbox, tile_size): (tile_size, origin)
+                    for tile_bbox, tile_size, origin in tiles
+                }
+                for future in as_completed(futures):
+                    check_cancelled(cancel_token)
+                    (tile_w, tile_h), (row, col) = futures[future]
+                    stack[:, row:row + tile_h, col:col + tile_w] = np.moveaxis(future.result(), -1, 0)
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+            print("Analytical bands received and stitched successfully.")
 
             return {
-                "B04": bands_data[:, :, 0],
-                "B08": bands_data[:, :, 1],
-                "B11": bands_data[:, :, 2],
-                "dataMask": bands_data[:, :, 3],
+                "B04": stack[0],
+                "B08": stack[1],
+                "B11": stack[2],
+                "dataMask": stack[3],
             }
+        except OperationCancelled:
+            print("Sentinel Hub request cancelled.")
+            raise
         except Exception as e:
             print(f"An error occurred while fetching Sentinel Hub data: {e}")
-            raise e
\ No newline at end of file
+            raise e
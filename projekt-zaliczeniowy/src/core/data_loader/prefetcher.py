@@ -0,0 +1,238 @@
+# src/core/data_loader/prefetcher.py
+
+import collections
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.core.cancellation import CancellationToken, OperationCancelled
+from src.core.io.scene_cache import SceneCache
+
+BBox = Tuple[float, float, float, float]
+
+# Ile zapytań do API może wykonać prefetcher w ciągu godziny.
+PREFETCH_REQUESTS_PER_HOUR = 30
+# Prefetch startuje dopiero po tylu sekundach bez ruchu mapy.
+PREFETCH_DELAY_S = 1.5
+# Przewidziane obszary są powiększane o ten współczynnik (przy tej samej
+# rozdzielczości), by pokryć także widoki przesunięte względem przewidywania -
+# cache obsłuży je jako fragment większej sceny.
+PREFETCH_MARGIN = 1.5
+MAX_PREDICTIONS = 3
+# Największy bok (w pikselach) prefetchowanej sceny.
+MAX_PREFETCH_SIZE = 2500
+
+
+def _center(bbox: BBox) -> Tuple[float, float]:
+    west, south, east, north = bbox
+    return (west + east) / 2, (south + north) / 2
+
+
+def _scaled(bbox: BBox, image_size: Tuple[int, int], center: Tuple[float, float], factor: float):
+    west, south, east, north = bbox
+    half_w = (east - west) * factor / 2
+    half_h = (north - south) * factor / 2
+    size = (round(image_size[0] * factor), round(image_size[1] * factor))
+    return (center[0] - half_w, center[1] - half_h, center[0] + half_w, center[1] + half_h), size
+
+
+def predict_viewports(
+    bbox: BBox, image_size: Tuple[int, int], zoom: int, previous: Optional[Tuple[BBox, int]] = None
+) -> List[Tuple[BBox, Tuple[int, int]]]:
+    """
+    Przewiduje kolejne widoki na podstawie poprzedniego widoku:
+    - przybliżenie: nic (obszar jest już w cache jako fragment sceny),
+    - oddalenie: obszar 2x większy wokół środka, w tej samej rozdzielczości,
+    - przesunięcie (lub brak historii): sąsiednie widoki, najpierw w
+      kierunku ruchu, potem po bokach.
+    Zwraca (bbox, rozmiar obrazu) już powiększone o PREFETCH_MARGIN.
+    """
+    west, south, east, north = bbox
+    width, height = east - west, north - south
+    cx, cy = _center(bbox)
+
+    if previous is not None and zoom > previous[1]:
+        return []
+    if previous is not None and zoom < previous[1]:
+        return [_scaled(bbox, image_size, (cx, cy), 2.0 * PREFETCH_MARGIN)]
+
+    dx = dy = 0.0
+    if previous is not None:
+        px, py = _center(previous[0])
+        dx, dy = (cx - px) / width, (cy - py) / height
+    if abs(dx) < 0.1 and abs(dy) < 0.1:
+        # Brak wyraźnego kierunku: cztery sąsiednie widoki.
+        steps = [(1, 0), (-1, 0), (0, 1), (0, -1)]
+    else:
+        sx = (dx > 0) - (dx < 0) if abs(dx) >= 0.1 else 0
+        sy = (dy > 0) - (dy < 0) if abs(dy) >= 0.1 else 0
+        steps = [(sx, sy)]
+        steps += [(sx, 0), (0, sy)] if sx and sy else [(sx - sy, sy + sx), (sx + sy, sy - sx)]
+        steps = [(max(-1, min(1, x)), max(-1, min(1, y))) for x, y in steps]
+    predictions = []
+    for sx, sy in steps[:MAX_PREDICTIONS]:
+        center = (cx + sx * width, cy + sy * height)
+        predictions.append(_scaled(bbox, image_size, center, PREFETCH_MARGIN))
+    return predictions
+
+
+class Prefetcher:
+    """
+    Pobiera w tle (jeden wątek, z niskim priorytetem) obszary, które
+    użytkownik prawdopodobnie pobierze jako następne, i zapisuje je w cache.
+
+    Każde `update_view` zastępuje oczekujące zadania nowymi. Zadania jednej
+    generacji widoku dzielą CancellationToken przekazywany do `fetch`
+    (`fetch(bbox, rozmiar, przedział, cancel_token=...)`); nowy widok go
+    anuluje, więc trwające pobieranie przestaje wysyłać zapytania, a jego
+    wynik nie trafia do cache.
+    Pobieranie czeka, aż mapa przestanie się ruszać, i wstrzymuje się na
+    czas pobierania na żądanie użytkownika (`pause`/`resume`). Liczba zapytań
+    jest ograniczona budżetem na godzinę.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[BBox, Tuple[int, int], Tuple[str, str], CancellationToken], Optional[Dict]],
+        cache: SceneCache,
+        requests_per_hour: int = PREFETCH_REQUESTS_PER_HOUR,
+        delay_s: float = PREFETCH_DELAY_S,
+    ):
+        self.fetch = fetch
+        self.cache = cache
+        self.requests_per_hour = requests_per_hour
+        self.delay_s = delay_s
+        self.enabled = False
+        self._condition = threading.Condition()
+        self._jobs: collections.deque = collections.deque()
+        self._generation = 0
+        self._token = CancellationToken()
+        self._last_update = 0.0
+        self._last_fetched: Optional[Tuple[BBox, int]] = None
+        self._paused = 0
+        self._request_times: collections.deque = collections.deque()
+        self._stats = collections.Counter()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._worker, name="prefetcher", daemon=True)
+        self._thread.start()
+
+    def set_enabled(self, enabled: bool):
+        with self._condition:
+            self.enabled = enabled
+            if not enabled:
+                self._cancel_pending()
+            self._condition.notify_all()
+
+    def _cancel_pending(self):
+        self._stats["cancelled"] += len(self._jobs)
+        self._jobs.clear()
+        self._generation += 1
+        self._token.cancel()
+        self._token = CancellationToken()
+
+    def update_view(
+        self,
+        bbox: BBox,
+        image_size: Tuple[int, int],
+        time_interval: Tuple[str, str],
+        zoom: int,
+        fetched: bool = False,
+    ):
+        """
+        Zgłasza bieżący widok mapy i anuluje poprzednie przewidywania.
+        Kierunek ruchu liczony jest względem ostatnio pobranego widoku;
+        `fetched=True` oznacza, że ten widok właśnie został pobrany.
+        """
+        with self._condition:
+            previous = self._last_fetched
+            if fetched:
+                self._last_fetched = (bbox, zoom)
+            if not self.enabled:
+                return
+            self._cancel_pending()
+            self._last_update = time.monotonic()
+            for predicted_bbox, size in predict_viewports(bbox, image_size, zoom, previous):
+                if max(size) > MAX_PREFETCH_SIZE:
+                    continue
+                self._jobs.append((self._generation, self._token, predicted_bbox, size, time_interval, zoom))
+            self._condition.notify_all()
+
+    def pause(self):
+        """Wstrzymuje prefetch na czas pobierania na żądanie użytkownika."""
+        with self._condition:
+            self._paused += 1
+
+    def resume(self):
+        with self._condition:
+            self._paused = max(0, self._paused - 1)
+            self._condition.notify_all()
+
+    def shutdown(self):
+        with self._condition:
+            self._stopped = True
+            self._jobs.clear()
+            self._token.cancel()
+            self._condition.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        with self._condition:
+            return dict(self._stats, pending=len(self._jobs))
+
+    def _budget_available(self) -> bool:
+        now = time.monotonic()
+        while self._request_times and now - self._request_times[0] > 3600:
+            self._request_times.popleft()
+        return len(self._request_times) < self.requests_per_hour
+
+    def _next_job(self):
+        # Czeka, aż będzie zadanie, mapa się uspokoi, nic nie jest pobierane
+        # na żądanie i zostanie budżet zapytań.
+        with self._condition:
+            while True:
+                if self._stopped:
+                    return None
+                if self._jobs and self.enabled and not self._paused:
+                    quiet_for = time.monotonic() - self._last_update
+                    if quiet_for < self.delay_s:
+                        self._condition.wait(self.delay_s - quiet_for)
+                        continue
+                    if not self._budget_available():
+                        self._stats["over_budget"] += len(self._jobs)
+                        self._jobs.clear()
+                        continue
+                    job = self._jobs.popleft()
+                    if job[0] != self._generation:
+                        continue
+                    return job
+                self._condition.wait()
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            generation, token, bbox, size, time_interval, zoom = job
+            try:
+                if self.cache.covers(bbox, size, time_interval):
+                    with self._condition:
+                        self._stats["already_cached"] += 1
+                    continue
+                with self._condition:
+                    if generation != self._generation:
+                        continue
+                    self._request_times.append(time.monotonic())
+                print(f"⏩ Prefetching {size[0]}x{size[1]} px for bbox {bbox}...")
+                data = self.fetch(bbox, size, time_interval, cancel_token=token)
+                token.raise_if_cancelled()
+                if data:
+                    self.cache.put(data, bbox, size, time_interval, zoom)
+                    with self._condition:
+                        self._stats["fetched"] += 1
+            except OperationCancelled:
+                # Widok się zmienił - to zwykły koniec zadania, nie błąd.
+                with self._condition:
+                    self._stats["cancelled"] += 1
+            except Exception as e:
+                with self._condition:
+                    self._stats["failed"] += 1
+                print(f"Prefetch failed for bbox {bbox}: {e}")
@@ -1,21 +1,102 @@
 # src/core/io/data_reader.py
+import os
 import numpy as np
 import rasterio
-from typing import Dict
+from rasterio.enums import Resampling
+from rasterio.windows import Window, from_bounds
+from typing import Dict, Sequence, Tuple
 
+# Kolejność pasm w plikach GeoTIFF zapisywanych przez data_writer.
+GEOTIFF_BANDS = ("B04", "B08", "B11", "dataMask")
+SIDECAR_SUFFIX = ".bands.npy"
 
-def read_geotiff_bands(filepath: str) -> Dict[str, np.ndarray]:
+
+def sidecar_path(filepath: str) -> str:
+    """Ścieżka surowej kopii pasm (.npy, pasmo po paśmie) obok pliku GeoTIFF."""
+    return os.path.splitext(filepath)[0] + SIDECAR_SUFFIX
+
+
+def _split_bands(stack: np.ndarray) -> Dict[str, np.ndarray]:
+    return {name: stack[k] for k, name in enumerate(GEOTIFF_BANDS)}
+
+
+def _check_out(out: np.ndarray, shape: tuple, dtype: np.dtype):
+    if out.shape != shape or out.dtype != dtype or not out.flags.c_contiguous:
+        raise ValueError(f"Buffer 'out' must be a contiguous {dtype} array of shape {shape}.")
+
+
+def read_geotiff_bands(
+    filepath: str,
+    out: np.ndarray = None,
+    use_sidecar: bool = True,
+) -> Dict[str, np.ndarray]:
     """
     ZMIANA: Odczytuje 4 pasma z GeoTIFF, w tym dataMask.
+
+    Wszystkie pasma są czytane jednym wywołaniem do jednego bufora
+    (pasmo, y, x) - można go podać jako `out`. Jeśli obok pliku istnieje
+    aktualna kopia .npy, jest ona mapowana do pamięci (`np.memmap`) zamiast
+    dekodowania GeoTIFF (kopię tworzy data_writer.save_band_sidecar).
+    Zwracane pasma są widokami bufora - przy mapowaniu bez `out` tylko do
+    odczytu; z `out` zmapowana kopia jest do niego kopiowana.
     """
+    sidecar = sidecar_path(filepath)
+    if use_sidecar and os.path.exists(sidecar) and os.path.getmtime(sidecar) >= os.path.getmtime(filepath):
+        print(f"📖 Mapping cached bands from: {sidecar}")
+        stack = np.load(sidecar, mmap_mode="r")
+        if out is None:
+            return _split_bands(stack)
+        _check_out(out, stack.shape, stack.dtype)
+        np.copyto(out, stack)
+        return _split_bands(out)
+
     print(f"📖 Reading data from cached file: {filepath}")
-    with rasterio.open(filepath) as src:
-        # Zakładamy, że zapisaliśmy pasma w tej kolejności
-        bands = {
-            "B04": src.read(1),
-            "B08": src.read(2),
-            "B11": src.read(3),
-            # ZMIANA: Odczytujemy dataMask z 4. pasma
-            "dataMask": src.read(4)
-        }
-        return bands
\ No newline at end of file
+    # NUM_THREADS: równoległa dekompresja kafelków (GDAL >= 3.6).
+    with rasterio.open(filepath, NUM_THREADS="ALL_CPUS") as src:
+        shape = (len(GEOTIFF_BANDS), src.height, src.width)
+        dtype = np.dtype(src.dtypes[0])
+        if out is None:
+            out = np.empty(shape, dtype=dtype)
+        else:
+            _check_out(out, shape, dtype)
+        # Zakładamy, że zapisaliśmy pasma w kolejności GEOTIFF_BANDS
+        src.read(list(range(1, len(GEOTIFF_BANDS) + 1)), out=out)
+    return _split_bands(out)
+
+
+def read_geotiff_window(
+    src: rasterio.DatasetReader, window: Window, band_names: Sequence[str] = GEOTIFF_BANDS
+) -> Dict[str, np.ndarray]:
+    """
+    Odczytuje wybrane pasma z jednego okna otwartego pliku GeoTIFF
+    jednym wywołaniem `read` (pasma są widokami jednej tablicy).
+    """
+    indexes = [GEOTIFF_BANDS.index(name) + 1 for name in band_names]
+    stack = src.read(indexes, window=window)
+    return {name: stack[k] for k, name in enumerate(band_names)}
+
+
+def read_geotiff_region(
+    filepath: str, bounds: Tuple[float, float, float, float], size: Tuple[int, int]
+) -> Dict[str, np.ndarray]:
+    """
+    Odczytuje fragment `bounds` (west, south, east, north) pliku GeoTIFF,
+    przeskalowany do `size` (szerokość, wysokość). Pasma są uśredniane
+    przy zmniejszaniu (GDAL korzysta wtedy z podglądów), a dataMask
+    próbkowany metodą najbliższego sąsiada, by zachować wartości 0/1.
+    """
+    print(f"📖 Reading region {bounds} from cached file: {filepath}")
+    width, height = size
+    n_bands = len(GEOTIFF_BANDS) - 1
+    with rasterio.open(filepath, NUM_THREADS="ALL_CPUS") as src:
+        stack = np.empty((len(GEOTIFF_BANDS), height, width), dtype=src.dtypes[0])
+        window = from_bounds(*bounds, transform=src.transform)
+        downsampling = window.width > width or window.height > height
+        src.read(
+            list(range(1, n_bands + 1)),
+            window=window,
+            out=stack[:n_bands],
+            resampling=Resampling.average if downsampling else Resampling.bilinear,
+        )
+        src.read(len(GEOTIFF_BANDS), window=window, out=stack[n_bands], resampling=Resampling.nearest)
+    return _split_bands(stack)
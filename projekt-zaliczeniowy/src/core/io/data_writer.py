@@ -1,15 +1,86 @@
 # src/core/io/data_writer.py
+import contextlib
+import os
+import tempfile
 import numpy as np
 import rasterio
+from rasterio.enums import Resampling
 from rasterio.transform import from_bounds
 
+from src.core.io.data_reader import GEOTIFF_BANDS, sidecar_path
+from src.core.processing.quantization import QUANTIZED_FORMATS, validate_result_dtype
+
+# Format plików cache: kafelkowany GeoTIFF z bezstratną kompresją
+# (predyktor poziomy) i wewnętrznymi podglądami (overviews).
+CACHE_CODECS = ("deflate", "lzw", "zstd")
+CACHE_CODEC = "zstd"
+CACHE_BLOCK_SIZE = 256
+# Podglądy są tworzone, dopóki mniejszy bok ma co najmniej tyle pikseli.
+MIN_OVERVIEW_SIZE = 256
+# Rozszerzenie plików tymczasowych (pomijanych przez indeksy cache).
+TMP_SUFFIX = ".tmp"
+
+
+def _read_umask() -> int:
+    # umask można odczytać tylko, ustawiając go - od razu przywracamy. Czytany
+    # raz, przy imporcie: chwilowa zmiana w jednym wątku dotyczyłaby plików
+    # tworzonych w tym czasie przez inne.
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+# Uprawnienia plików po atomic_output - jak przy zwykłym open(), nie 0600 z mkstemp.
+OUTPUT_FILE_MODE = 0o666 & ~_read_umask()
+
+
+@contextlib.contextmanager
+def atomic_output(filepath: str):
+    """
+    Zwraca unikalną ścieżkę tymczasową w katalogu `filepath`; po udanym
+    zapisie plik jest podmieniany atomowo (os.replace), po błędzie usuwany.
+    Czytelnik widzi więc stary plik albo kompletny nowy - nigdy częściowy.
+    Plik dostaje zwykłe uprawnienia (0666 z umask), a nie 0600 z mkstemp.
+    """
+    directory, name = os.path.split(os.path.abspath(filepath))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{name}.", suffix=TMP_SUFFIX, dir=directory)
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.chmod(tmp_path, OUTPUT_FILE_MODE)
+        os.replace(tmp_path, filepath)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def overview_factors(width: int, height: int) -> list[int]:
+    """Zwraca współczynniki podglądów (2, 4, 8, ...) dla danego rozmiaru."""
+    factors = []
+    factor = 2
+    while min(width, height) // factor >= MIN_OVERVIEW_SIZE:
+        factors.append(factor)
+        factor *= 2
+    return factors
+
 
 def save_bands_to_geotiff(
-    bands: dict[str, np.ndarray], bbox: tuple, filepath: str
+    bands: dict[str, np.ndarray],
+    bbox: tuple,
+    filepath: str,
+    codec: str | None = CACHE_CODEC,
+    overviews: bool = True,
 ):
     """
     ZMIANA: Zapisuje 4 pasma (B04, B08, B11, dataMask) do GeoTIFF.
+    Plik jest kafelkowany i kompresowany bezstratnie kodekiem `codec`
+    ("deflate", "lzw", "zstd" lub None - bez kompresji), z podglądami
+    do szybkiego wyświetlania w mniejszej skali. Plik jest zapisywany
+    obok i podmieniany atomowo (atomic_output).
     """
+    if codec is not None and codec not in CACHE_CODECS:
+        raise ValueError(f"Unsupported cache codec: {codec}. Use one of {CACHE_CODECS} or None.")
     # ZMIANA: Wymagamy teraz również dataMask
     required_bands = ["B04", "B08", "B11", "dataMask"]
     if not all(b in bands for b in required_bands):
@@ -23,11 +94,14 @@ def save_bands_to_geotiff(
     # ZMIANA: Liczba pasm to teraz 4
     count = len(required_bands)
 
+    # Predyktor poziomy: 2 dla liczb całkowitych, 3 dla zmiennoprzecinkowych.
+    predictor = 2 if np.issubdtype(dtype, np.integer) else 3
+
     west, south, east, north = bbox
     transform = from_bounds(west, south, east, north, width, height)
 
-    with rasterio.open(
-        filepath,
+    with atomic_output(filepath) as tmp_path, rasterio.open(
+        tmp_path,
         "w",
         driver="GTiff",
         height=height,
@@ -36,6 +110,11 @@ def save_bands_to_geotiff(
         dtype=dtype,
         crs="EPSG:4326",
         transform=transform,
+        tiled=True,
+        blockxsize=CACHE_BLOCK_SIZE,
+        blockysize=CACHE_BLOCK_SIZE,
+        interleave="band",
+        **({"compress": codec, "predictor": predictor} if codec else {}),
     ) as dst:
         dst.write(bands["B04"], 1)
         dst.write(bands["B08"], 2)
@@ -48,4 +127,71 @@ def save_bands_to_geotiff(
         dst.set_band_description(3, "B11 - SWIR")
         dst.set_band_description(4, "dataMask")
 
-    print(f"💾 Data successfully saved to: {filepath}")
\ No newline at end of file
+        factors = overview_factors(width, height)
+        if overviews and factors:
+            # Najbliższy sąsiad zachowuje wartości dataMask (0/1).
+            dst.build_overviews(factors, Resampling.nearest)
+            dst.update_tags(ns="rio_overview", resampling="nearest")
+
+    print(f"💾 Data successfully saved to: {filepath}")
+
+
+def save_band_sidecar(bands: dict[str, np.ndarray] | np.ndarray, filepath: str) -> str:
+    """
+    Zapisuje obok pliku GeoTIFF `filepath` surową kopię pasm (.npy,
+    pasmo po paśmie), którą read_geotiff_bands mapuje do pamięci zamiast
+    dekodować GeoTIFF. Plik jest podmieniany atomowo.
+    """
+    if isinstance(bands, dict):
+        stack = np.stack([bands[name] for name in GEOTIFF_BANDS])
+    else:
+        stack = bands
+    path = sidecar_path(filepath)
+    with atomic_output(path) as tmp_path:
+        with open(tmp_path, "wb") as f:
+            np.save(f, stack)
+    return path
+
+
+def open_index_geotiff(
+    filepath: str,
+    width: int,
+    height: int,
+    crs,
+    transform,
+    index_types: list[str],
+    result_dtype: str = "float32",
+) -> rasterio.io.DatasetWriter:
+    """
+    Otwiera do zapisu plik GeoTIFF na wyniki wskaźników (jedno pasmo
+    float32 na wskaźnik, NaN jako brak danych). Plik jest kafelkowany,
+    więc okna wyników można zapisywać w dowolnej kolejności.
+
+    Dla `result_dtype` "int16"/"uint8" pasma przechowują wyniki
+    skwantyzowane, a skala i przesunięcie trafiają do metadanych pasm,
+    więc GDAL/QGIS odczytują z nich wartości wskaźnika.
+    """
+    dtype = validate_result_dtype(result_dtype)
+    fmt = QUANTIZED_FORMATS.get(result_dtype)
+    dst = rasterio.open(
+        filepath,
+        "w",
+        driver="GTiff",
+        height=height,
+        width=width,
+        count=len(index_types),
+        dtype=dtype,
+        crs=crs,
+        transform=transform,
+        nodata=float("nan") if fmt is None else fmt["nodata"],
+        tiled=True,
+        blockxsize=256,
+        blockysize=256,
+        BIGTIFF="IF_SAFER",
+    )
+    for k, index_type in enumerate(index_types, start=1):
+        dst.set_band_description(k, index_type)
+    if fmt is not None:
+        dst.scales = (fmt["scale"],) * len(index_types)
+        dst.offsets = (-fmt["zero"] * fmt["scale"],) * len(index_types)
+    return dst
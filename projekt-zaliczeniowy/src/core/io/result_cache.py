@@ -0,0 +1,240 @@
+# src/core/io/result_cache.py
+
+import collections
+import hashlib
+import os
+import threading
+import numpy as np
+import rasterio
+from concurrent.futures import ThreadPoolExecutor
+from rasterio.transform import from_bounds
+from typing import Dict, Optional, Tuple
+
+from src.core.io.data_writer import CACHE_BLOCK_SIZE, CACHE_CODEC, atomic_output
+from src.core.processing.indices import resolve_expression
+from src.core.processing.quantization import QUANTIZED_FORMATS, quantize, quantized_format
+from src.core.processing.shared_result import SharedResult
+
+RESULTS_SUBDIR = "results"
+DEFAULT_MEMORY_BYTES = 512 * 1024 ** 2
+DEFAULT_DISK_BYTES = 1024 ** 3
+# Wyniki float32 są zapisywane na dysku skwantyzowane liniowo do int16
+# (zakres wartości pasma -> [-32767, 32767]); -32768 oznacza brak danych.
+# Wyniki już skwantyzowane (int16/uint8 z backendu) zapisywane są bez zmian.
+QUANTIZED_DTYPE = np.int16
+QUANTIZED_NODATA = -32768
+_QUANTIZED_MAX = 32767
+
+ResultKey = Tuple[str, str, str]
+
+
+def quantize_to_range(values: np.ndarray) -> Tuple[np.ndarray, float, float]:
+    """
+    Kwantyzuje wynik do int16. Zwraca (dane, scale, offset), przy czym
+    wartość = dane * scale + offset; NaN i ±inf zapisywane są jako nodata.
+    """
+    finite = np.isfinite(values)
+    if not finite.any():
+        return np.full(values.shape, QUANTIZED_NODATA, dtype=QUANTIZED_DTYPE), 1.0, 0.0
+    low, high = float(values[finite].min()), float(values[finite].max())
+    offset = (low + high) / 2
+    scale = (high - low) / (2 * _QUANTIZED_MAX) or 1.0
+    quantized = np.full(values.shape, QUANTIZED_NODATA, dtype=QUANTIZED_DTYPE)
+    quantized[finite] = np.rint((values[finite] - offset) / scale)
+    return quantized, scale, offset
+
+
+def read_scaled_band(src: rasterio.io.DatasetReader) -> np.ndarray:
+    """Czyta pasmo 1 jako float32: dane * scale + offset, NaN dla nodata."""
+    quantized = src.read(1)
+    values = quantized.astype(np.float32) * np.float32(src.scales[0]) + np.float32(src.offsets[0])
+    if src.nodata is not None:
+        values[quantized == src.nodata] = np.nan
+    return values
+
+
+def read_result_band(src: rasterio.io.DatasetReader, precision: str) -> np.ndarray:
+    """
+    Czyta wynik w typie `precision` z klucza - tym samym, który zwraca
+    poziom RAM i kalkulatory. Wynik int16/uint8 zapisany w swoim formacie
+    jest zwracany bez przeliczania; float32 jest odtwarzany ze skali pasma.
+    """
+    fmt = QUANTIZED_FORMATS.get(precision)
+    if fmt is not None and np.dtype(src.dtypes[0]) == fmt["dtype"]:
+        return src.read(1)
+    values = read_scaled_band(src)
+    return values if fmt is None else quantize(values, precision)
+
+
+def _release(result) -> None:
+    """
+    Zwalnia segment wyniku, który wypadł z RAM. Nazwa segmentu znika od razu,
+    a widoki trzymane jeszcze przez konsumentów (wyświetlany wynik, zapis
+    w tle) pozostają ważne - mapowanie jest zamykane, gdy znikną.
+    """
+    if isinstance(result, SharedResult):
+        result.close()
+
+
+class ResultCache:
+    """
+    Dwupoziomowa pamięć podręczna obliczonych wskaźników, z kluczem
+    (klucz sceny z SceneCache, wyrażenie wskaźnika, precyzja/typ wyniku).
+
+    - Poziom 1: pamięć RAM, LRU z limitem `max_memory_bytes`.
+    - Poziom 2: skwantyzowane (int16/uint8), skompresowane GeoTIFF-y w podkatalogu
+      cache scen, LRU (wg czasu modyfikacji) z limitem `max_disk_bytes`.
+      Zapis na dysk odbywa się w tle.
+
+    Wyniki SharedResult są własnością cache: segment jest zwalniany, gdy wynik
+    wypadnie z RAM, a `get` zwraca zwykły widok tablicy.
+
+    Wyrażenie jest rozwijane z nazwy wskaźnika, więc "NDVI" i jego
+    wyrażenie wpisane ręcznie dzielą wpis.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        max_memory_bytes: int = DEFAULT_MEMORY_BYTES,
+        max_disk_bytes: int = DEFAULT_DISK_BYTES,
+    ):
+        self.results_dir = os.path.join(cache_dir, RESULTS_SUBDIR)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        os.makedirs(self.results_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._memory: "collections.OrderedDict[ResultKey, np.ndarray]" = collections.OrderedDict()
+        self._memory_bytes = 0
+        self._stats = collections.Counter()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="result-cache")
+
+    @staticmethod
+    def make_key(scene_key: str, index_type: str, precision: str = "float32") -> ResultKey:
+        return scene_key, resolve_expression(index_type).strip(), precision
+
+    def _path(self, key: ResultKey) -> str:
+        scene_key, expression, precision = key
+        digest = hashlib.md5(f"{expression}-{precision}".encode()).hexdigest()
+        return os.path.join(self.results_dir, f"{scene_key}_{digest}.tif")
+
+    def get(self, key: ResultKey) -> Optional[np.ndarray]:
+        """Zwraca wynik z RAM, z dysku (i przenosi go do RAM) albo None."""
+        with self._lock:
+            result = self._memory.get(key)
+            if result is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return np.asarray(result)
+
+        path = self._path(key)
+        try:
+            with rasterio.open(path) as src:
+                result = read_result_band(src, key[2])
+            os.utime(path)
+        except (rasterio.errors.RasterioIOError, OSError):
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        with self._lock:
+            self._stats["disk_hits"] += 1
+            self._remember(key, result)
+        return result
+
+    def put(self, key: ResultKey, result: np.ndarray, bbox: tuple):
+        """Zapisuje wynik w RAM i (w tle) na dysku."""
+        with self._lock:
+            self._remember(key, result)
+        self._writer.submit(self._write, key, np.asarray(result), bbox)
+
+    def _remember(self, key: ResultKey, result: np.ndarray):
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= np.asarray(previous).nbytes
+            if previous is not result:
+                _release(previous)
+        self._memory[key] = result
+        self._memory_bytes += np.asarray(result).nbytes
+        while self._memory_bytes > self.max_memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= np.asarray(evicted).nbytes
+            self._stats["memory_evictions"] += 1
+            _release(evicted)
+
+    def _write(self, key: ResultKey, result: np.ndarray, bbox: tuple):
+        path = self._path(key)
+        height, width = result.shape
+        fmt = quantized_format(result.dtype)
+        if fmt is None:
+            quantized, scale, offset = quantize_to_range(result)
+            nodata = QUANTIZED_NODATA
+        else:
+            quantized, scale, offset = result, fmt["scale"], -fmt["zero"] * fmt["scale"]
+            nodata = fmt["nodata"]
+        try:
+            with atomic_output(path) as tmp_path, rasterio.open(
+                tmp_path,
+                "w",
+                driver="GTiff",
+                height=height,
+                width=width,
+                count=1,
+                dtype=quantized.dtype,
+                crs="EPSG:4326",
+                transform=from_bounds(*bbox, width, height),
+                nodata=nodata,
+                tiled=True,
+                blockxsize=CACHE_BLOCK_SIZE,
+                blockysize=CACHE_BLOCK_SIZE,
+                compress=CACHE_CODEC,
+                predictor=2,
+            ) as dst:
+                dst.write(quantized, 1)
+                dst.scales = (scale,)
+                dst.offsets = (offset,)
+                dst.set_band_description(1, key[1])
+            self._evict_disk(keep=path)
+        except Exception as e:
+            print(f"Nie udało się zapisać wyniku w cache {path}: {e}")
+
+    def _evict_disk(self, keep: str):
+        entries = [
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in os.scandir(self.results_dir)
+            if entry.name.endswith(".tif")
+        ]
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_disk_bytes:
+                break
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            with self._lock:
+                self._stats["disk_evictions"] += 1
+
+    def flush(self):
+        """Czeka na zakończenie zapisów w tle."""
+        self._writer.submit(lambda: None).result()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict.fromkeys(("memory_hits", "disk_hits", "misses", "memory_evictions", "disk_evictions"), 0)
+            stats.update(self._stats)
+            stats.update(memory_entries=len(self._memory), memory_bytes=self._memory_bytes)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_rate"] = hits / lookups if lookups else 0.0
+        return stats
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (
+            f"wyniki: trafienia {s['memory_hits']} (RAM) + {s['disk_hits']} (dysk)/"
+            f"{s['memory_hits'] + s['disk_hits'] + s['misses']} ({s['hit_rate']:.0%}), "
+            f"RAM {s['memory_bytes'] / 1024 ** 2:.0f}/{self.max_memory_bytes / 1024 ** 2:.0f} MB"
+        )
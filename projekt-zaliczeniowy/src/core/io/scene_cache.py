@@ -0,0 +1,378 @@
+# src/core/io/scene_cache.py
+
+import contextlib
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+import rasterio
+from typing import Dict, Iterator, List, Optional
+
+from src.core.io.data_reader import read_geotiff_bands, read_geotiff_region, sidecar_path
+from src.core.io.data_writer import TMP_SUFFIX, save_band_sidecar, save_bands_to_geotiff
+
+INDEX_FILE = "cache_index.sqlite"
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+# Scena z cache może obsłużyć mniejszy obszar, jeśli jej piksel jest
+# najwyżej o tyle większy od żądanego (względnie).
+RESOLUTION_TOLERANCE = 0.05
+# Pliki tymczasowe starsze niż to zostały po przerwanym zapisie (inny
+# proces może właśnie zapisywać świeży plik, więc nowszych nie ruszamy).
+STALE_TMP_AGE_S = 3600
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenes (
+    key TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    west REAL NOT NULL,
+    south REAL NOT NULL,
+    east REAL NOT NULL,
+    north REAL NOT NULL,
+    time_from TEXT NOT NULL,
+    time_to TEXT NOT NULL,
+    width INTEGER NOT NULL,
+    height INTEGER NOT NULL,
+    zoom INTEGER NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scenes_last_access ON scenes (last_access);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+"""
+# Indeks przestrzenny (R-tree) nad bbox scen; id = rowid w tabeli scenes.
+_RTREE_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS scenes_rtree USING rtree (id, min_x, max_x, min_y, max_y);
+INSERT INTO scenes_rtree
+    SELECT rowid, west, east, south, north FROM scenes
+    WHERE rowid NOT IN (SELECT id FROM scenes_rtree);
+"""
+_STAT_NAMES = ("hits", "spatial_hits", "misses", "evictions", "evicted_bytes")
+
+
+class SceneCache:
+    """
+    Pamięć podręczna pobranych scen w katalogu `cache_dir` z indeksem
+    SQLite (bbox, przedział czasu, rozmiar obrazu, rozmiar na dysku,
+    ostatni dostęp). Łączny rozmiar plików jest ograniczony do `max_bytes`;
+    po przekroczeniu usuwane są najdawniej używane sceny (LRU).
+    Liczniki trafień, chybień i usunięć są zapisywane w indeksie.
+
+    `use_sidecars` - przy ponownym odczycie sceny obok GeoTIFF-u zapisywana
+    jest surowa kopia pasm (.npy), mapowana potem do pamięci. Kopia powstaje
+    dopiero przy pierwszym trafieniu, więc sceny czytane raz (np. z prefetchu
+    albo wsadowo) zajmują na dysku tylko skompresowany GeoTIFF.
+    """
+
+    def __init__(self, cache_dir: str, max_bytes: int = DEFAULT_MAX_BYTES, use_sidecars: bool = False):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.use_sidecars = use_sidecars
+        self.index_path = os.path.join(cache_dir, INDEX_FILE)
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+        with self._transaction() as db:
+            db.executescript(_SCHEMA)
+            try:
+                db.executescript(_RTREE_SCHEMA)
+                self._has_rtree = True
+            except sqlite3.OperationalError:
+                # SQLite bez modułu R-tree: wyszukiwanie po kolumnach bbox.
+                self._has_rtree = False
+            db.executemany(
+                "INSERT OR IGNORE INTO stats (name, value) VALUES (?, 0)",
+                [(name,) for name in _STAT_NAMES],
+            )
+            self._adopt_untracked(db)
+            self._evict(db)
+
+    @contextlib.contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        # Jedno połączenie na operację: cache jest używany z wątków roboczych.
+        with self._lock:
+            db = sqlite3.connect(self.index_path, timeout=30)
+            try:
+                with db:
+                    yield db
+            finally:
+                db.close()
+
+    @staticmethod
+    def make_key(bbox: tuple, image_size: tuple, time_interval: tuple, zoom: int) -> str:
+        request_string = f"{bbox}-{image_size}-{time_interval}-{zoom}"
+        return hashlib.md5(request_string.encode()).hexdigest()
+
+    def _files(self, path: str) -> List[str]:
+        return [f for f in (path, sidecar_path(path)) if os.path.exists(f)]
+
+    def _disk_size(self, path: str) -> int:
+        return sum(os.path.getsize(f) for f in self._files(path))
+
+    def _bump(self, db: sqlite3.Connection, name: str, amount: int = 1):
+        db.execute("UPDATE stats SET value = value + ? WHERE name = ?", (amount, name))
+
+    def _delete(self, db: sqlite3.Connection, key: str):
+        row = db.execute("SELECT rowid FROM scenes WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return
+        if self._has_rtree:
+            db.execute("DELETE FROM scenes_rtree WHERE id = ?", row)
+        db.execute("DELETE FROM scenes WHERE key = ?", (key,))
+
+    def _register(
+        self, db, key: str, path: str, bbox: tuple, image_size: tuple, time_interval: tuple, zoom: int
+    ):
+        now = time.time()
+        west, south, east, north = bbox
+        width, height = image_size
+        self._delete(db, key)
+        cursor = db.execute(
+            "INSERT INTO scenes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key, path, west, south, east, north, str(time_interval[0]), str(time_interval[1]),
+                width, height, zoom, self._disk_size(path), now, now,
+            ),
+        )
+        if self._has_rtree:
+            db.execute(
+                "INSERT INTO scenes_rtree VALUES (?, ?, ?, ?, ?)",
+                (cursor.lastrowid, west, east, south, north),
+            )
+
+    def _find_covering(
+        self, db: sqlite3.Connection, bbox: tuple, image_size: tuple, time_interval: tuple
+    ) -> Optional[tuple]:
+        """
+        Szuka sceny z tego samego przedziału czasu, która zawiera `bbox`
+        i ma piksel nie większy (z tolerancją) niż żądany. Spośród pasujących
+        wybiera tę o największym pikselu - do odczytu jest najmniej danych.
+        """
+        west, south, east, north = bbox
+        width, height = image_size
+        columns = "s.key, s.path, s.west, s.south, s.east, s.north, s.width, s.height"
+        if self._has_rtree:
+            query = (
+                f"SELECT {columns} FROM scenes_rtree r JOIN scenes s ON s.rowid = r.id "
+                "WHERE r.min_x <= ? AND r.max_x >= ? AND r.min_y <= ? AND r.max_y >= ? "
+                "AND s.time_from = ? AND s.time_to = ?"
+            )
+        else:
+            query = (
+                f"SELECT {columns} FROM scenes s "
+                "WHERE s.west <= ? AND s.east >= ? AND s.south <= ? AND s.north >= ? "
+                "AND s.time_from = ? AND s.time_to = ?"
+            )
+        rows = db.execute(
+            query, (west, east, south, north, str(time_interval[0]), str(time_interval[1]))
+        ).fetchall()
+
+        wanted_x = (east - west) / width
+        wanted_y = (north - south) / height
+        best, best_pixel = None, 0.0
+        for row in rows:
+            _, path, c_west, c_south, c_east, c_north, c_width, c_height = row
+            pixel_x = (c_east - c_west) / c_width
+            pixel_y = (c_north - c_south) / c_height
+            if pixel_x > wanted_x * (1 + RESOLUTION_TOLERANCE) or pixel_y > wanted_y * (1 + RESOLUTION_TOLERANCE):
+                continue
+            if not os.path.exists(path):
+                continue
+            if pixel_x * pixel_y > best_pixel:
+                best, best_pixel = row, pixel_x * pixel_y
+        return best
+
+    def _adopt_untracked(self, db: sqlite3.Connection):
+        # Pliki zapisane przed wprowadzeniem indeksu: metadane z pliku,
+        # przedział czasu i zoom są uzupełniane przy pierwszym trafieniu.
+        known = {row[0] for row in db.execute("SELECT key FROM scenes")}
+        for name in os.listdir(self.cache_dir):
+            key, ext = os.path.splitext(name)
+            if ext == TMP_SUFFIX:
+                self._remove_stale_tmp(os.path.join(self.cache_dir, name))
+                continue
+            if ext != ".tif" or key in known:
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                with rasterio.open(path) as src:
+                    bbox, image_size = tuple(src.bounds), (src.width, src.height)
+            except Exception as e:
+                print(f"Pomijam nieczytelny plik cache {path}: {e}")
+                continue
+            self._register(db, key, path, bbox, image_size, ("", ""), -1)
+            db.execute("UPDATE scenes SET last_access = ? WHERE key = ?", (os.path.getmtime(path), key))
+
+    @staticmethod
+    def _remove_stale_tmp(path: str):
+        try:
+            if time.time() - os.path.getmtime(path) > STALE_TMP_AGE_S:
+                os.remove(path)
+        except OSError:
+            pass
+
+    def _exact_hit(
+        self, db: sqlite3.Connection, key: str, path: str, bbox: tuple, image_size: tuple, time_interval: tuple, zoom: int
+    ) -> bool:
+        """Czy dokładnie ta scena jest w cache; trafienie jest liczone i odświeżane (LRU)."""
+        row = db.execute("SELECT path FROM scenes WHERE key = ?", (key,)).fetchone()
+        if row is None and os.path.exists(path):
+            # Plik spoza indeksu (np. skopiowany ręcznie) - dopisujemy go.
+            self._register(db, key, path, bbox, image_size, time_interval, zoom)
+        elif row is not None and not os.path.exists(row[0]):
+            self._delete(db, key)
+            row = None
+        if row is None and not os.path.exists(path):
+            return False
+        self._bump(db, "hits")
+        db.execute(
+            "UPDATE scenes SET last_access = ?, time_from = ?, time_to = ?, zoom = ? WHERE key = ?",
+            (time.time(), str(time_interval[0]), str(time_interval[1]), zoom, key),
+        )
+        return True
+
+    def get_path(self, bbox: tuple, image_size: tuple, time_interval: tuple, zoom: int) -> Optional[str]:
+        """
+        Zwraca ścieżkę pliku GeoTIFF dokładnie tej sceny albo None (chybienie) -
+        do strumieniowania dużych scen bez wczytywania ich do pamięci.
+        Wycinki większych scen nie są tu brane pod uwagę.
+        """
+        key = self.make_key(bbox, image_size, time_interval, zoom)
+        path = os.path.join(self.cache_dir, f"{key}.tif")
+        with self._transaction() as db:
+            if self._exact_hit(db, key, path, bbox, image_size, time_interval, zoom):
+                return path
+            self._bump(db, "misses")
+            return None
+
+    def get(
+        self, bbox: tuple, image_size: tuple, time_interval: tuple, zoom: int
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """
+        Zwraca pasma sceny z cache albo None (chybienie). Jeśli dokładnie
+        takiej sceny nie ma, obszar może zostać wycięty z większej sceny
+        o wystarczającej rozdzielczości (trafienie przestrzenne).
+        """
+        key = self.make_key(bbox, image_size, time_interval, zoom)
+        path = os.path.join(self.cache_dir, f"{key}.tif")
+        covering = None
+        with self._transaction() as db:
+            if not self._exact_hit(db, key, path, bbox, image_size, time_interval, zoom):
+                covering = self._find_covering(db, bbox, image_size, time_interval)
+                if covering is None:
+                    self._bump(db, "misses")
+                    return None
+                self._bump(db, "spatial_hits")
+                db.execute("UPDATE scenes SET last_access = ? WHERE key = ?", (time.time(), covering[0]))
+
+        # Plik jest czytany poza blokadą, więc inny wątek lub proces (CLI)
+        # mógł go w międzyczasie usunąć z cache - wtedy to chybienie.
+        try:
+            if covering is not None:
+                # Fragment większej sceny z cache - bez zapytania do API.
+                return read_geotiff_region(covering[1], bbox, image_size)
+            bands = read_geotiff_bands(path)
+        except (OSError, rasterio.errors.RasterioError) as e:
+            print(f"Scena zniknęła z cache podczas odczytu: {e}")
+            with self._transaction() as db:
+                self._delete(db, key if covering is None else covering[0])
+                self._bump(db, "hits" if covering is None else "spatial_hits", -1)
+                self._bump(db, "misses")
+            return None
+
+        if self.use_sidecars and not isinstance(bands["B04"], np.memmap):
+            # Pierwsze trafienie: scena jest używana ponownie - od teraz mapujemy kopię .npy.
+            save_band_sidecar(bands, path)
+            with self._transaction() as db:
+                updated = db.execute(
+                    "UPDATE scenes SET size_bytes = ? WHERE key = ?", (self._disk_size(path), key)
+                ).rowcount
+                if not updated:
+                    # Scena usunięta w trakcie zapisu kopii - kopia też jest zbędna.
+                    with contextlib.suppress(OSError):
+                        os.remove(sidecar_path(path))
+                else:
+                    self._evict(db, keep=key)
+        return bands
+
+    def covers(self, bbox: tuple, image_size: tuple, time_interval: tuple) -> bool:
+        """Czy obszar można obsłużyć z cache (bez liczenia w statystykach)."""
+        with self._transaction() as db:
+            return self._find_covering(db, bbox, image_size, time_interval) is not None
+
+    def put(
+        self, bands: Dict[str, np.ndarray], bbox: tuple, image_size: tuple, time_interval: tuple, zoom: int
+    ) -> str:
+        """Zapisuje scenę w cache i usuwa najdawniej używane, jeśli brakuje miejsca."""
+        key = self.make_key(bbox, image_size, time_interval, zoom)
+        path = os.path.join(self.cache_dir, f"{key}.tif")
+        # Plik trafia na miejsce atomowo; indeks wskazuje go dopiero po podmianie.
+        save_bands_to_geotiff(bands, bbox, path)
+        with self._transaction() as db:
+            self._register(db, key, path, bbox, image_size, time_interval, zoom)
+            self._evict(db, keep=key)
+        return path
+
+    def get_or_fetch(
+        self, bbox: tuple, image_size: tuple, time_interval: tuple, zoom: int, fetch
+    ) -> Optional[Dict[str, np.ndarray]]:
+        """Zwraca scenę z cache albo pobiera ją przez `fetch(bbox, rozmiar, przedział)` i zapisuje."""
+        bands = self.get(bbox, image_size, time_interval, zoom)
+        if bands is None:
+            bands = fetch(bbox, image_size, time_interval)
+            if bands:
+                self.put(bands, bbox, image_size, time_interval, zoom)
+        return bands
+
+    def _evict(self, db: sqlite3.Connection, keep: str = None):
+        total = db.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM scenes").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = db.execute(
+            "SELECT key, path, size_bytes FROM scenes WHERE key != ? ORDER BY last_access",
+            (keep or "",),
+        ).fetchall()
+        for key, path, size_bytes in rows:
+            if total <= self.max_bytes:
+                break
+            try:
+                for f in self._files(path):
+                    os.remove(f)
+            except OSError as e:
+                # Np. plik zmapowany w pamięci na Windows - spróbujemy później.
+                print(f"Nie udało się usunąć {path} z cache: {e}")
+                continue
+            self._delete(db, key)
+            self._bump(db, "evictions")
+            self._bump(db, "evicted_bytes", size_bytes)
+            total -= size_bytes
+            print(f"🗑️ Evicted from cache: {path} ({size_bytes / 1024 ** 2:.1f} MB)")
+
+    def stats(self) -> Dict[str, float]:
+        """Statystyki cache: trafienia, chybienia, usunięcia, zajętość."""
+        with self._transaction() as db:
+            stats = dict(db.execute("SELECT name, value FROM stats").fetchall())
+            entries, total = db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size_bytes), 0) FROM scenes"
+            ).fetchone()
+        hits = stats["hits"] + stats["spatial_hits"]
+        lookups = hits + stats["misses"]
+        stats.update(
+            entries=entries,
+            total_bytes=total,
+            max_bytes=self.max_bytes,
+            hit_rate=hits / lookups if lookups else 0.0,
+        )
+        return stats
+
+    def format_stats(self) -> str:
+        s = self.stats()
+        return (
+            f"cache: {s['entries']} scen, {s['total_bytes'] / 1024 ** 2:.0f}/{s['max_bytes'] / 1024 ** 2:.0f} MB, "
+            f"trafienia {s['hits']}+{s['spatial_hits']} (przestrzenne)/{s['hits'] + s['spatial_hits'] + s['misses']} "
+            f"({s['hit_rate']:.0%}), usunięte {s['evictions']}"
+        )
@@ -0,0 +1,280 @@
+# src/core/processing/backend_selector.py
+
+import os
+import time
+import numpy as np
+import taichi as ti
+from datetime import datetime
+from multiprocessing import cpu_count
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.core.cancellation import CancellationToken, check_cancelled
+from src.core.io.test_reader import load_test_results
+from src.core.io.test_writer import save_test_results
+
+from . import index_calculator
+from .cpu_index_calculator import calculate_indices as calculate_indices_processes
+from .cpu_single_thread_calculator import calculate_indices as calculate_indices_single
+from .cpu_threaded_calculator import calculate_indices as calculate_indices_threads
+from .indices import validate_indices
+
+# Katalog projektu (nad src/) - model nie zależy od katalogu roboczego.
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+MODEL_FILE = os.path.join(PROJECT_DIR, "test_results", "backend_model.json")
+MODEL_VERSION = 1
+# Rozmiary (bok kwadratu w pikselach) i liczba powtórzeń kalibracji.
+CALIBRATION_SIZES = (256, 512, 1024, 2048)
+CALIBRATION_REPETITIONS = 3
+# Krótka kalibracja w aplikacji (pierwsze użycie trybu Auto): małe obrazy,
+# jeden pomiar i tylko pełna liczba wątków - jedna inicjalizacja Taichi na tryb.
+QUICK_CALIBRATION_SIZES = (256, 512)
+QUICK_CALIBRATION_REPETITIONS = 1
+CALIBRATION_INDEX = "NDVI"
+# Bez modelu: powyżej tej liczby pikseli używamy puli wątków.
+DEFAULT_PARALLEL_PIXELS = 1024 * 1024
+
+
+def _run_gpu(bands, index_types, n_jobs, result_dtype="float32", cancel_token=None):
+    return index_calculator.calculate_indices(
+        bands, index_types, arch="gpu", result_dtype=result_dtype, cancel_token=cancel_token
+    )
+
+
+def _run_taichi_cpu(bands, index_types, n_jobs, result_dtype="float32", cancel_token=None):
+    return index_calculator.calculate_indices(
+        bands, index_types, arch="cpu", n_jobs=n_jobs, result_dtype=result_dtype, cancel_token=cancel_token
+    )
+
+
+def _run_processes(bands, index_types, n_jobs, result_dtype="float32", cancel_token=None):
+    return calculate_indices_processes(
+        bands, index_types, n_jobs=n_jobs, result_dtype=result_dtype, cancel_token=cancel_token
+    )
+
+
+def _run_threads(bands, index_types, n_jobs, result_dtype="float32", cancel_token=None):
+    return calculate_indices_threads(
+        bands, index_types, n_jobs=n_jobs, result_dtype=result_dtype, cancel_token=cancel_token
+    )
+
+
+def _run_single(bands, index_types, n_jobs, result_dtype="float32", cancel_token=None):
+    return calculate_indices_single(bands, index_types, result_dtype, cancel_token)
+
+
+# Nazwy backendów odpowiadają wartościom wyboru procesora w MapView.
+BACKENDS: Dict[str, Callable] = {
+    "GPU": _run_gpu,
+    "TAICHI_CPU": _run_taichi_cpu,
+    "CPU": _run_processes,
+    "CPU_THREADS": _run_threads,
+    "CPU_SINGLE": _run_single,
+}
+# Backendy, dla których kalibrowana jest liczba wątków/procesów.
+PARALLEL_BACKENDS = ("TAICHI_CPU", "CPU", "CPU_THREADS")
+# Backendy Taichi i tryb, którego wymagają (zmiana trybu = ponowna inicjalizacja).
+_TAICHI_MODES = {"GPU": "gpu", "TAICHI_CPU": "cpu"}
+
+
+def _calibration_thread_counts() -> List[int]:
+    n = cpu_count()
+    return sorted({t for t in (2, 4, 8, 16, 32) if t < n} | {n})
+
+
+def _synthetic_bands(size: int) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(size)
+    bands = {
+        name: rng.integers(0, 10000, (size, size), dtype=np.uint16)
+        for name in ("B04", "B08", "B11")
+    }
+    bands["dataMask"] = np.ones((size, size), dtype=np.uint16)
+    return bands
+
+
+def _taichi_on_gpu() -> bool:
+    return ti.lang.impl.current_cfg().arch not in (ti.x64, ti.arm64)
+
+
+def _fit_linear(pixels: Sequence[int], seconds: Sequence[float]) -> Tuple[float, float]:
+    """Dopasowuje t = stały koszt + koszt na piksel (oba nieujemne)."""
+    per_pixel, fixed = np.polyfit(np.asarray(pixels, dtype=np.float64), seconds, 1)
+    if per_pixel < 0:
+        return float(np.mean(seconds)), 0.0
+    if fixed < 0:
+        per_pixel = float(np.dot(pixels, seconds) / np.dot(pixels, pixels))
+        fixed = 0.0
+    return float(fixed), float(per_pixel)
+
+
+def calibrate(
+    sizes: Sequence[int] = CALIBRATION_SIZES,
+    repetitions: int = CALIBRATION_REPETITIONS,
+    backends: Sequence[str] = tuple(BACKENDS),
+    model_file: str = MODEL_FILE,
+    thread_counts: Optional[Sequence[int]] = None,
+    cancel_token: Optional[CancellationToken] = None,
+) -> Dict:
+    """
+    Mierzy czas obliczeń każdego backendu (i liczby wątków) dla kilku
+    rozmiarów obrazu, dopasowuje model kosztu liniowy w liczbie pikseli
+    i zapisuje go w `model_file`. Pierwsze wywołanie każdej konfiguracji
+    (kompilacja, start puli) nie jest liczone; czas przełączenia trybu
+    Taichi jest zapisywany osobno.
+
+    `thread_counts` zawęża sprawdzane liczby wątków backendów równoległych
+    (domyślnie 2, 4, 8, ... i wszystkie rdzenie). `cancel_token` jest
+    sprawdzany przed każdym pomiarem; przerwana kalibracja nie zapisuje modelu.
+    """
+    print(f"Kalibracja backendów: {', '.join(backends)} dla rozmiarów {list(sizes)}...")
+    datasets = {size: _synthetic_bands(size) for size in sizes}
+    entries = []
+    taichi_switch_s = {}
+
+    for backend in backends:
+        if backend in PARALLEL_BACKENDS:
+            backend_thread_counts = list(thread_counts or _calibration_thread_counts())
+        else:
+            backend_thread_counts = [1]
+        if backend in _TAICHI_MODES:
+            check_cancelled(cancel_token)
+            mode = _TAICHI_MODES[backend]
+            start = time.perf_counter()
+            index_calculator.warm_up_taichi(mode, backend_thread_counts[0] if mode == "cpu" else None)
+            taichi_switch_s[mode] = time.perf_counter() - start
+            if index_calculator.taichi_mode() is None:
+                print(f"Pomijam {backend}: Taichi nie zainicjalizowało się.")
+                continue
+            if backend == "GPU" and not _taichi_on_gpu():
+                print("Pomijam GPU: Taichi działa na CPU (brak obsługiwanego GPU).")
+                continue
+
+        for n_jobs in backend_thread_counts:
+            run = BACKENDS[backend]
+            medians = []
+            for size in sizes:
+                bands = datasets[size]
+                check_cancelled(cancel_token)
+                run(bands, [CALIBRATION_INDEX], n_jobs)  # rozgrzewka
+                times = []
+                for _ in range(repetitions):
+                    check_cancelled(cancel_token)
+                    start = time.perf_counter()
+                    run(bands, [CALIBRATION_INDEX], n_jobs)
+                    times.append(time.perf_counter() - start)
+                medians.append(float(np.median(times)))
+            fixed_s, per_pixel_s = _fit_linear([s * s for s in sizes], medians)
+            entries.append({
+                "backend": backend,
+                "n_jobs": n_jobs,
+                "fixed_s": fixed_s,
+                "per_pixel_s": per_pixel_s,
+                "samples": {str(s): t for s, t in zip(sizes, medians)},
+            })
+            print(f"  {backend} ({n_jobs}): {fixed_s * 1000:.2f} ms + {per_pixel_s * 1e9:.2f} ns/piksel")
+
+    model = {
+        "version": MODEL_VERSION,
+        "cpu_count": cpu_count(),
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "calibration_index": CALIBRATION_INDEX,
+        "taichi_switch_s": taichi_switch_s,
+        "entries": entries,
+    }
+    save_test_results(model, model_file)
+    _model_cache.clear()
+    print(f"Model kosztu zapisany w: {model_file}")
+    return model
+
+
+def calibrate_quick(
+    model_file: str = MODEL_FILE,
+    backends: Sequence[str] = tuple(BACKENDS),
+    cancel_token: Optional[CancellationToken] = None,
+) -> Dict:
+    """
+    Krótka kalibracja (kilka sekund) wykonywana przy pierwszym użyciu trybu
+    Auto w aplikacji; dokładniejszy model daje scripts/calibrate_backends.
+    """
+    return calibrate(
+        QUICK_CALIBRATION_SIZES,
+        QUICK_CALIBRATION_REPETITIONS,
+        backends,
+        model_file,
+        thread_counts=[cpu_count()],
+        cancel_token=cancel_token,
+    )
+
+
+_model_cache: Dict[str, Dict] = {}
+
+
+def load_model(model_file: str = MODEL_FILE) -> Optional[Dict]:
+    """
+    Wczytuje zapisany model kosztu. Zwraca None, jeśli go nie ma albo
+    został skalibrowany na maszynie z inną liczbą rdzeni.
+    """
+    if model_file in _model_cache:
+        return _model_cache[model_file]
+    model = load_test_results(model_file)
+    if model is None:
+        return None
+    if model.get("version") != MODEL_VERSION or model.get("cpu_count") != cpu_count():
+        print("Model kosztu jest nieaktualny (inna wersja lub liczba rdzeni).")
+        return None
+    _model_cache[model_file] = model
+    return model
+
+
+def predict_seconds(entry: Dict, pixels: int) -> float:
+    return entry["fixed_s"] + entry["per_pixel_s"] * pixels
+
+
+def choose_backend(shape: Tuple[int, int], model: Optional[Dict] = None) -> Tuple[str, int]:
+    """
+    Wybiera backend i liczbę wątków o najmniejszym przewidywanym czasie
+    dla obrazu o kształcie `shape`. Jeśli wybór wymagałby zmiany trybu
+    Taichi, do przewidywania doliczany jest zmierzony koszt przełączenia.
+    """
+    pixels = int(shape[0]) * int(shape[1])
+    if model is None:
+        model = load_model()
+    if not model or not model["entries"]:
+        if pixels >= DEFAULT_PARALLEL_PIXELS:
+            return "CPU_THREADS", cpu_count()
+        return "CPU_SINGLE", 1
+
+    current_mode = index_calculator.taichi_mode()
+    best, best_time = None, float("inf")
+    for entry in model["entries"]:
+        predicted = predict_seconds(entry, pixels)
+        mode = _TAICHI_MODES.get(entry["backend"])
+        if mode is not None:
+            wanted = (mode, entry["n_jobs"] if mode == "cpu" else None)
+            if current_mode != wanted:
+                predicted += model["taichi_switch_s"].get(mode, 0.0)
+        if predicted < best_time:
+            best, best_time = entry, predicted
+    return best["backend"], best["n_jobs"]
+
+
+def calculate_indices(
+    bands: Dict[str, np.ndarray],
+    index_types: Sequence[str],
+    result_dtype: str = "float32",
+    cancel_token: Optional[CancellationToken] = None,
+) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """Oblicza wskaźniki backendem wybranym przez model kosztu."""
+    index_types = validate_indices(index_types)
+    backend, n_jobs = choose_backend(bands["dataMask"].shape)
+    print(f"Tryb Auto: wybrano {backend} (n_jobs={n_jobs}).")
+    return BACKENDS[backend](bands, index_types, n_jobs, result_dtype, cancel_token)
+
+
+def calculate_index(
+    bands: Dict[str, np.ndarray],
+    index_type: str,
+    result_dtype: str = "float32",
+    cancel_token: Optional[CancellationToken] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    results, data_mask = calculate_indices(bands, [index_type], result_dtype, cancel_token)
+    return results[index_type], data_mask
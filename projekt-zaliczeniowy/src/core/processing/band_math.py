@@ -0,0 +1,264 @@
+# src/core/processing/band_math.py
+
+import ast
+import functools
+import numpy as np
+from typing import Dict, List, Sequence, Tuple
+
+from .quantization import fill_nodata, quantize_into
+
+# Dzielenie jest "bezpieczne": piksele z |mianownikiem| <= DIVISION_EPSILON
+# dostają wartość 0, tak jak w dotychczasowych formułach NDVI/NDMI.
+DIVISION_EPSILON = 1e-6
+
+_BINARY_OPS = {ast.Add: "add", ast.Sub: "sub", ast.Mult: "mul", ast.Div: "div"}
+_FOLD = {
+    "add": lambda a, b: a + b,
+    "sub": lambda a, b: a - b,
+    "mul": lambda a, b: a * b,
+    "div": lambda a, b: a / b if abs(b) > DIVISION_EPSILON else 0.0,
+}
+
+
+class BandMathProgram:
+    """
+    Skompilowany zestaw wyrażeń: liniowa lista instrukcji na rejestrach.
+
+    Instrukcje mają postać (op, dst, a, b):
+      ("load", dst, indeks_pasma, None) - konwersja pasma do float32,
+      ("fill", dst, stała, None),
+      ("neg", dst, a, None),
+      ("add" | "sub" | "mul" | "div", dst, a, b).
+    Operand typu int to numer rejestru, typu float to stała.
+    `outputs[k]` to rejestr z wynikiem k-tego wyrażenia.
+    """
+
+    def __init__(
+        self,
+        expressions: Tuple[str, ...],
+        bands: Tuple[str, ...],
+        instructions: Tuple[tuple, ...],
+        n_registers: int,
+        outputs: Tuple[int, ...],
+    ):
+        self.expressions = expressions
+        self.bands = bands
+        self.instructions = instructions
+        self.n_registers = n_registers
+        self.outputs = outputs
+
+    def __repr__(self) -> str:
+        return (
+            f"BandMathProgram({self.expressions!r}, bands={self.bands!r}, "
+            f"instructions={len(self.instructions)}, registers={self.n_registers})"
+        )
+
+
+def _to_node(tree: ast.AST, expression: str) -> tuple:
+    if isinstance(tree, ast.Expression):
+        return _to_node(tree.body, expression)
+    if isinstance(tree, ast.Name):
+        return ("band", tree.id)
+    if isinstance(tree, ast.Constant) and type(tree.value) in (int, float):
+        return ("const", float(tree.value))
+    if isinstance(tree, ast.UnaryOp) and isinstance(tree.op, (ast.USub, ast.UAdd)):
+        operand = _to_node(tree.operand, expression)
+        if isinstance(tree.op, ast.UAdd):
+            return operand
+        if operand[0] == "const":
+            return ("const", -operand[1])
+        return ("neg", operand)
+    if isinstance(tree, ast.BinOp) and type(tree.op) in _BINARY_OPS:
+        op = _BINARY_OPS[type(tree.op)]
+        lhs = _to_node(tree.left, expression)
+        rhs = _to_node(tree.right, expression)
+        if lhs[0] == "const" and rhs[0] == "const":
+            return ("const", _FOLD[op](lhs[1], rhs[1]))
+        return (op, lhs, rhs)
+    raise ValueError(
+        f"Nieobsługiwany element wyrażenia '{expression}': {ast.dump(tree)}"
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def parse_expression(expression: str) -> tuple:
+    """
+    Parsuje wyrażenie typu "(B08 - B04) / (B08 + B04)" do drzewa krotek.
+    Dozwolone są nazwy pasm, stałe liczbowe, + - * / i nawiasy.
+    """
+    try:
+        tree = ast.parse(expression.strip(), mode="eval")
+    except SyntaxError as e:
+        raise ValueError(f"Nieprawidłowe wyrażenie '{expression}': {e.msg}") from e
+    return _to_node(tree, expression)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_expressions(expressions: Tuple[str, ...]) -> BandMathProgram:
+    """
+    Kompiluje kilka wyrażeń do jednego programu. Wspólne podwyrażenia
+    (np. B08 + B04 w NDVI i SAVI) są liczone raz, a rejestry są ponownie
+    używane, gdy tylko ich wartość przestaje być potrzebna.
+    """
+    roots = [parse_expression(expression) for expression in expressions]
+
+    # Kolejność topologiczna unikalnych węzłów (stałe nie zajmują rejestrów).
+    order: List[tuple] = []
+    seen = set()
+
+    def visit(node):
+        if node in seen or node[0] == "const":
+            return
+        seen.add(node)
+        for child in node[1:]:
+            if isinstance(child, tuple):
+                visit(child)
+        order.append(node)
+
+    for root in roots:
+        visit(root)
+
+    last_use = {}
+    for position, node in enumerate(order):
+        for child in node[1:]:
+            if isinstance(child, tuple) and child[0] != "const":
+                last_use[child] = position
+    pinned = {root for root in roots if root[0] != "const"}
+
+    bands: List[str] = []
+    instructions = []
+    register_of: Dict[tuple, int] = {}
+    free: List[int] = []
+    n_registers = 0
+
+    def operand(node):
+        return node[1] if node[0] == "const" else register_of[node]
+
+    for position, node in enumerate(order):
+        kind = node[0]
+        args = []
+        if kind == "band":
+            if node[1] not in bands:
+                bands.append(node[1])
+            args = [bands.index(node[1]), None]
+        else:
+            args = [operand(child) for child in node[1:]] + [None] * (3 - len(node))
+            # Argumenty użyte po raz ostatni zwalniają rejestry przed przydziałem
+            # celu, dzięki czemu operacje mogą działać w miejscu.
+            for child in node[1:]:
+                if (
+                    isinstance(child, tuple)
+                    and child[0] != "const"
+                    and last_use.get(child) == position
+                    and child not in pinned
+                    and register_of[child] not in free
+                ):
+                    free.append(register_of[child])
+
+        if free:
+            register = free.pop()
+        else:
+            register = n_registers
+            n_registers += 1
+        register_of[node] = register
+        op = "load" if kind == "band" else kind
+        instructions.append((op, register, args[0], args[1]))
+
+    outputs = []
+    for root in roots:
+        if root[0] == "const":
+            register = n_registers
+            n_registers += 1
+            instructions.append(("fill", register, root[1], None))
+            outputs.append(register)
+        else:
+            outputs.append(register_of[root])
+
+    return BandMathProgram(
+        tuple(expressions), tuple(bands), tuple(instructions), n_registers, tuple(outputs)
+    )
+
+
+def allocate_scratch(program: BandMathProgram, shape: Tuple[int, int]) -> Dict[str, list]:
+    """
+    Przydziela bufory robocze dla kafelka o danym kształcie. Bufory można
+    wielokrotnie używać dla kafelków nie większych niż `shape`.
+    """
+    return {
+        "registers": [np.empty(shape, dtype=np.float32) for _ in range(program.n_registers)],
+        "masks": [np.empty(shape, dtype=bool) for _ in range(2)],
+    }
+
+
+def _operand(registers: list, value):
+    return value if isinstance(value, float) else registers[value]
+
+
+def evaluate_window(
+    program: BandMathProgram,
+    bands: Dict[str, np.ndarray],
+    outputs: Sequence[np.ndarray],
+    window: Tuple[slice, slice],
+    scratch: Dict[str, list],
+) -> None:
+    """
+    Wykonuje program dla jednego okna (kafelka) obrazu, bez tymczasowych
+    alokacji: każde działanie NumPy zapisuje wynik przez `out=` do bufora
+    roboczego, a wyniki końcowe trafiają od razu do `outputs[k][window]`.
+
+    Piksele z `dataMask == 0` (jeśli `bands` zawiera dataMask) dostają NaN,
+    a w wynikach skwantyzowanych wartość nodata - tak samo we wszystkich
+    backendach, także w jądrze Taichi.
+    """
+    rows = window[0].stop - window[0].start
+    cols = window[1].stop - window[1].start
+    registers = [buffer[:rows, :cols] for buffer in scratch["registers"]]
+    valid, invalid = (mask[:rows, :cols] for mask in scratch["masks"])
+
+    # Rejestry wyników piszą bezpośrednio do tablic wyjściowych float32;
+    # wyjścia skwantyzowane (int16/uint8) są wypełniane na końcu kafelka.
+    bound = {}
+    for k, register in enumerate(program.outputs):
+        if register not in bound and outputs[k].dtype == np.float32:
+            bound[register] = k
+            registers[register] = outputs[k][window]
+
+    for op, dst, a, b in program.instructions:
+        target = registers[dst]
+        if op == "load":
+            np.copyto(target, bands[program.bands[a]][window], casting="unsafe")
+        elif op == "fill":
+            target.fill(a)
+        elif op == "neg":
+            np.negative(registers[a], out=target)
+        elif op == "add":
+            np.add(_operand(registers, a), _operand(registers, b), out=target)
+        elif op == "sub":
+            np.subtract(_operand(registers, a), _operand(registers, b), out=target)
+        elif op == "mul":
+            np.multiply(_operand(registers, a), _operand(registers, b), out=target)
+        elif op == "div":
+            if isinstance(b, float):
+                if abs(b) > DIVISION_EPSILON:
+                    np.divide(_operand(registers, a), b, out=target)
+                else:
+                    target.fill(0.0)
+                continue
+            denominator = registers[b]
+            np.greater(denominator, DIVISION_EPSILON, out=valid)
+            np.less(denominator, -DIVISION_EPSILON, out=invalid)
+            np.logical_or(valid, invalid, out=valid)
+            np.divide(_operand(registers, a), denominator, out=target, where=valid)
+            np.logical_not(valid, out=invalid)
+            np.copyto(target, 0.0, where=invalid)
+
+    # To samo wyrażenie podane kilka razy dzieli rejestr - kopiujemy wynik.
+    for k, register in enumerate(program.outputs):
+        if bound.get(register) != k:
+            quantize_into(registers[register], outputs[k][window])
+
+    data_mask = bands.get("dataMask")
+    if data_mask is not None:
+        np.equal(data_mask[window], 0, out=invalid)
+        for output in outputs:
+            fill_nodata(output[window], invalid)
@@ -1,132 +1,288 @@
 # src/core/processing/cpu_index_calculator.py
 
+import atexit
+import os
+import threading
 import numpy as np
 from multiprocessing import cpu_count
+from multiprocessing import resource_tracker
 from multiprocessing.shared_memory import SharedMemory
-from concurrent.futures import ProcessPoolExecutor
-from typing import Dict, Tuple
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence, Tuple
 
-global_shared_arrays = {}
+from src.core.cancellation import CancellationToken, OperationCancelled
+from .band_math import BandMathProgram, allocate_scratch, evaluate_window
+from .indices import compile_indices, validate_indices
+from .quantization import validate_result_dtype
+from .shared_result import SharedResult
+from .tiling import Window, batch_tiles, choose_tile_shape, plan_tiles, working_set_bytes_per_pixel
 
+# Stan po stronie procesu głównego: jedna pula i jedna arena na sesję.
+_pool: ProcessPoolExecutor | None = None
+_pool_size = 0
+_arena: Dict[str, SharedMemory] = {}
+# Chroni pulę i arenę: wywołania z różnych wątków (GUI, prefetch, analiza
+# zmian) wykonują się po kolei, bo dzielą te same sloty pamięci współdzielonej.
+_lock = threading.RLock()
 
-def _init_worker(info: Dict):
-    global global_shared_arrays
-    for key, item in info.items():
-        shm = SharedMemory(name=item["name"])
-        global_shared_arrays[key] = np.ndarray(
-            item["shape"], dtype=item["dtype"], buffer=shm.buf
-        )
-        global_shared_arrays[f"{key}_shm_ref"] = shm
+# Stan po stronie procesu roboczego: segmenty dołączone po nazwie.
+_attached_segments: Dict[str, SharedMemory] = {}
+_worker_scratch = None
 
+# Co tyle sekund proces główny sprawdza token anulowania, czekając na paczki.
+CANCEL_POLL_S = 0.05
+# Slot areny z flagą anulowania (1 bajt) czytaną przez procesy robocze.
+_CANCEL_SLOT = "_cancel"
 
-def _process_chunk(chunk_info: Tuple[int, int, str]):
-    start_row, end_row, index_type = chunk_info
 
-    b8 = global_shared_arrays["B08"]
+def _noop_task(_):
+    return None
 
-    if index_type == "NDVI":
-        b4 = global_shared_arrays["B04"]
-        output_arr = global_shared_arrays["output_NDVI"]
 
-        b4_tile = b4[start_row:end_row]
-        b8_tile = b8[start_row:end_row]
+def warm_up_pool(n_jobs: int = None) -> ProcessPoolExecutor:
+    """
+    Tworzy (lub zwraca istniejącą) trwałą pulę procesów i uruchamia
+    wszystkie procesy robocze, aby kolejne obliczenia nie płaciły za start.
+    """
+    global _pool, _pool_size
+    if n_jobs is None:
+        n_jobs = cpu_count()
 
-        denominator = b8_tile + b4_tile
-        result_tile = np.divide(
-            b8_tile - b4_tile,
-            denominator,
-            where=denominator > 1e-6,
-            out=np.zeros_like(b4_tile),
-        )
-        output_arr[start_row:end_row] = result_tile
+    with _lock:
+        if _pool is not None and _pool_size == n_jobs:
+            return _pool
+        if _pool is not None:
+            _pool.shutdown(wait=True)
 
-    elif index_type == "NDMI":
-        b11 = global_shared_arrays["B11"]
-        output_arr = global_shared_arrays["output_NDMI"]
+        print(f"Starting persistent CPU worker pool ({n_jobs} processes)...")
+        # Procesy robocze muszą współdzielić resource_tracker procesu głównego,
+        # inaczej przy wyjściu próbowałyby usuwać segmenty należące do areny.
+        if os.name == "posix":
+            resource_tracker.ensure_running()
+        _pool = ProcessPoolExecutor(max_workers=n_jobs)
+        _pool_size = n_jobs
+        list(_pool.map(_noop_task, range(n_jobs)))
+        return _pool
 
-        b8_tile = b8[start_row:end_row]
-        b11_tile = b11[start_row:end_row]
 
-        denominator = b8_tile + b11_tile
-        result_tile = np.divide(
-            b8_tile - b11_tile,
-            denominator,
-            where=denominator > 1e-6,
-            out=np.zeros_like(b8_tile),
-        )
-        output_arr[start_row:end_row] = result_tile
+def shutdown_pool() -> None:
+    """
+    Zamyka trwałą pulę procesów i zwalnia wszystkie segmenty areny.
+    Bezpieczne do wielokrotnego wywołania.
+    """
+    global _pool, _pool_size
+    with _lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+            _pool_size = 0
 
+        for shm in _arena.values():
+            shm.close()
+            shm.unlink()
+        _arena.clear()
 
-def calculate_index(
-    bands: Dict[str, np.ndarray], index_type: str, n_jobs: int = None
-) -> Tuple[np.ndarray, np.ndarray]:
+
+atexit.register(shutdown_pool)
+
+
+def _get_arena_array(key: str, shape: Tuple[int, ...], dtype) -> Tuple[np.ndarray, Dict]:
+    """
+    Zwraca tablicę w segmencie areny dla danego slotu. Segment jest
+    ponownie używany, dopóki jest wystarczająco duży; w przeciwnym razie
+    zostaje zastąpiony większym.
+    """
+    dtype = np.dtype(dtype)
+    nbytes = int(np.prod(shape)) * dtype.itemsize
+    shm = _arena.get(key)
+    if shm is None or shm.size < nbytes:
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+        shm = SharedMemory(create=True, size=max(nbytes, 1))
+        _arena[key] = shm
+
+    array = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    return array, {"name": shm.name, "shape": shape, "dtype": dtype}
+
+
+def _attach_arrays(layout: Dict[str, Dict]) -> Dict[str, np.ndarray]:
+    """
+    Dołącza (z pamięcią podręczną) segmenty opisane w układzie zadania.
+    Segmenty zastąpione w arenie przez proces główny są odłączane.
+    """
+    names = {item["name"] for item in layout.values()}
+    for name in list(_attached_segments):
+        if name not in names:
+            _attached_segments.pop(name).close()
+
+    arrays = {}
+    for key, item in layout.items():
+        shm = _attached_segments.get(item["name"])
+        if shm is None:
+            shm = SharedMemory(name=item["name"])
+            _attached_segments[item["name"]] = shm
+        arrays[key] = np.ndarray(item["shape"], dtype=item["dtype"], buffer=shm.buf)
+    return arrays
+
+
+def _get_worker_scratch(program: BandMathProgram, tile_shape: Tuple[int, int]) -> Dict[str, list]:
+    """Bufory robocze procesu, ponownie używane między paczkami i wywołaniami."""
+    global _worker_scratch
+    key = (program.n_registers, tile_shape)
+    if _worker_scratch is None or _worker_scratch[0] != key:
+        _worker_scratch = (key, allocate_scratch(program, tile_shape))
+    return _worker_scratch[1]
+
+
+def _process_tiles(task: Tuple[BandMathProgram, Dict[str, Dict], Tuple[int, int], List[Window]]):
+    program, layout, tile_shape, windows = task
+    shared_arrays = _attach_arrays(layout)
+
+    outputs = [shared_arrays[f"output_{k}"] for k in range(len(program.outputs))]
+    cancel_flag = shared_arrays[_CANCEL_SLOT]
+    scratch = _get_worker_scratch(program, tile_shape)
+    for window in windows:
+        if cancel_flag[0]:
+            return
+        evaluate_window(program, shared_arrays, outputs, window, scratch)
+
+
+def calculate_indices(
+    bands: Dict[str, np.ndarray],
+    index_types: Sequence[str],
+    n_jobs: int = None,
+    out: Dict[str, np.ndarray | SharedResult] = None,
+    return_shared: bool = False,
+    result_dtype: str = "float32",
+    cancel_token: Optional[CancellationToken] = None,
+) -> Tuple[Dict[str, np.ndarray | SharedResult], np.ndarray]:
+    """
+    Oblicza kilka wskaźników w jednym zadaniu puli procesów. Każde pasmo
+    jest kopiowane do pamięci współdzielonej raz. Obraz jest dzielony na
+    kafelki o rozmiarze dobranym do L2, a procesy pobierają paczki kafelków
+    dynamicznie i liczą dla nich wszystkie wskaźniki.
+
+    Domyślnie wyniki są kopiowane z areny do nowych tablic. Aby uniknąć
+    kopii, można podać `out` (słownik wskaźnik -> tablica lub SharedResult
+    typu `result_dtype` o kształcie obrazu; do SharedResult procesy piszą
+    bezpośrednio) albo ustawić `return_shared=True`, by dostać wyniki jako
+    SharedResult, które same zwalniają swoją pamięć.
+
+    Przy `result_dtype` "int16"/"uint8" procesy kwantyzują wyniki przed
+    zapisem do pamięci współdzielonej (2x/4x mniej danych do przesłania).
+
+    Anulowanie `cancel_token` ustawia flagę w pamięci współdzielonej:
+    procesy kończą bieżący kafelek, nierozpoczęte paczki są wycofywane,
+    a utworzone tu SharedResult zwalniane przed zgłoszeniem
+    OperationCancelled - pula i arena są gotowe na kolejne obliczenia.
+
+    Wywołania są wzajemnie wykluczające się (arena i flaga anulowania są
+    wspólne): kolejne wywołanie czeka, aż poprzednie skończy także sprzątanie.
+    """
     if n_jobs is None:
         n_jobs = cpu_count()
+    index_types = tuple(validate_indices(index_types))
+    dtype = validate_result_dtype(result_dtype)
+    out = out or {}
 
-    # ZMIANA: Bardziej precyzyjny komunikat w logach
     print(
-        f"Starting calculation for: {index_type} using CPU ({n_jobs} processes, Shared Memory)..."
+        f"Starting calculation for: {', '.join(index_types)} using CPU ({n_jobs} processes, Shared Memory)..."
     )
 
     data_mask = bands["dataMask"]
-    input_arrays = {"B08": bands["B08"].astype(np.float32)}
-    if index_type == "NDVI":
-        input_arrays["B04"] = bands["B04"].astype(np.float32)
-        output_name = "output_NDVI"
-        h, w = input_arrays["B04"].shape
-    elif index_type == "NDMI":
-        input_arrays["B11"] = bands["B11"].astype(np.float32)
-        output_name = "output_NDMI"
-        h, w = input_arrays["B08"].shape
-    else:
-        raise ValueError(f"Nieznany typ wskaźnika: {index_type}")
-
-    shm_list = []
-    worker_info = {}
-    try:
-        for name, arr in input_arrays.items():
-            shm = SharedMemory(create=True, size=arr.nbytes)
-            shared_arr = np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)
-            shared_arr[:] = arr[:]
-            shm_list.append(shm)
-            worker_info[name] = {
-                "name": shm.name,
-                "shape": arr.shape,
-                "dtype": arr.dtype,
-            }
-
-        output_arr_template = np.zeros((h, w), dtype=np.float32)
-        shm_out = SharedMemory(create=True, size=output_arr_template.nbytes)
-        worker_info[output_name] = {
-            "name": shm_out.name,
-            "shape": output_arr_template.shape,
-            "dtype": output_arr_template.dtype,
-        }
-        shm_list.append(shm_out)
-
-        row_indices = np.array_split(np.arange(h), n_jobs)
-        tasks = [
-            (chunk[0], chunk[-1] + 1, index_type)
-            for chunk in row_indices
-            if len(chunk) > 0
+    h, w = data_mask.shape
+    program = compile_indices(index_types, bands)
+    for index_type, target in out.items():
+        if target.shape != (h, w) or target.dtype != dtype:
+            raise ValueError(
+                f"Bufor 'out' dla {index_type} musi mieć kształt {(h, w)} i typ {dtype}."
+            )
+
+    with _lock:
+        executor = warm_up_pool(n_jobs)
+
+        # Pasma (i dataMask) trafiają do pamięci współdzielonej w natywnym typie
+        # (np. uint16); konwersja do float32 odbywa się w procesach roboczych,
+        # kafelek po kafelku.
+        worker_info = {}
+        for name in list(program.bands) + ["dataMask"]:
+            shared_arr, worker_info[name] = _get_arena_array(name, (h, w), bands[name].dtype)
+            np.copyto(shared_arr, bands[name])
+            del shared_arr
+
+        results = {}
+        for k, index_type in enumerate(index_types):
+            target = out.get(index_type)
+            if isinstance(target, SharedResult):
+                results[index_type] = target
+            elif target is None and return_shared:
+                results[index_type] = SharedResult((h, w), dtype)
+            if index_type in results:
+                worker_info[f"output_{k}"] = results[index_type].layout
+            else:
+                _, worker_info[f"output_{k}"] = _get_arena_array(f"output_{k}", (h, w), dtype)
+
+        band_bytes = sum(bands[name].dtype.itemsize for name in program.bands)
+        tile_shape = choose_tile_shape(h, w, working_set_bytes_per_pixel(program, band_bytes))
+        tiles = plan_tiles(h, w, tile_shape)
+        cancel_flag, worker_info[_CANCEL_SLOT] = _get_arena_array(_CANCEL_SLOT, (1,), np.uint8)
+        cancel_flag[0] = 0
+        futures = [
+            executor.submit(_process_tiles, (program, worker_info, tile_shape, batch))
+            for batch in batch_tiles(tiles, n_jobs)
         ]
+        try:
+            pending = set(futures)
+            while pending:
+                if cancel_token is not None and cancel_token.cancelled:
+                    raise OperationCancelled()
+                done, pending = wait(pending, timeout=CANCEL_POLL_S, return_when=FIRST_EXCEPTION)
+                for future in done:
+                    future.result()
+        except BaseException:
+            cancel_flag[0] = 1
+            for future in futures:
+                future.cancel()
+            wait(futures)
+            for index_type, result in results.items():
+                if index_type not in out:
+                    result.close()
+            raise
+        finally:
+            cancel_flag[0] = 0
+            del cancel_flag
 
-        with ProcessPoolExecutor(
-            max_workers=n_jobs, initializer=_init_worker, initargs=(worker_info,)
-        ) as executor:
-            list(executor.map(_process_chunk, tasks))
+        for k, index_type in enumerate(index_types):
+            if index_type in results:
+                continue
+            shared_out, _ = _get_arena_array(f"output_{k}", (h, w), dtype)
+            if index_type in out:
+                np.copyto(out[index_type], shared_out)
+                results[index_type] = out[index_type]
+            else:
+                results[index_type] = np.copy(shared_out)
+            del shared_out
 
-        final_result = np.copy(
-            np.ndarray(
-                output_arr_template.shape,
-                dtype=output_arr_template.dtype,
-                buffer=shm_out.buf,
-            )
-        )
+        return results, data_mask
 
-        return final_result, data_mask
 
-    finally:
-        for shm in shm_list:
-            shm.close()
-            shm.unlink()
\ No newline at end of file
+def calculate_index(
+    bands: Dict[str, np.ndarray],
+    index_type: str,
+    n_jobs: int = None,
+    out: np.ndarray | SharedResult = None,
+    return_shared: bool = False,
+    result_dtype: str = "float32",
+    cancel_token: Optional[CancellationToken] = None,
+) -> Tuple[np.ndarray | SharedResult, np.ndarray]:
+    results, data_mask = calculate_indices(
+        bands,
+        [index_type],
+        n_jobs=n_jobs,
+        out={index_type: out} if out is not None else None,
+        return_shared=return_shared,
+        result_dtype=result_dtype,
+        cancel_token=cancel_token,
+    )
+    return results[index_type], data_mask
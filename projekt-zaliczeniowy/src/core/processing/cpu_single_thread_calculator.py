@@ -1,32 +1,55 @@
 import numpy as np
-from typing import Dict, Tuple
+from typing import Dict, Optional, Sequence, Tuple
+
+from src.core.cancellation import CancellationToken, check_cancelled
+from .band_math import allocate_scratch, evaluate_window
+from .indices import compile_indices, validate_indices
+from .quantization import validate_result_dtype
+from .tiling import BLOCK_ROWS
+
+
+def calculate_indices(
+    bands: Dict[str, np.ndarray],
+    index_types: Sequence[str],
+    result_dtype: str = "float32",
+    cancel_token: Optional[CancellationToken] = None,
+) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """
+    Oblicza kilka wskaźników naraz na CPU w jednym wątku, w jednym
+    przebiegu po blokach wierszy. Każde pasmo wejściowe jest konwertowane
+    i odczytywane dokładnie raz, niezależnie od liczby wskaźników.
+    `result_dtype` ("float32", "int16", "uint8") - typ wyników (patrz quantization).
+    `cancel_token` jest sprawdzany przed każdym blokiem wierszy.
+    """
+    index_types = validate_indices(index_types)
+    dtype = validate_result_dtype(result_dtype)
+    print(f"Rozpoczynam obliczenia dla wskaźników: {', '.join(index_types)} przy użyciu CPU (Single-Thread, NumPy)...")
+
+    data_mask = bands["dataMask"]
+    h, w = data_mask.shape
+    program = compile_indices(index_types, bands)
+
+    results = {index_type: np.empty((h, w), dtype=dtype) for index_type in index_types}
+    outputs = [results[index_type] for index_type in index_types]
+    scratch = allocate_scratch(program, (min(BLOCK_ROWS, h), w))
+
+    for start in range(0, h, BLOCK_ROWS):
+        check_cancelled(cancel_token)
+        end = min(start + BLOCK_ROWS, h)
+        evaluate_window(program, bands, outputs, (slice(start, end), slice(0, w)), scratch)
+
+    return results, data_mask
+
 
 def calculate_index(
-    bands: Dict[str, np.ndarray], index_type: str
+    bands: Dict[str, np.ndarray],
+    index_type: str,
+    result_dtype: str = "float32",
+    cancel_token: Optional[CancellationToken] = None,
 ) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Oblicza wskaźnik (NDVI lub NDMI) na CPU w jednym wątku,
+    Oblicza wskaźnik (nazwę z biblioteki lub wyrażenie) na CPU w jednym wątku,
     wykorzystując zoptymalizowane operacje wektorowe NumPy.
     """
-    print(f"Rozpoczynam obliczenia dla wskaźnika: {index_type} przy użyciu CPU (Single-Thread, NumPy)...")
-    
-    data_mask = bands["dataMask"]
-    
-    if index_type == "NDVI":
-        b4 = bands["B04"].astype(np.float32)
-        b8 = bands["B08"].astype(np.float32)
-        
-        denominator = b8 + b4
-        result = np.divide(b8 - b4, denominator, where=denominator > 1e-6, out=np.zeros_like(b4))
-        
-    elif index_type == "NDMI":
-        b8 = bands["B08"].astype(np.float32)
-        b11 = bands["B11"].astype(np.float32)
-        
-        denominator = b8 + b11
-        result = np.divide(b8 - b11, denominator, where=denominator > 1e-6, out=np.zeros_like(b8))
-        
-    else:
-        raise ValueError(f"Nieznany typ wskaźnika: {index_type}")
-
-    return result, data_mask
\ No newline at end of file
+    results, data_mask = calculate_indices(bands, [index_type], result_dtype, cancel_token)
+    return results[index_type], data_mask
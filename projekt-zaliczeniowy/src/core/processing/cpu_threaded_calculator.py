@@ -0,0 +1,146 @@
+# src/core/processing/cpu_threaded_calculator.py
+
+import threading
+import numpy as np
+from multiprocessing import cpu_count
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.core.cancellation import CancellationToken, check_cancelled
+
+from .band_math import BandMathProgram, allocate_scratch, evaluate_window
+from .indices import compile_indices, validate_indices
+from .quantization import validate_result_dtype
+from .tiling import Window, batch_tiles, choose_tile_shape, plan_tiles, working_set_bytes_per_pixel
+
+# Operacje NumPy z `out=` zwalniają GIL, więc wątki liczą kafelki naprawdę
+# równolegle - bez kopiowania danych, pamięci współdzielonej i IPC.
+_executor: ThreadPoolExecutor | None = None
+_executor_size = 0
+_thread_state = threading.local()
+# Zmiana rozmiaru puli nie może zamknąć puli, do której inne wywołanie
+# właśnie zleca zadania.
+_lock = threading.RLock()
+
+
+def warm_up_pool(n_jobs: int = None) -> ThreadPoolExecutor:
+    """Tworzy (lub zwraca istniejącą) trwałą pulę wątków."""
+    global _executor, _executor_size
+    if n_jobs is None:
+        n_jobs = cpu_count()
+    with _lock:
+        if _executor is not None and _executor_size == n_jobs:
+            return _executor
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = ThreadPoolExecutor(max_workers=n_jobs, thread_name_prefix="index-worker")
+        _executor_size = n_jobs
+        return _executor
+
+
+def shutdown_pool() -> None:
+    """Zamyka trwałą pulę wątków. Bezpieczne do wielokrotnego wywołania."""
+    global _executor, _executor_size
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+            _executor_size = 0
+
+
+def _get_thread_scratch(program: BandMathProgram, tile_shape: Tuple[int, int]) -> Dict[str, list]:
+    key = (program.n_registers, tile_shape)
+    if getattr(_thread_state, "key", None) != key:
+        _thread_state.key = key
+        _thread_state.scratch = allocate_scratch(program, tile_shape)
+    return _thread_state.scratch
+
+
+def process_tiles(
+    program: BandMathProgram,
+    bands: Dict[str, np.ndarray],
+    outputs: List[np.ndarray],
+    tile_shape: Tuple[int, int],
+    windows: List[Window],
+    cancel_token: Optional[CancellationToken] = None,
+):
+    """
+    Liczy program dla listy okien w bieżącym wątku, z buforami roboczymi
+    przypisanymi do wątku (`tile_shape` - największy kształt okna).
+    Używane przez pulę wątków i przez strumieniowanie (streaming).
+    """
+    scratch = _get_thread_scratch(program, tile_shape)
+    for window in windows:
+        check_cancelled(cancel_token)
+        evaluate_window(program, bands, outputs, window, scratch)
+
+
+def calculate_indices(
+    bands: Dict[str, np.ndarray],
+    index_types: Sequence[str],
+    n_jobs: int = None,
+    result_dtype: str = "float32",
+    cancel_token: Optional[CancellationToken] = None,
+) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """
+    Oblicza kilka wskaźników na CPU w puli wątków. Wątki czytają pasma
+    i zapisują wyniki bezpośrednio w tablicach procesu, kafelek po kafelku
+    (przy `result_dtype` "int16"/"uint8" - już skwantyzowane).
+    Po anulowaniu `cancel_token` wątki kończą bieżący kafelek, paczki
+    jeszcze nierozpoczęte są wycofywane z puli, a wywołanie zgłasza
+    OperationCancelled dopiero, gdy pula jest wolna.
+    """
+    if n_jobs is None:
+        n_jobs = cpu_count()
+    index_types = validate_indices(index_types)
+    dtype = validate_result_dtype(result_dtype)
+
+    print(
+        f"Starting calculation for: {', '.join(index_types)} using CPU ({n_jobs} threads, ThreadPool)..."
+    )
+
+    data_mask = bands["dataMask"]
+    h, w = data_mask.shape
+    program = compile_indices(index_types, bands)
+
+    results = {index_type: np.empty((h, w), dtype=dtype) for index_type in index_types}
+    outputs = [results[index_type] for index_type in index_types]
+
+    band_bytes = sum(bands[name].dtype.itemsize for name in program.bands)
+    tile_shape = choose_tile_shape(h, w, working_set_bytes_per_pixel(program, band_bytes))
+    batches = batch_tiles(plan_tiles(h, w, tile_shape), n_jobs)
+
+    if n_jobs == 1 or len(batches) <= 1:
+        for batch in batches:
+            process_tiles(program, bands, outputs, tile_shape, batch, cancel_token)
+    else:
+        with _lock:
+            executor = warm_up_pool(n_jobs)
+            futures = [
+                executor.submit(process_tiles, program, bands, outputs, tile_shape, batch, cancel_token)
+                for batch in batches
+            ]
+        try:
+            for future in futures:
+                future.result()
+        finally:
+            # Przy błędzie lub anulowaniu: nie zostawiamy w puli zadań
+            # piszących do tablic, które zaraz zostaną zwolnione.
+            for future in futures:
+                future.cancel()
+            wait(futures)
+
+    return results, data_mask
+
+
+def calculate_index(
+    bands: Dict[str, np.ndarray],
+    index_type: str,
+    n_jobs: int = None,
+    result_dtype: str = "float32",
+    cancel_token: Optional[CancellationToken] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    results, data_mask = calculate_indices(
+        bands, [index_type], n_jobs=n_jobs, result_dtype=result_dtype, cancel_token=cancel_token
+    )
+    return results[index_type], data_mask
@@ -2,38 +2,137 @@
 
 import numpy as np
 import taichi as ti
-from typing import Dict, Tuple
+import threading
+from typing import Dict, Optional, Sequence, Tuple
 import sys
 
+from src.core.cancellation import CancellationToken, check_cancelled
+
 # Importujemy kalkulator CPU jako fallback
-from .cpu_single_thread_calculator import calculate_index as calculate_index_cpu
+from .cpu_single_thread_calculator import calculate_indices as calculate_indices_cpu
+from .band_math import DIVISION_EPSILON
+from .indices import compile_indices, validate_indices
+from .quantization import quantized_format, validate_result_dtype
 
 _TAICHI_INITIALIZED = False
-_persistent_fields = {}
+# Aktualnie zainicjalizowany tryb: ("gpu", None) albo ("cpu", liczba wątków).
+_taichi_mode = None
+# Bufor pośredni pasm (pasmo, y, x) - przydzielany raz i używany ponownie.
+_staging = None
+# Chroni inicjalizację Taichi i bufor pośredni: wywołania z różnych wątków
+# wykonują się po kolei, a anulowane wywołanie zwalnia blokadę dopiero po
+# zakończeniu jądra (ti.reset() nie może trafić w trwające obliczenia).
+_lock = threading.RLock()
+
+# Typy Taichi dla wyników skwantyzowanych.
+_TAICHI_RESULT_TYPES = {"int16": ti.i16, "uint8": ti.u8}
+
+# Typy danych pasm obsługiwane bez konwersji po stronie hosta.
+_TAICHI_DTYPES = {
+    np.dtype(np.uint8),
+    np.dtype(np.uint16),
+    np.dtype(np.int16),
+    np.dtype(np.int32),
+    np.dtype(np.float32),
+}
 
 @ti.kernel
-def _normalized_diff_kernel(
-    band1: ti.template(), band2: ti.template(), result: ti.template()
+def _band_math_kernel(
+    program: ti.template(),
+    bands: ti.types.ndarray(ndim=3),
+    result: ti.types.ndarray(ndim=3),
+    quantized: ti.template(),
+    q_type: ti.template(),
+    inv_scale: ti.f32,
+    zero: ti.f32,
+    q_min: ti.f32,
+    q_max: ti.f32,
+    nodata: ti.f32,
 ):
-    # ... (bez zmian)
-    for i, j in result:
-        b1_val = band1[i, j]
-        b2_val = band2[i, j]
-        denominator = b1_val + b2_val
-        if denominator > 1e-6:
-            result[i, j] = (b1_val - b2_val) / denominator
+    # Program jest rozwijany statycznie podczas kompilacji, więc każdy
+    # skompilowany zestaw wyrażeń daje jedno połączone jądro bez pośrednich pól.
+    # Ostatnia warstwa `bands` to dataMask - piksele bez danych dostają NaN
+    # (albo `nodata`, gdy `quantized` - wtedy wyniki są kwantyzowane w jądrze).
+    for i, j in ti.ndrange(result.shape[1], result.shape[2]):
+        if bands[ti.static(len(program.bands)), i, j] == 0:
+            for k in ti.static(range(len(program.outputs))):
+                if ti.static(quantized):
+                    result[k, i, j] = ti.cast(nodata, q_type)
+                else:
+                    result[k, i, j] = ti.math.nan
         else:
-            result[i, j] = 0.0
+            regs = ti.Vector([0.0] * program.n_registers, dt=ti.f32)
+            for n in ti.static(range(len(program.instructions))):
+                op, dst, a, b = ti.static(program.instructions[n])
+                if ti.static(op == "load"):
+                    regs[dst] = ti.cast(bands[a, i, j], ti.f32)
+                elif ti.static(op == "fill"):
+                    regs[dst] = a
+                elif ti.static(op == "neg"):
+                    regs[dst] = -regs[a]
+                else:
+                    lhs = 0.0
+                    rhs = 0.0
+                    if ti.static(isinstance(a, float)):
+                        lhs = a
+                    else:
+                        lhs = regs[a]
+                    if ti.static(isinstance(b, float)):
+                        rhs = b
+                    else:
+                        rhs = regs[b]
+                    if ti.static(op == "add"):
+                        regs[dst] = lhs + rhs
+                    elif ti.static(op == "sub"):
+                        regs[dst] = lhs - rhs
+                    elif ti.static(op == "mul"):
+                        regs[dst] = lhs * rhs
+                    elif ti.static(op == "div"):
+                        regs[dst] = lhs / rhs if ti.abs(rhs) > DIVISION_EPSILON else 0.0
+            for k in ti.static(range(len(program.outputs))):
+                value = regs[ti.static(program.outputs[k])]
+                if ti.static(quantized):
+                    result[k, i, j] = ti.cast(ti.math.clamp(ti.round(value * inv_scale + zero), q_min, q_max), q_type)
+                else:
+                    result[k, i, j] = value
+
+def _kernel_quantization(dtype) -> tuple:
+    # Argumenty jądra (quantized, q_type, inv_scale, zero, q_min, q_max, nodata).
+    fmt = quantized_format(dtype)
+    if fmt is None:
+        return False, ti.f32, 1.0, 0.0, 0.0, 0.0, 0.0
+    q_type = _TAICHI_RESULT_TYPES[np.dtype(dtype).name]
+    return True, q_type, 1 / fmt["scale"], fmt["zero"], fmt["q_min"], fmt["q_max"], fmt["nodata"]
 
-def warm_up_taichi():
-    # ... (bez zmian)
-    global _TAICHI_INITIALIZED
-    if _TAICHI_INITIALIZED:
+def warm_up_taichi(arch: str = "gpu", n_jobs: int = None):
+    """
+    Inicjalizuje Taichi i kompiluje jądro testowe. `arch="gpu"` wybiera
+    backend GPU właściwy dla systemu, `arch="cpu"` - wielowątkowy backend
+    LLVM (`ti.cpu`) z `n_jobs` wątkami (domyślnie wszystkie rdzenie).
+    Zmiana trybu powoduje ponowną inicjalizację.
+    """
+    with _lock:
+        _warm_up_taichi(arch, n_jobs)
+
+
+def _warm_up_taichi(arch: str, n_jobs: int):
+    global _TAICHI_INITIALIZED, _taichi_mode
+    mode = (arch, n_jobs if arch == "cpu" else None)
+    if _TAICHI_INITIALIZED and _taichi_mode == mode:
         return
+    if _taichi_mode is not None:
+        ti.reset()
+        _TAICHI_INITIALIZED = False
+        _taichi_mode = None
 
-    print("Wykrywam system operacyjny w celu optymalizacji Taichi...")
     try:
-        if sys.platform == "win32":
+        if arch == "cpu":
+            print(f"Używam wielowątkowego backendu CPU Taichi (wątki: {n_jobs or 'wszystkie'}).")
+            if n_jobs:
+                ti.init(arch=ti.cpu, cpu_max_num_threads=n_jobs)
+            else:
+                ti.init(arch=ti.cpu)
+        elif sys.platform == "win32":
             print("System Windows wykryty. Używam backendu DirectX 11 (dx11).")
             ti.init(arch=ti.dx11)
         elif sys.platform == "darwin":
@@ -42,74 +141,128 @@ def warm_up_taichi():
         else:
             print(f"System {sys.platform} wykryty. Używam domyślnego backendu GPU (Vulkan).")
             ti.init(arch=ti.gpu)
-        
+        _taichi_mode = mode
+
         print("Rozgrzewka kompilatora Taichi (jednorazowa operacja)...")
-        dummy_10m = np.zeros((4, 4), dtype=np.float32)
-        band1_field = ti.field(dtype=ti.f32, shape=(4, 4))
-        band2_field = ti.field(dtype=ti.f32, shape=(4, 4))
-        result_field = ti.field(dtype=ti.f32, shape=(4, 4))
-        band1_field.from_numpy(dummy_10m)
-        band2_field.from_numpy(dummy_10m)
-        _normalized_diff_kernel(band1_field, band2_field, result_field)
+        program = compile_indices(["NDVI"])
+        dummy_bands = np.ones((len(program.bands) + 1, 4, 4), dtype=np.uint16)
+        dummy_result = np.empty((1, 4, 4), dtype=np.float32)
+        _band_math_kernel(program, dummy_bands, dummy_result, *_kernel_quantization(dummy_result.dtype))
         print("Kompilator Taichi gotowy do pracy.")
         _TAICHI_INITIALIZED = True
     except Exception as e:
-        print(f"❌ Nie udało się zainicjować Taichi GPU: {e}")
+        print(f"❌ Nie udało się zainicjować Taichi ({arch}): {e}")
         print("   Przełączam na tryb 'tylko CPU'.")
         _TAICHI_INITIALIZED = False # Upewniamy się, że jest False
 
 
-def calculate_index(
-    bands: Dict[str, np.ndarray], index_type: str
-) -> Tuple[np.ndarray, np.ndarray]:
-    global _TAICHI_INITIALIZED, _persistent_fields
-    
-    # ZMIANA: Dodajemy blok try-except do obsługi błędów wykonania GPU
+def taichi_mode() -> Optional[Tuple[str, Optional[int]]]:
+    """
+    Tryb, w którym Taichi jest zainicjalizowane: ("gpu", None) albo
+    ("cpu", liczba wątków); None, gdy inicjalizacja się nie powiodła
+    lub jeszcze jej nie było.
+    """
+    with _lock:
+        return _taichi_mode if _TAICHI_INITIALIZED else None
+
+
+def _get_staging(shape: tuple, dtype: np.dtype) -> np.ndarray:
+    # Bufor z zapasem warstw jest używany ponownie (początkowe warstwy
+    # tablicy C-ciągłej też tworzą tablicę ciągłą).
+    global _staging
+    if (
+        _staging is None
+        or _staging.shape[1:] != shape[1:]
+        or _staging.shape[0] < shape[0]
+        or _staging.dtype != dtype
+    ):
+        print(f"Tworzenie nowego bufora pasm dla Taichi o kształcie {shape}")
+        _staging = np.empty(shape, dtype=dtype)
+    return _staging[:shape[0]]
+
+
+def calculate_indices(
+    bands: Dict[str, np.ndarray],
+    index_types: Sequence[str],
+    arch: str = "gpu",
+    n_jobs: int = None,
+    out: np.ndarray = None,
+    result_dtype: str = "float32",
+    cancel_token: Optional[CancellationToken] = None,
+) -> Tuple[Dict[str, np.ndarray], np.ndarray]:
+    """
+    Oblicza kilka wskaźników przy użyciu Taichi (`arch="gpu"` lub `"cpu"`).
+    Pasma są przesyłane w natywnym typie (np. uint16) razem z dataMask,
+    a jedno jądro liczy wszystkie wyrażenia i wstawia NaN poza maską.
+
+    Jądro zapisuje wyniki bezpośrednio do tablicy NumPy o kształcie
+    (liczba wskaźników, h, w); można ją podać jako `out`, aby uniknąć
+    przydziału pamięci. Zwracane wyniki są widokami tej tablicy.
+    Przy `result_dtype` "int16"/"uint8" jądro kwantyzuje wyniki, więc
+    z urządzenia kopiowane jest 2x/4x mniej danych.
+
+    `cancel_token` jest sprawdzany przed przygotowaniem każdej warstwy,
+    przed uruchomieniem jądra i po nim; uruchomionego jądra nie da się
+    przerwać, ale jego wynik jest wtedy odrzucany. Wywołania wykonują się
+    po kolei (wspólny bufor pasm), więc następne startuje dopiero po
+    zakończeniu poprzedniego, także anulowanego.
+    """
+    index_types = validate_indices(index_types)
+    dtype = validate_result_dtype(result_dtype)
+
     try:
-        if not _TAICHI_INITIALIZED:
-            warm_up_taichi()
-        
-        # Jeśli inicjalizacja się nie powiodła, od razu przejdź do CPU
-        if not _TAICHI_INITIALIZED:
-            raise ti.TaichiRuntimeError("Taichi not initialized, falling back to CPU.")
-
-        print(f"Rozpoczynam obliczenia dla wskaźnika: {index_type} przy użyciu Taichi...")
-        
-        data_mask = bands["dataMask"]
-        h, w = data_mask.shape
-        
-        def get_or_create_field(name: str, shape: tuple):
-            if name in _persistent_fields and _persistent_fields[name].shape == shape:
-                return _persistent_fields[name]
-            else:
-                print(f"Tworzenie nowego pola Taichi dla '{name}' o kształcie {shape}")
-                field = ti.field(dtype=ti.f32, shape=shape)
-                _persistent_fields[name] = field
-                return field
-
-        if index_type == "NDVI":
-            b4, b8 = bands["B04"], bands["B08"]
-            b4_field = get_or_create_field('b4', (h, w))
-            b8_field = get_or_create_field('b8', (h, w))
-            result_field = get_or_create_field('result_ndvi', (h, w))
-            b4_field.from_numpy(b4.astype(np.float32))
-            b8_field.from_numpy(b8.astype(np.float32))
-            _normalized_diff_kernel(b8_field, b4_field, result_field)
-            return result_field.to_numpy(), data_mask
-            
-        elif index_type == "NDMI":
-            b8, b11 = bands["B08"], bands["B11"]
-            b8_field = get_or_create_field('b8', (h, w))
-            b11_field = get_or_create_field('b11', (h, w))
-            result_field = get_or_create_field('result_ndmi', (h, w))
-            b8_field.from_numpy(b8.astype(np.float32))
-            b11_field.from_numpy(b11.astype(np.float32))
-            _normalized_diff_kernel(b8_field, b11_field, result_field)
-            return result_field.to_numpy(), data_mask
-        else:
-            raise ValueError(f"Nieznany typ wskaźnika: {index_type}")
+        with _lock:
+            warm_up_taichi(arch, n_jobs)
+
+            # Jeśli inicjalizacja się nie powiodła, od razu przejdź do CPU
+            if not _TAICHI_INITIALIZED:
+                raise ti.TaichiRuntimeError("Taichi not initialized, falling back to CPU.")
+
+            print(f"Rozpoczynam obliczenia dla wskaźników: {', '.join(index_types)} przy użyciu Taichi ({arch})...")
+
+            data_mask = bands["dataMask"]
+            h, w = data_mask.shape
+            program = compile_indices(index_types, bands)
+            if out is None:
+                out = np.empty((len(index_types), h, w), dtype=dtype)
+            elif out.shape != (len(index_types), h, w) or out.dtype != dtype or not out.flags.c_contiguous:
+                raise ValueError(
+                    f"Bufor 'out' musi być ciągłą tablicą {dtype} o kształcie {(len(index_types), h, w)}."
+                )
+
+            # Pasma i maska trafiają do jednego bufora (pasmo, y, x) w natywnym
+            # typie danych; konwersja do f32 odbywa się w jądrze, w rejestrach.
+            layers = [bands[name] for name in program.bands] + [data_mask]
+            band_dtype = np.result_type(*(layer.dtype for layer in layers))
+            if band_dtype not in _TAICHI_DTYPES:
+                band_dtype = np.dtype(np.float32)
+            staging = _get_staging((len(layers), h, w), band_dtype)
+            for k, layer in enumerate(layers):
+                check_cancelled(cancel_token)
+                np.copyto(staging[k], layer, casting="unsafe")
+
+            check_cancelled(cancel_token)
+            _band_math_kernel(program, staging, out, *_kernel_quantization(dtype))
+            check_cancelled(cancel_token)
+            results = {index_type: out[k] for k, index_type in enumerate(index_types)}
+            return results, data_mask
 
     except ti.TaichiRuntimeError as e:
-        print(f"⚠️ Błąd wykonania Taichi (GPU): {e}")
+        print(f"⚠️ Błąd wykonania Taichi ({arch}): {e}")
         print("   Automatycznie przełączam na obliczenia CPU dla tego zadania.")
-        # Użyj kalkulatora CPU jako trybu awaryjnego
\ No newline at end of file
+        # Użyj kalkulatora CPU jako trybu awaryjnego
+        return calculate_indices_cpu(bands, index_types, result_dtype, cancel_token)
+
+
+def calculate_index(
+    bands: Dict[str, np.ndarray],
+    index_type: str,
+    arch: str = "gpu",
+    n_jobs: int = None,
+    result_dtype: str = "float32",
+    cancel_token: Optional[CancellationToken] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    results, data_mask = calculate_indices(
+        bands, [index_type], arch=arch, n_jobs=n_jobs, result_dtype=result_dtype, cancel_token=cancel_token
+    )
+    return results[index_type], data_mask
@@ -0,0 +1,53 @@
+# src/core/processing/indices.py
+
+import numpy as np
+from typing import Dict, List, Sequence
+
+from .band_math import BandMathProgram, compile_expressions, parse_expression
+
+# Biblioteka wskaźników jako wyrażenia algebry pasm. Stałe zakładają dane
+# w DN (odbicie * 10000), czyli np. L = 0.5 w SAVI to 5000. Tylko wskaźniki
+# z pasm pobieranych i zapisywanych w cache (B04, B08, B11) - NBR (B12) i pełny
+# EVI (B02) wymagałyby zmiany skryptu pobierania i formatu plików cache.
+INDEX_EXPRESSIONS: Dict[str, str] = {
+    "NDVI": "(B08 - B04) / (B08 + B04)",
+    "NDMI": "(B08 - B11) / (B08 + B11)",
+    "SAVI": "1.5 * (B08 - B04) / (B08 + B04 + 5000)",
+    "EVI2": "2.5 * (B08 - B04) / (B08 + 2.4 * B04 + 10000)",
+}
+
+
+def resolve_expression(index_type: str) -> str:
+    """Zwraca wyrażenie dla nazwy z biblioteki albo samo wyrażenie."""
+    return INDEX_EXPRESSIONS.get(index_type, index_type)
+
+
+def validate_indices(index_types: Sequence[str]) -> List[str]:
+    """
+    Sprawdza listę wskaźników (nazw z biblioteki lub wyrażeń) i usuwa
+    duplikaty, zachowując kolejność.
+    """
+    unique = list(dict.fromkeys(index_types))
+    if not unique:
+        raise ValueError("Lista wskaźników nie może być pusta.")
+    for index_type in unique:
+        try:
+            parse_expression(resolve_expression(index_type))
+        except ValueError as e:
+            raise ValueError(f"Nieznany typ wskaźnika: {index_type} ({e})") from e
+    return unique
+
+
+def compile_indices(
+    index_types: Sequence[str], bands: Dict[str, np.ndarray] = None
+) -> BandMathProgram:
+    """
+    Kompiluje (z pamięcią podręczną) jeden program dla wszystkich wskaźników.
+    Jeśli podano `bands`, sprawdza, czy zawierają wszystkie potrzebne pasma.
+    """
+    program = compile_expressions(tuple(resolve_expression(t) for t in index_types))
+    if bands is not None:
+        missing = [name for name in program.bands if name not in bands]
+        if missing:
+            raise ValueError(f"Brak pasm w danych wejściowych: {', '.join(missing)}")
+    return program
@@ -0,0 +1,107 @@
+# src/core/processing/shared_result.py
+
+import ctypes
+import weakref
+import numpy as np
+from multiprocessing.shared_memory import SharedMemory
+from typing import Dict, List, Tuple
+
+# Segmenty, których nie dało się zamknąć, bo ktoś wciąż trzyma widok
+# tablicy. Nazwa jest już usunięta (unlink), a samo mapowanie zostaje
+# zamknięte przy kolejnej próbie, gdy widoki znikną.
+_orphaned_segments: List[SharedMemory] = []
+
+
+def _try_close(shm: SharedMemory) -> bool:
+    try:
+        shm.close()
+        return True
+    except BufferError:
+        return False
+
+
+def _segment_array(shm: SharedMemory, shape: Tuple[int, ...], dtype: np.dtype) -> np.ndarray:
+    """
+    Tworzy tablicę na segmencie tak, by każdy jej widok trzymał eksport
+    bufora. Dopóki widoki istnieją, `shm.close()` zgłasza BufferError zamiast
+    odmapować pamięć pod nimi (sam `np.ndarray(buffer=shm.buf)` tego nie daje).
+    """
+    count = int(np.prod(shape))
+    exported = (ctypes.c_char * shm.size).from_buffer(shm.buf)
+    return np.frombuffer(exported, dtype=dtype, count=count).reshape(shape)
+
+
+def _release_segment(shm: SharedMemory) -> None:
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
+    if not _try_close(shm):
+        _orphaned_segments.append(shm)
+    _close_orphaned_segments()
+
+
+def _close_orphaned_segments() -> None:
+    _orphaned_segments[:] = [s for s in _orphaned_segments if not _try_close(s)]
+
+
+class SharedResult:
+    """
+    Wynik obliczeń przechowywany w pamięci współdzielonej.
+
+    Procesy robocze zapisują wynik bezpośrednio do segmentu, a obiekt jest
+    jego właścicielem: segment jest zwalniany przez `close()`, przy wyjściu
+    z bloku `with` albo gdy obiekt zostanie usunięty przez GC. Obiekt
+    zachowuje się jak tablica (`np.asarray(result)` nie kopiuje danych).
+    """
+
+    def __init__(self, shape: Tuple[int, ...], dtype=np.float32):
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        _close_orphaned_segments()
+        self._shm = SharedMemory(create=True, size=max(nbytes, 1))
+        self.array = _segment_array(self._shm, shape, dtype)
+        self._finalizer = weakref.finalize(self, _release_segment, self._shm)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.array.shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.array.dtype
+
+    @property
+    def layout(self) -> Dict:
+        """Opis segmentu w formacie używanym przez procesy robocze."""
+        return {"name": self._shm.name, "shape": self.array.shape, "dtype": self.array.dtype}
+
+    @property
+    def closed(self) -> bool:
+        return not self._finalizer.alive
+
+    def close(self) -> None:
+        """Zwalnia segment. Bezpieczne do wielokrotnego wywołania."""
+        self.array = None
+        self._finalizer()
+
+    def __array__(self, dtype=None, copy=None):
+        if self.array is None:
+            raise ValueError("SharedResult jest już zamknięty (segment zwolniony).")
+        if dtype is not None and np.dtype(dtype) != self.array.dtype:
+            return self.array.astype(dtype)
+        return self.array.copy() if copy else self.array
+
+    def __enter__(self) -> "SharedResult":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __repr__(self) -> str:
+        state = "closed" if self.closed else self._shm.name
+        return f"SharedResult(shape={self.shape if self.array is not None else None}, {state})"
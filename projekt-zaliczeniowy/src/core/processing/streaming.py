@@ -0,0 +1,149 @@
+# src/core/processing/streaming.py
+
+import math
+import queue
+import threading
+import numpy as np
+import rasterio
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import cpu_count
+from rasterio.windows import Window
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.core.io.data_reader import GEOTIFF_BANDS, read_geotiff_window
+from src.core.io.data_writer import atomic_output, open_index_geotiff
+
+from .band_math import BandMathProgram
+from .cpu_threaded_calculator import process_tiles
+from .indices import compile_indices, validate_indices
+from .quantization import validate_result_dtype
+from .tiling import choose_tile_shape, plan_tiles, working_set_bytes_per_pixel
+
+# Docelowa liczba pikseli jednego okna strumienia (wyrównanego do bloków pliku).
+STREAM_WINDOW_PIXELS = 1024 * 1024
+# Limit pamięci podręcznej bloków GDAL (MB) podczas strumieniowania; domyślny
+# limit (procent RAM) przechowywałby większość sceny.
+STREAM_GDAL_CACHE_MB = 64
+
+
+def plan_stream_windows(
+    height: int, width: int, block_shape: Tuple[int, int], target_pixels: int = STREAM_WINDOW_PIXELS
+) -> List[Window]:
+    """
+    Dzieli obraz na okna złożone z całych bloków pliku źródłowego, każde
+    o około `target_pixels` pikselach, w kolejności wierszowej.
+    """
+    block_h, block_w = block_shape
+    if block_w >= width:
+        win_w = width
+    else:
+        win_w = min(width, max(1, int(math.sqrt(target_pixels)) // block_w) * block_w)
+    win_h = min(height, max(1, target_pixels // win_w // block_h) * block_h)
+    return [
+        Window(col, row, min(win_w, width - col), min(win_h, height - row))
+        for row in range(0, height, win_h)
+        for col in range(0, width, win_w)
+    ]
+
+
+def _compute_window(
+    program: BandMathProgram, bands: Dict[str, np.ndarray], n_outputs: int, dtype=np.float32
+) -> np.ndarray:
+    """Liczy wszystkie wskaźniki dla jednego okna; NaN (nodata) poza dataMask (band_math)."""
+    data_mask = bands["dataMask"]
+    h, w = data_mask.shape
+    result = np.empty((n_outputs, h, w), dtype=dtype)
+    band_bytes = sum(bands[name].dtype.itemsize for name in program.bands)
+    tile_shape = choose_tile_shape(h, w, working_set_bytes_per_pixel(program, band_bytes))
+    process_tiles(program, bands, list(result), tile_shape, plan_tiles(h, w, tile_shape))
+    return result
+
+
+def _write_windows(dst, pending: "queue.Queue", errors: list, on_window: Optional[Callable] = None):
+    # Zapisuje gotowe okna w kolejności odczytu; None kończy strumień.
+    while True:
+        item = pending.get()
+        if item is None:
+            return
+        window, future = item
+        if errors:
+            continue
+        try:
+            result = future.result()
+            dst.write(result, window=window)
+            if on_window is not None:
+                on_window(window, result)
+        except Exception as e:
+            errors.append(e)
+
+
+def stream_indices_to_geotiff(
+    src_path: str,
+    dst_path: str,
+    index_types: Sequence[str],
+    n_jobs: int = None,
+    max_in_flight: int = None,
+    window_pixels: int = STREAM_WINDOW_PIXELS,
+    result_dtype: str = "float32",
+    on_window: Optional[Callable[[Window, np.ndarray], None]] = None,
+) -> str:
+    """
+    Oblicza wskaźniki dla pliku GeoTIFF okno po oknie i zapisuje wyniki
+    do `dst_path` (jedno pasmo na wskaźnik), bez wczytywania całej sceny.
+
+    Odczyt (wątek wywołujący), obliczenia (pula wątków) i zapis (wątek
+    zapisu) odbywają się jednocześnie. Naraz w pamięci jest najwyżej
+    `max_in_flight` okien (domyślnie 2 * n_jobs), więc zużycie pamięci
+    zależy od rozmiaru okna, a nie sceny. `result_dtype` "int16"/"uint8"
+    zapisuje wyniki skwantyzowane (patrz quantization).
+
+    Strumień ma własną pulę wątków (trwała pula cpu_threaded_calculator
+    może zostać w tym czasie przebudowana przez inne wywołanie), a plik
+    wynikowy pojawia się dopiero po udanym zapisie (atomic_output) - błąd
+    ani przerwanie nie zostawiają uciętego pliku.
+
+    `on_window(okno, wyniki)` jest wywoływane (w wątku zapisu, w kolejności
+    okien) dla każdego zapisanego okna - np. do liczenia statystyk bez
+    ponownego czytania pliku wynikowego.
+    """
+    if n_jobs is None:
+        n_jobs = cpu_count()
+    if max_in_flight is None:
+        max_in_flight = 2 * n_jobs
+    index_types = validate_indices(index_types)
+    dtype = validate_result_dtype(result_dtype)
+    program = compile_indices(index_types, dict.fromkeys(GEOTIFF_BANDS))
+    band_names = list(program.bands) + ["dataMask"]
+
+    # Kolejka z ograniczeniem rozmiaru wstrzymuje odczyt, gdy zapis nie nadąża.
+    pending: "queue.Queue" = queue.Queue(maxsize=max_in_flight)
+    errors: list = []
+
+    stream_pool = ThreadPoolExecutor(max_workers=n_jobs, thread_name_prefix="stream-worker")
+    with atomic_output(dst_path) as tmp_path, stream_pool as executor:
+        with rasterio.Env(GDAL_CACHEMAX=STREAM_GDAL_CACHE_MB), rasterio.open(src_path) as src:
+            windows = plan_stream_windows(src.height, src.width, src.block_shapes[0], window_pixels)
+            print(
+                f"Streaming {', '.join(index_types)} for {src.width}x{src.height} "
+                f"in {len(windows)} windows ({n_jobs} threads, {max_in_flight} in flight)..."
+            )
+            with open_index_geotiff(
+                tmp_path, src.width, src.height, src.crs, src.transform, index_types, result_dtype
+            ) as dst:
+                writer = threading.Thread(target=_write_windows, args=(dst, pending, errors, on_window), daemon=True)
+                writer.start()
+                try:
+                    for window in windows:
+                        if errors:
+                            break
+                        bands = read_geotiff_window(src, window, band_names)
+                        future = executor.submit(_compute_window, program, bands, len(index_types), dtype)
+                        pending.put((window, future))
+                finally:
+                    pending.put(None)
+                    writer.join()
+        if errors:
+            raise errors[0]
+
+    print(f"💾 Index results streamed to: {dst_path}")
+    return dst_path
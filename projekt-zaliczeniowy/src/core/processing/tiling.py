@@ -0,0 +1,83 @@
+# src/core/processing/tiling.py
+
+import math
+from typing import List, Sequence, Tuple
+
+from src.core.system_info import get_cache_sizes
+
+from .band_math import BandMathProgram
+
+# Część L2, jaką może zająć zbiór roboczy jednego kafelka (reszta zostaje
+# na stos, kod i dane innych wątków sprzętowych tego samego rdzenia).
+L2_FRACTION = 0.5
+# Szerokość kafelka jest wielokrotnością tej liczby kolumn (pełne linie cache).
+COLUMN_ALIGNMENT = 64
+MIN_TILE_PIXELS = 4096
+# Ile paczek kafelków przypada na proces; więcej paczek to lepsze
+# równoważenie obciążenia kosztem większej liczby komunikatów IPC.
+BATCHES_PER_WORKER = 8
+# Liczba wierszy przetwarzanych naraz w jednym przebiegu kafelkowym
+# (kalkulator jednowątkowy - pasy na całą szerokość obrazu).
+BLOCK_ROWS = 256
+
+Window = Tuple[slice, slice]
+
+
+def working_set_bytes_per_pixel(program: BandMathProgram, band_bytes: int) -> int:
+    """
+    Bajty dotykane na piksel: wejścia (`band_bytes` - suma rozmiarów typów
+    wszystkich pasm programu), wyjścia, rejestry float32 i maski.
+    """
+    return (
+        band_bytes
+        + 4 * len(program.outputs)
+        + 4 * program.n_registers
+        + 2
+    )
+
+
+def choose_tile_shape(
+    height: int, width: int, bytes_per_pixel: int, cache_bytes: int = None
+) -> Tuple[int, int]:
+    """
+    Dobiera kształt kafelka tak, aby jego zbiór roboczy mieścił się w L2.
+    Preferowane są kafelki o pełnej szerokości (ciągłe wiersze w pamięci);
+    dla bardzo szerokich obrazów kafelki są dzielone także w poziomie.
+    """
+    if cache_bytes is None:
+        cache_bytes = get_cache_sizes()["L2"]
+    tile_pixels = max(MIN_TILE_PIXELS, int(cache_bytes * L2_FRACTION) // max(bytes_per_pixel, 1))
+
+    if width * 8 <= tile_pixels:
+        tile_w = width
+    else:
+        side = int(math.sqrt(tile_pixels))
+        tile_w = max(COLUMN_ALIGNMENT, side // COLUMN_ALIGNMENT * COLUMN_ALIGNMENT)
+        tile_w = min(tile_w, width)
+    tile_h = max(1, min(height, tile_pixels // max(tile_w, 1)))
+    if tile_h == height and tile_w < width:
+        # Niski obraz: poszerzamy kafelek, aby wykorzystać cały budżet.
+        tile_w = min(width, max(tile_w, tile_pixels // tile_h // COLUMN_ALIGNMENT * COLUMN_ALIGNMENT))
+    return tile_h, tile_w
+
+
+def plan_tiles(height: int, width: int, tile_shape: Tuple[int, int]) -> List[Window]:
+    """Dzieli obraz na okna (kafelki) w kolejności wierszowej."""
+    tile_h, tile_w = tile_shape
+    return [
+        (slice(row, min(row + tile_h, height)), slice(col, min(col + tile_w, width)))
+        for row in range(0, height, tile_h)
+        for col in range(0, width, tile_w)
+    ]
+
+
+def batch_tiles(tiles: Sequence[Window], n_jobs: int) -> List[List[Window]]:
+    """
+    Grupuje sąsiednie kafelki w paczki. Procesy pobierają kolejne paczki
+    dynamicznie, więc wolniejszy rdzeń po prostu przetworzy ich mniej.
+    """
+    if not tiles:
+        return []
+    n_batches = max(1, n_jobs * BATCHES_PER_WORKER)
+    batch_size = max(1, math.ceil(len(tiles) / n_batches))
+    return [list(tiles[i:i + batch_size]) for i in range(0, len(tiles), batch_size)]
@@ -0,0 +1,169 @@
+# src/core/processing/time_series.py
+
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from src.core.cancellation import CancellationToken, check_cancelled
+from .quantization import dequantize
+
+Interval = Tuple[str, str]
+
+# Ile przedziałów czasu jest pobieranych jednocześnie (obliczenia idą
+# w wątku wywołującym, w miarę jak przychodzą kolejne daty).
+TIME_SERIES_FETCH_WORKERS = 3
+
+
+def split_interval(time_interval: Interval, n_steps: int) -> List[Interval]:
+    """Dzieli przedział dat ("YYYY-MM-DD", "YYYY-MM-DD") na `n_steps` kolejnych części."""
+    start, end = (date.fromisoformat(d) for d in time_interval)
+    days = (end - start).days + 1
+    if n_steps < 1 or days < n_steps:
+        raise ValueError(f"Nie można podzielić przedziału {time_interval} na {n_steps} części.")
+    bounds = [start + timedelta(days=round(k * days / n_steps)) for k in range(n_steps + 1)]
+    return [
+        (bounds[k].isoformat(), (bounds[k + 1] - timedelta(days=1)).isoformat())
+        for k in range(n_steps)
+    ]
+
+
+def interval_midpoint(time_interval: Interval) -> date:
+    start, end = (date.fromisoformat(d) for d in time_interval)
+    return start + (end - start) / 2
+
+
+class ChangeAccumulator:
+    """
+    Przyrostowo liczy produkty zmian dla serii wyników jednego wskaźnika,
+    przyjmując daty w dowolnej kolejności (tak jak kończą się pobrania):
+
+    - różnica: wartość z najpóźniejszej minus z najwcześniejszej daty,
+      osobno dla każdego piksela (pomijając daty, w których piksel nie
+      miał danych, np. przez chmury),
+    - trend: nachylenie prostej najmniejszych kwadratów (zmiana na rok).
+
+    Pamięć nie zależy od liczby dat: sumy regresji i pierwsza/ostatnia
+    wartość są trzymane jako tablice o kształcie obrazu.
+    """
+
+    def __init__(self, shape: Tuple[int, int], origin: date):
+        self.origin = origin
+        self.count = np.zeros(shape, dtype=np.uint16)
+        self._sum_t = np.zeros(shape, dtype=np.float64)
+        self._sum_tt = np.zeros(shape, dtype=np.float64)
+        self._sum_y = np.zeros(shape, dtype=np.float64)
+        self._sum_ty = np.zeros(shape, dtype=np.float64)
+        self._first_t = np.full(shape, np.inf)
+        self._first_y = np.full(shape, np.nan, dtype=np.float32)
+        self._last_t = np.full(shape, -np.inf)
+        self._last_y = np.full(shape, np.nan, dtype=np.float32)
+
+    def add(self, when: date, values: np.ndarray, data_mask: np.ndarray):
+        values = dequantize(values)
+        t = (when - self.origin).days / 365.25
+        valid = (data_mask != 0) & np.isfinite(values)
+        y = np.where(valid, values, 0.0)
+
+        self.count += valid
+        self._sum_t += valid * t
+        self._sum_tt += valid * (t * t)
+        self._sum_y += y
+        self._sum_ty += y * t
+
+        earlier = valid & (t < self._first_t)
+        self._first_t[earlier] = t
+        self._first_y[earlier] = values[earlier]
+        later = valid & (t > self._last_t)
+        self._last_t[later] = t
+        self._last_y[later] = values[later]
+
+    def difference(self) -> np.ndarray:
+        """Ostatnia minus pierwsza wartość; NaN dla pikseli z mniej niż 2 datami."""
+        result = self._last_y - self._first_y
+        result[~(self._last_t > self._first_t)] = np.nan
+        return result
+
+    def trend(self) -> np.ndarray:
+        """Zmiana wskaźnika na rok (regresja liniowa); NaN dla < 2 dat."""
+        n = self.count.astype(np.float64)
+        denominator = n * self._sum_tt - self._sum_t ** 2
+        with np.errstate(divide="ignore", invalid="ignore"):
+            slope = (n * self._sum_ty - self._sum_t * self._sum_y) / denominator
+        slope[(self.count < 2) | (np.abs(denominator) < 1e-12)] = np.nan
+        return slope.astype(np.float32)
+
+
+def run_time_series(
+    fetch_scene: Callable[[Interval], Optional[Dict[str, np.ndarray]]],
+    calculate: Callable[[Dict[str, np.ndarray], List[str]], Tuple[Dict[str, np.ndarray], np.ndarray]],
+    intervals: Sequence[Interval],
+    index_type: str,
+    on_date: Callable[[Interval, int, int, ChangeAccumulator], None] = None,
+    max_workers: int = TIME_SERIES_FETCH_WORKERS,
+    keep_dates: bool = False,
+    cancel_token: Optional[CancellationToken] = None,
+) -> Dict:
+    """
+    Pobiera sceny dla wielu przedziałów czasu jednocześnie i liczy
+    wskaźnik dla każdej daty, gdy tylko jej dane dotrą - oczekiwanie na
+    sieć nakłada się na obliczenia. Różnica i trend są aktualizowane po
+    każdej dacie; `on_date(przedział, gotowe, wszystkie, akumulator)`
+    pozwala pokazywać wyniki częściowe.
+
+    `fetch_scene(przedział)` zwraca pasma (np. z cache) albo None
+    (brak danych - data jest pomijana). `calculate(pasma, [wskaźnik])`
+    to dowolny backend (np. backend_selector.calculate_indices).
+
+    Zwraca słownik: "difference", "trend", "count" (liczba ważnych dat na
+    piksel), "intervals" (daty z danymi) i "dates" (wyniki poszczególnych
+    dat; tylko przy `keep_dates=True`).
+
+    Po anulowaniu `cancel_token` nierozpoczęte pobrania są wycofywane
+    i zgłaszany jest OperationCancelled (token warto też przekazać do
+    `fetch_scene` i `calculate`, by przerwać pracę już trwającą).
+    """
+    intervals = sorted(intervals)
+    if len(intervals) < 2:
+        raise ValueError("Analiza zmian wymaga co najmniej dwóch przedziałów czasu.")
+    origin = interval_midpoint(intervals[0])
+    accumulator = None
+    completed, dates = [], {}
+
+    print(f"Time series: {index_type} for {len(intervals)} intervals ({max_workers} concurrent fetches)...")
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="time-series") as executor:
+        futures = {executor.submit(fetch_scene, interval): interval for interval in intervals}
+        try:
+            for done, future in enumerate(as_completed(futures), start=1):
+                check_cancelled(cancel_token)
+                interval = futures[future]
+                bands = future.result()
+                if not bands:
+                    print(f"   {interval[0]}..{interval[1]}: brak danych, pomijam.")
+                    continue
+                results, data_mask = calculate(bands, [index_type])
+                values = results[index_type]
+                if accumulator is None:
+                    accumulator = ChangeAccumulator(data_mask.shape, origin)
+                accumulator.add(interval_midpoint(interval), values, data_mask)
+                completed.append(interval)
+                if keep_dates:
+                    dates[interval] = np.array(values)
+                del bands, results, values
+                if on_date is not None:
+                    on_date(interval, done, len(intervals), accumulator)
+        except BaseException:
+            # Nie czekamy na pobrania, które jeszcze nie ruszyły.
+            for future in futures:
+                future.cancel()
+            raise
+
+    if accumulator is None or len(completed) < 2:
+        raise ValueError("Za mało dat z danymi do analizy zmian.")
+    return {
+        "difference": accumulator.difference(),
+        "trend": accumulator.trend(),
+        "count": accumulator.count,
+        "intervals": sorted(completed),
+        "dates": dates,
+    }
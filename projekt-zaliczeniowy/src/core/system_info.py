@@ -0,0 +1,91 @@
+# src/core/system_info.py
+
+import functools
+import glob
+import os
+import platform
+from typing import Dict
+
+try:
+    import cpuinfo
+except ImportError:
+    cpuinfo = None
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Wartości przyjmowane, gdy nie da się odczytać rozmiarów pamięci podręcznej.
+DEFAULT_L2_CACHE_BYTES = 1024 * 1024
+DEFAULT_L3_CACHE_BYTES = 8 * 1024 * 1024
+# Mniejsze L2 na rdzeń się nie zdarza - taka wartość z 'py-cpuinfo' po
+# podzieleniu przez liczbę rdzeni oznacza, że podano rozmiar na rdzeń.
+MIN_PER_CORE_L2_BYTES = 256 * 1024
+
+
+def _parse_cache_size(text: str) -> int:
+    text = text.strip().upper()
+    units = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3}
+    if text and text[-1] in units:
+        return int(text[:-1]) * units[text[-1]]
+    return int(text)
+
+
+def _read_sysfs_cache_sizes() -> Dict[str, int]:
+    # Rozmiary z /sys dotyczą jednej instancji pamięci (L2 - jednego rdzenia).
+    sizes = {}
+    for index_dir in glob.glob("/sys/devices/system/cpu/cpu0/cache/index*"):
+        try:
+            with open(os.path.join(index_dir, "level")) as f:
+                level = f.read().strip()
+            with open(os.path.join(index_dir, "type")) as f:
+                cache_type = f.read().strip()
+            with open(os.path.join(index_dir, "size")) as f:
+                size = _parse_cache_size(f.read())
+        except (OSError, ValueError):
+            continue
+        if cache_type in ("Unified", "Data"):
+            sizes[f"L{level}"] = size
+    return sizes
+
+
+def _physical_core_count() -> int:
+    if psutil:
+        count = psutil.cpu_count(logical=False)
+        if count:
+            return count
+    return os.cpu_count() or 1
+
+
+def _per_core_l2(size: int) -> int:
+    # 'py-cpuinfo' (np. przez lscpu) często podaje sumę L2 wszystkich rdzeni.
+    per_core = size // _physical_core_count()
+    if per_core >= MIN_PER_CORE_L2_BYTES:
+        return per_core
+    return size
+
+
+@functools.lru_cache(maxsize=None)
+def get_cache_sizes() -> Dict[str, int]:
+    """
+    Zwraca rozmiary pamięci podręcznej L2 (na rdzeń) i L3 (współdzielonej) w bajtach.
+    Na Linuksie czyta /sys, w przeciwnym razie korzysta z 'py-cpuinfo'
+    (L2 przeliczane na rdzeń); w ostateczności z wartości domyślnych.
+    """
+    sizes = {}
+    if platform.system() == "Linux":
+        sizes = _read_sysfs_cache_sizes()
+    if not sizes and cpuinfo:
+        info = cpuinfo.get_cpu_info()
+        for level in ('L2', 'L3'):
+            size = info.get(f'{level.lower()}_cache_size')
+            if isinstance(size, int) and size > 0:
+                sizes[level] = size
+        if 'L2' in sizes:
+            sizes['L2'] = _per_core_l2(sizes['L2'])
+
+    return {
+        'L2': sizes.get('L2', DEFAULT_L2_CACHE_BYTES),
+        'L3': sizes.get('L3', DEFAULT_L3_CACHE_BYTES),
+    }
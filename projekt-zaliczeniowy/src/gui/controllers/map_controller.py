@@ -1,16 +1,21 @@
 # src/gui/controllers/map_controller.py
 
 import threading
-import os
-import hashlib
 import time
+import numpy as np
 from typing import TYPE_CHECKING
 from tkinter import messagebox
 
-from src.core.io.data_writer import save_bands_to_geotiff
-from src.core.io.data_reader import read_geotiff_bands
-from src.core.processing.index_calculator import calculate_index as calculate_index_gpu
-from src.core.processing.cpu_index_calculator import calculate_index as calculate_index_cpu
+from src.core.cancellation import CancellationToken, OperationCancelled, check_cancelled
+from src.core.io.scene_cache import SceneCache
+from src.core.io.result_cache import ResultCache
+from src.core.data_loader.prefetcher import Prefetcher
+from src.core.processing.index_calculator import calculate_indices as calculate_indices_gpu
+from src.core.processing.cpu_index_calculator import calculate_indices as calculate_indices_cpu
+from src.core.processing.cpu_threaded_calculator import calculate_indices as calculate_indices_cpu_threads
+from src.core.processing import backend_selector
+from src.core.processing.quantization import dequantize
+from src.core.processing.time_series import run_time_series, split_interval
 
 if TYPE_CHECKING:
     from src.gui.app import MainApplication
@@ -19,23 +24,89 @@ if TYPE_CHECKING:
 class MapController:
     # ... (reszta bez zmian)
     CACHE_DIR = "data"
+    # Limit miejsca na dysku dla cache scen (najdawniej używane są usuwane).
+    CACHE_MAX_BYTES = 2 * 1024 ** 3
+    # Surowa kopia pasm (.npy) obok pliku cache, tworzona przy pierwszym
+    # trafieniu: kolejne trafienia mapują plik do pamięci zamiast dekodować
+    # GeoTIFF (kosztem miejsca na dysku tylko dla scen używanych ponownie).
+    USE_BAND_SIDECARS = True
+    # Limit RAM dla obliczonych wskaźników (na dysku trzymane są w data/results).
+    RESULT_CACHE_MEMORY_BYTES = 512 * 1024 ** 2
+    # Typ wyników wszystkich backendów: "float32", "int16" (krok 1e-4, 2x mniej
+    # pamięci) albo "uint8" (tryb wyświetlania, krok ~0.008, 4x mniej pamięci).
+    # Wyniki różnych backendów w tym samym typie są wymienne w cache wyników.
+    RESULT_DTYPE = "float32"
+    # Analiza zmian: zakres dat z widoku dzielony jest na tyle przedziałów.
+    TIME_SERIES_STEPS = 4
+    # Wskaźniki z przycisków widoku liczone razem w jednym przebiegu.
+    FUSED_INDICES = ("NDVI", "NDMI")
 
     def __init__(self, app: "MainApplication", view_controller):
         self.app = app
         self.view_controller = view_controller
         self.view: "MapView" | None = None
         self.raw_data = None
+        self.scene_key = None
+        self.scene_bbox = None
         self.index_result = None
         self.result_mask = None
+        # Zasięg (min_lon, min_lat, max_lon, max_lat) wyświetlanego wyniku.
+        self.result_bbox = None
         self.last_calculated_index = None
+        self.change_results = None
         self.timer_running = False
         self.start_time = 0.0
         self.timer_after_id = None
-        os.makedirs(self.CACHE_DIR, exist_ok=True)
+        # Token bieżącej operacji (pobieranie / obliczenia / analiza zmian).
+        self._operation_token: CancellationToken | None = None
+        self.scene_cache = SceneCache(self.CACHE_DIR, self.CACHE_MAX_BYTES, self.USE_BAND_SIDECARS)
+        # Obliczone wskaźniki: przełączanie między nimi i powrót do
+        # wcześniejszego obszaru nie wymagają ponownych obliczeń.
+        self.result_cache = ResultCache(self.CACHE_DIR, self.RESULT_CACHE_MEMORY_BYTES)
+        # Opcjonalne pobieranie w tle sąsiednich obszarów (włączane w widoku).
+        self.prefetcher = Prefetcher(
+            lambda bbox, size, interval, cancel_token: self.app.data_loader.fetch_data(
+                bbox, size, interval, cancel_token=cancel_token
+            ),
+            self.scene_cache,
+        )
 
     def set_view(self, view: "MapView"):
         self.view = view
 
+    def _begin_operation(self) -> CancellationToken:
+        """Anuluje poprzednią operację (jeśli trwa) i zwraca token nowej."""
+        if self._operation_token is not None:
+            self._operation_token.cancel()
+        self._operation_token = CancellationToken()
+        if self.view:
+            self.view.set_cancel_button_state(True)
+        return self._operation_token
+
+    def _is_current(self, token: CancellationToken) -> bool:
+        return token is self._operation_token
+
+    def _finish_operation(self, token: CancellationToken):
+        # Wołane z wątku roboczego; zastąpiona operacja nie rusza przycisków.
+        if self._is_current(token) and self.view and self.view.winfo_exists():
+            self.app.after(0, self.view.set_cancel_button_state, False)
+
+    def shutdown(self):
+        """Przerywa bieżącą operację i zatrzymuje prefetch (zamykanie aplikacji)."""
+        if self._operation_token is not None:
+            self._operation_token.cancel()
+        self.prefetcher.shutdown()
+        self.result_cache.flush()
+
+    def handle_cancel(self):
+        """Przerywa bieżącą operację (przycisk Cancel w widoku)."""
+        if self._operation_token is None or self._operation_token.cancelled:
+            return
+        self._operation_token.cancel()
+        if self.view:
+            self.view.render_worker.cancel()
+            self.view.set_status("Cancelling...")
+
     def handle_fetch_data(self):
         if not self.view: return
         
@@ -47,10 +118,50 @@ class MapController:
         self.view.set_fetch_button_state(False)
         self.view.set_calc_buttons_state(False)
         self.view.set_status("Rozpoczynam ładowanie danych...")
+        token = self._begin_operation()
         
         thread = threading.Thread(
             target=self._data_loader_worker,
-            args=(top_left, bottom_right, image_size, time_interval, zoom),
+            args=(top_left, bottom_right, image_size, time_interval, zoom, token),
+            daemon=True
+        )
+        thread.start()
+
+    def set_prefetch_enabled(self, enabled: bool):
+        self.prefetcher.set_enabled(enabled)
+        if enabled:
+            self.handle_map_moved()
+
+    def handle_map_moved(self):
+        """Przekazuje bieżący widok mapy do prefetchera (jeśli jest włączony)."""
+        if not (self.view and self.view.winfo_exists() and self.prefetcher.enabled and self.app.data_loader):
+            return
+        top_left, bottom_right, image_size, zoom = self.view.get_precise_view_data()
+        bbox = self._view_bbox(top_left, bottom_right, zoom)
+        self.prefetcher.update_view(bbox, image_size, self.view.get_time_interval(), zoom)
+
+    def handle_change_detection(self, index_type: str = "NDVI"):
+        """Analiza zmian wskaźnika w zakresie dat z widoku (kilka przedziałów)."""
+        if not self.view: return
+
+        data = self.view.get_view_parameters()
+        if not data: return
+
+        top_left, bottom_right, image_size, time_interval, zoom = data
+        try:
+            intervals = split_interval(time_interval, self.TIME_SERIES_STEPS)
+        except ValueError as e:
+            self.view.set_status(f"Błąd: {e}")
+            return
+
+        self.view.set_all_buttons_state(False)
+        self.view.set_status(f"Analiza zmian {index_type}: pobieranie {len(intervals)} przedziałów...")
+        token = self._begin_operation()
+        self._start_timer()
+
+        thread = threading.Thread(
+            target=self._change_detection_worker,
+            args=(index_type, top_left, bottom_right, image_size, intervals, zoom, token),
             daemon=True
         )
         thread.start()
@@ -63,45 +174,57 @@ class MapController:
         if self.view:
             self.view.set_status(f"Obliczanie {index_type}...")
             self.view.set_all_buttons_state(False)
+        token = self._begin_operation()
         self._start_timer()
         
-        thread = threading.Thread(target=self._calculation_worker, args=(index_type,), daemon=True)
+        thread = threading.Thread(target=self._calculation_worker, args=(index_type, token), daemon=True)
         thread.start()
 
-    def _data_loader_worker(self, top_left, bottom_right, image_size, time_interval, zoom):
+    def _data_loader_worker(self, top_left, bottom_right, image_size, time_interval, zoom, token: CancellationToken):
+        self.prefetcher.pause()
         try:
-            precision = self._get_precision_for_zoom(zoom)
-            north_lat, west_lng = top_left
-            south_lat, east_lng = bottom_right
-            bbox = self._round_bbox((west_lng, south_lat, east_lng, north_lat), precision)
-            
-            cache_path = self._generate_cache_path(bbox, image_size, time_interval, zoom)
+            bbox = self._view_bbox(top_left, bottom_right, zoom)
 
-            if os.path.exists(cache_path):
+            cached = self.scene_cache.get(bbox, image_size, time_interval, zoom)
+            if cached is not None:
                 if self.view and self.view.winfo_exists():
                     self.app.after(0, self.view.set_status, "Cache hit! Ładowanie danych z dysku...")
-                self.raw_data = read_geotiff_bands(cache_path)
+                scene = cached
             else:
                 if self.view and self.view.winfo_exists():
                     self.app.after(0, self.view.set_status, "Cache miss. Pobieranie danych z API...")
-                fetched_data = self.app.data_loader.fetch_data(bbox, image_size, time_interval)
+                fetched_data = self.app.data_loader.fetch_data(bbox, image_size, time_interval, cancel_token=token)
                 if not fetched_data: raise Exception("Nie udało się pobrać danych.")
+                # Pobrana scena trafia do cache także po anulowaniu - limit API jest już zużyty.
                 if self.view and self.view.winfo_exists():
                     self.app.after(0, self.view.set_status, "Zapisywanie danych w cache...")
-                save_bands_to_geotiff(fetched_data, bbox, cache_path)
-                self.raw_data = fetched_data
-            
+                self.scene_cache.put(fetched_data, bbox, image_size, time_interval, zoom)
+                scene = fetched_data
+            # Anulowana (lub zastąpiona nowszą) operacja nie podmienia danych.
+            check_cancelled(token)
+            self.raw_data = scene
+            print(self.scene_cache.format_stats())
+            self.prefetcher.update_view(bbox, image_size, time_interval, zoom, fetched=True)
+            self.scene_key = self.scene_cache.make_key(bbox, image_size, time_interval, zoom)
+            self.scene_bbox = bbox
+
             if self.view and self.view.winfo_exists():
-                self.app.after(0, self.view.set_status, "Dane załadowane. Gotowy do obliczeń.")
+                self.app.after(0, self.view.set_status, f"Dane załadowane. Gotowy do obliczeń. ({self.scene_cache.format_stats()})")
                 self.app.after(0, self.view.set_calc_buttons_state, True)
+        except OperationCancelled:
+            if self._is_current(token) and self.view and self.view.winfo_exists():
+                self.app.after(0, self.view.set_status, "Ładowanie danych anulowane.")
+                self.app.after(0, self.view.set_calc_buttons_state, self.raw_data is not None)
         except Exception as e:
-            if self.view and self.view.winfo_exists():
+            if self._is_current(token) and self.view and self.view.winfo_exists():
                 self.app.after(0, self.view.set_status, f"Błąd podczas ładowania danych: {e}")
         finally:
-            if self.view and self.view.winfo_exists():
+            self.prefetcher.resume()
+            self._finish_operation(token)
+            if self._is_current(token) and self.view and self.view.winfo_exists():
                 self.app.after(0, self.view.set_fetch_button_state, True)
 
-    def _calculation_worker(self, index_type: str):
+    def _calculation_worker(self, index_type: str, token: CancellationToken):
         try:
             # ZMIANA: Sprawdzanie istnienia widoku przed pobraniem danych
             if not (self.view and self.view.winfo_exists()):
@@ -109,17 +232,32 @@ class MapController:
                 return
             
             processor_type = self.view.get_selected_processor()
+            n_threads = self.view.get_cpu_thread_count()
             self.last_calculated_index = index_type
-            
-            if processor_type == "GPU":
-                self.index_result, self.result_mask = calculate_index_gpu(self.raw_data, index_type)
-            else:
-                n_threads = self.view.get_cpu_thread_count()
-                self.index_result, self.result_mask = calculate_index_cpu(self.raw_data, index_type, n_jobs=n_threads)
+
+            result_key = self.result_cache.make_key(self.scene_key, index_type, self.RESULT_DTYPE)
+            result = self.result_cache.get(result_key)
+            if result is None:
+                index_types = list(self.FUSED_INDICES) if index_type in self.FUSED_INDICES else [index_type]
+                results, _ = self._calculate(processor_type, n_threads, self.raw_data, index_types, token)
+                # Widok tablicy pozostaje ważny, nawet gdy cache zwolni segment.
+                result = np.asarray(results[index_type])
+                for calculated_type, calculated in results.items():
+                    key = self.result_cache.make_key(self.scene_key, calculated_type, self.RESULT_DTYPE)
+                    self.result_cache.put(key, calculated, self.scene_bbox)
+            print(self.result_cache.format_stats())
+            check_cancelled(token)
+            self.result_mask = self.raw_data["dataMask"]
+            self.result_bbox = self.scene_bbox
+            # Wizualizacja pracuje na float32 (NaN poza danymi).
+            self.index_result = dequantize(result)
             
             if self.view and self.view.winfo_exists():
                 self.app.after(0, self.view.display_result, index_type)
             
+        except OperationCancelled:
+            if self._is_current(token) and self.view and self.view.winfo_exists():
+                self.app.after(0, self.view.set_status, f"Calculation of {index_type} cancelled.")
         except Exception as e:
             error_message = f"An error occurred during calculation:\n\n{type(e).__name__}: {e}"
             print(f"ERROR in calculation worker: {error_message}")
@@ -127,9 +265,85 @@ class MapController:
                 self.app.after(0, lambda: messagebox.showerror("Calculation Error", error_message))
                 self.app.after(0, self.view.set_status, "Calculation failed. See error details.")
         finally:
-            self._stop_timer()
+            self._finish_operation(token)
+            if self._is_current(token):
+                self._stop_timer()
+                if self.view and self.view.winfo_exists():
+                    self.app.after(0, self.view.set_all_buttons_state, True)
+
+    def _calculate(self, processor_type: str, n_threads: int, bands: dict, index_types: list, token: CancellationToken = None) -> tuple:
+        """Liczy wskaźniki backendem wybranym w widoku (przerywalnie przez `token`)."""
+        if processor_type == "AUTO":
+            if backend_selector.load_model() is None:
+                if self.view and self.view.winfo_exists():
+                    self.app.after(0, self.view.set_status, "Krótka kalibracja trybu Auto (jednorazowo, można przerwać)...")
+                backend_selector.calibrate_quick(cancel_token=token)
+            return backend_selector.calculate_indices(bands, index_types, self.RESULT_DTYPE, token)
+        if processor_type == "GPU":
+            return calculate_indices_gpu(bands, index_types, result_dtype=self.RESULT_DTYPE, cancel_token=token)
+        if processor_type == "TAICHI_CPU":
+            return calculate_indices_gpu(bands, index_types, arch="cpu", n_jobs=n_threads, result_dtype=self.RESULT_DTYPE, cancel_token=token)
+        if processor_type == "CPU_THREADS":
+            return calculate_indices_cpu_threads(bands, index_types, n_jobs=n_threads, result_dtype=self.RESULT_DTYPE, cancel_token=token)
+        # Wyniki zostają w pamięci współdzielonej (bez kopii); cache wyników
+        # zwalnia segment, gdy wynik wypadnie z RAM (widoki zostają ważne).
+        return calculate_indices_cpu(bands, index_types, n_jobs=n_threads, return_shared=True, result_dtype=self.RESULT_DTYPE, cancel_token=token)
+
+    def _change_detection_worker(self, index_type, top_left, bottom_right, image_size, intervals, zoom, token: CancellationToken):
+        self.prefetcher.pause()
+        try:
+            if not (self.view and self.view.winfo_exists()):
+                return
+            processor_type = self.view.get_selected_processor()
+            n_threads = self.view.get_cpu_thread_count()
+            bbox = self._view_bbox(top_left, bottom_right, zoom)
+
+            def fetch_scene(interval):
+                check_cancelled(token)
+                return self.scene_cache.get_or_fetch(
+                    bbox, image_size, interval, zoom,
+                    lambda *args: self.app.data_loader.fetch_data(*args, cancel_token=token),
+                )
+
+            def calculate(bands, index_types):
+                return self._calculate(processor_type, n_threads, bands, index_types, token)
+
+            def on_date(interval, done, total, accumulator):
+                # Wynik częściowy: różnica z dat, które już dotarły.
+                if token.cancelled or not (self.view and self.view.winfo_exists()):
+                    return
+                self.app.after(0, self.view.set_status, f"Analiza zmian {index_type}: {done}/{total} przedziałów ({interval[0]}..{interval[1]})")
+                if done >= 2 and accumulator.count.max() >= 2:
+                    self._show_change(accumulator.difference(), accumulator.count, bbox)
+
+            self.change_results = run_time_series(fetch_scene, calculate, intervals, index_type, on_date, cancel_token=token)
+            self._show_change(self.change_results["difference"], self.change_results["count"], bbox)
+            print(self.scene_cache.format_stats())
+        except OperationCancelled:
+            if self._is_current(token) and self.view and self.view.winfo_exists():
+                self.app.after(0, self.view.set_status, "Change detection cancelled.")
+        except Exception as e:
+            error_message = f"An error occurred during change detection:\n\n{type(e).__name__}: {e}"
+            print(f"ERROR in change detection worker: {error_message}")
             if self.view and self.view.winfo_exists():
-                self.app.after(0, self.view.set_all_buttons_state, True)
+                self.app.after(0, lambda: messagebox.showerror("Change Detection Error", error_message))
+                self.app.after(0, self.view.set_status, "Change detection failed. See error details.")
+        finally:
+            self.prefetcher.resume()
+            self._finish_operation(token)
+            if self._is_current(token):
+                self._stop_timer()
+                if self.view and self.view.winfo_exists():
+                    self.app.after(0, self.view.set_fetch_button_state, True)
+                    self.app.after(0, self.view.set_calc_buttons_state, self.raw_data is not None)
+
+    def _show_change(self, difference, count, bbox):
+        self.index_result = difference
+        self.result_mask = (count >= 2).astype(np.uint8)
+        self.result_bbox = bbox
+        self.last_calculated_index = "CHANGE"
+        if self.view and self.view.winfo_exists():
+            self.app.after(0, self.view.display_result, "CHANGE")
 
     # ... (reszta metod bez zmian)
     def _get_precision_for_zoom(self, zoom: int) -> int:
@@ -141,10 +355,11 @@ class MapController:
     def _round_bbox(self, bbox: tuple, precision: int) -> tuple:
         return tuple(round(coord, precision) for coord in bbox)
 
-    def _generate_cache_path(self, bbox: tuple, image_size: tuple, time_interval: tuple, zoom: int) -> str:
-        request_string = f"{bbox}-{image_size}-{time_interval}-{zoom}"
-        request_hash = hashlib.md5(request_string.encode()).hexdigest()
-        return os.path.join(self.CACHE_DIR, f"{request_hash}.tif")
+    def _view_bbox(self, top_left: tuple, bottom_right: tuple, zoom: int) -> tuple:
+        north_lat, west_lng = top_left
+        south_lat, east_lng = bottom_right
+        precision = self._get_precision_for_zoom(zoom)
+        return self._round_bbox((west_lng, south_lat, east_lng, north_lat), precision)
 
     def _start_timer(self):
         self.start_time = time.perf_counter()
@@ -13,8 +13,10 @@ from src.core.io.data_reader import read_geotiff_bands
 from src.core.io.test_writer import save_test_results
 from src.core.io.test_reader import load_test_results
 from src.core.processing.index_calculator import calculate_index as calculate_index_gpu
+from src.core.processing.index_calculator import taichi_mode, warm_up_taichi
 from src.core.processing.cpu_index_calculator import calculate_index as calculate_index_cpu_multi
 from src.core.processing.cpu_single_thread_calculator import calculate_index as calculate_index_cpu_single
+from src.core.processing.cpu_threaded_calculator import calculate_index as calculate_index_cpu_threads
 from src.gui.utils import visualizer
 
 if TYPE_CHECKING:
@@ -30,6 +32,24 @@ class TestController:
     CPU_SCALABILITY_THREADS = sorted(list(set([1, 2, 4, 8, cpu_count()])))
     STANDARD_TEST_SIZE = 1024
 
+    def _scalability_configs(self) -> list:
+        """(etykieta, funkcja, argumenty, tryb Taichi albo None) konfiguracji testu rozmiarów."""
+        n = max(self.CPU_SCALABILITY_THREADS)
+        return [
+            ('GPU (Taichi)', calculate_index_gpu, {}, ("gpu", None)),
+            ('CPU (1-Thread, NumPy)', calculate_index_cpu_single, {}, None),
+            (f'CPU ({n}-Threads, SharedMem)', calculate_index_cpu_multi, {'n_jobs': n}, None),
+            (f'CPU ({n}-Threads, ThreadPool)', calculate_index_cpu_threads, {'n_jobs': n}, None),
+            (f'CPU ({n}-Threads, Taichi)', calculate_index_gpu, {'arch': 'cpu', 'n_jobs': n}, ("cpu", n)),
+        ]
+
+    @staticmethod
+    def _scalability_times(results: Dict, label: str) -> list:
+        # Starsze pliki wyników zapisywały SharedMem pod etykietą "CPU (N)-Threads, SharedMem)".
+        if label not in results and label.endswith('-Threads, SharedMem)'):
+            label = label.replace('-Threads, SharedMem)', ')-Threads, SharedMem)')
+        return results.get(label)
+
     def __init__(self, app: "MainApplication"):
         self.app = app
         self.view: "TestView" | None = None
@@ -104,16 +124,18 @@ class TestController:
             if self.view and self.view.winfo_exists():
                 self.app.after(0, self.view.update_progress, 0, "Test environment OK. Starting tests...")
             
-            all_results = {'scalability': {}, 'cpu_scaling': {}, 'gpu_overhead': {}}
+            all_results = {'scalability': {}, 'cpu_scaling': {}, 'cpu_thread_scaling': {}, 'gpu_overhead': {}}
             
-            num_scalability_runs = len(test_files) * self.REPETITIONS * 3
-            num_cpu_scaling_runs = len(self.CPU_SCALABILITY_THREADS) * self.REPETITIONS
-            total_steps = (num_scalability_runs + num_cpu_scaling_runs) * 2
+            configs = self._scalability_configs()
+            num_scalability_runs = len(test_files) * self.REPETITIONS * len(configs)
+            num_cpu_scaling_runs = len(self.CPU_SCALABILITY_THREADS) * self.REPETITIONS * 2
+            total_steps = (num_scalability_runs + num_cpu_scaling_runs + self.REPETITIONS) * 2
             completed_steps = 0
 
             for index_type in ["NDVI", "NDMI"]:
                 all_results['scalability'][index_type] = {}
                 all_results['cpu_scaling'][index_type] = {}
+                all_results['cpu_thread_scaling'][index_type] = {}
                 all_results['gpu_overhead'][index_type] = {}
 
                 # Testy skalowalności (w zależności od rozmiaru danych)
@@ -124,11 +146,11 @@ class TestController:
                     file_path = os.path.join(self.TEST_DATA_DIR, file_name)
                     bands_data = read_geotiff_bands(file_path)
 
-                    for config_label, func, kwargs in [
-                        ('GPU (Taichi)', calculate_index_gpu, {}),
-                        ('CPU (1-Thread, NumPy)', calculate_index_cpu_single, {}),
-                        (f'CPU ({max(self.CPU_SCALABILITY_THREADS)})-Threads, SharedMem)', calculate_index_cpu_multi, {'n_jobs': max(self.CPU_SCALABILITY_THREADS)})
-                    ]:
+                    for config_label, func, kwargs, mode in configs:
+                        if mode is not None and taichi_mode() != mode:
+                            # Zmiana trybu Taichi = ti.reset, ti.init i ponowna kompilacja
+                            # (setki ms) - to wywołanie nie jest liczone.
+                            func(bands_data, index_type, **kwargs)
                         times = []
                         for i in range(self.REPETITIONS):
                             status = f"Testing {index_type} Scalability on {size}x{size} ({config_label}, Rep {i+1})"
@@ -140,25 +162,44 @@ class TestController:
                             times.append(self._time_execution(func, bands_data, index_type, **kwargs))
                             completed_steps += 1
                         all_results['scalability'][index_type][size_key][config_label] = times
-                        if config_label == 'GPU (Taichi)' and size == self.STANDARD_TEST_SIZE:
-                            all_results['gpu_overhead'][index_type] = times
                         save_test_results(all_results, self.RESULTS_FILE)
 
+                # Narzut pierwszego uruchomienia GPU: po przełączeniu Taichi w inny
+                # tryb pierwsze wywołanie obejmuje inicjalizację i kompilację JIT.
+                bands_data_gpu = read_geotiff_bands(cpu_test_file_path)
+                warm_up_taichi("cpu", max(self.CPU_SCALABILITY_THREADS))
+                times = []
+                for i in range(self.REPETITIONS):
+                    status = f"Testing {index_type} GPU first-run overhead (Rep {i+1})"
+                    if self.view and self.view.winfo_exists():
+                        self.app.after(0, self.view.update_progress, (completed_steps/total_steps)*100, status)
+                    else:
+                        print("Test view closed, aborting tests.")
+                        return
+                    times.append(self._time_execution(calculate_index_gpu, bands_data_gpu, index_type))
+                    completed_steps += 1
+                all_results['gpu_overhead'][index_type] = times
+                save_test_results(all_results, self.RESULTS_FILE)
+
                 # Testy skalowalności CPU (w zależności od liczby wątków)
                 bands_data_cpu = read_geotiff_bands(cpu_test_file_path)
-                for threads in self.CPU_SCALABILITY_THREADS:
-                    times = []
-                    for i in range(self.REPETITIONS):
-                        status = f"Testing {index_type} CPU Scaling with {threads} threads (Rep {i+1})"
-                        if self.view and self.view.winfo_exists():
-                            self.app.after(0, self.view.update_progress, (completed_steps/total_steps)*100, status)
-                        else:
-                            print("Test view closed, aborting tests.")
-                            return
-                        times.append(self._time_execution(calculate_index_cpu_multi, bands_data_cpu, index_type, n_jobs=threads))
-                        completed_steps += 1
-                    all_results['cpu_scaling'][index_type][f'{threads}-Threads'] = times
-                    save_test_results(all_results, self.RESULTS_FILE)
+                for scaling_key, backend_label, func in [
+                    ('cpu_scaling', 'SharedMem', calculate_index_cpu_multi),
+                    ('cpu_thread_scaling', 'ThreadPool', calculate_index_cpu_threads),
+                ]:
+                    for threads in self.CPU_SCALABILITY_THREADS:
+                        times = []
+                        for i in range(self.REPETITIONS):
+                            status = f"Testing {index_type} CPU Scaling ({backend_label}) with {threads} threads (Rep {i+1})"
+                            if self.view and self.view.winfo_exists():
+                                self.app.after(0, self.view.update_progress, (completed_steps/total_steps)*100, status)
+                            else:
+                                print("Test view closed, aborting tests.")
+                                return
+                            times.append(self._time_execution(func, bands_data_cpu, index_type, n_jobs=threads))
+                            completed_steps += 1
+                        all_results[scaling_key][index_type][f'{threads}-Threads'] = times
+                        save_test_results(all_results, self.RESULTS_FILE)
 
             if self.view and self.view.winfo_exists():
                 self.app.after(0, self.view.update_progress, 100, "All tests finished. Generating full report...")
@@ -185,9 +226,12 @@ class TestController:
         # Wykres 1: Przegląd wydajności
         fig1, ax1 = plt.subplots(figsize=(10, 6))
         fig1.suptitle(f"Performance Overview ({self.STANDARD_TEST_SIZE}x{self.STANDARD_TEST_SIZE} data)", fontsize=16)
-        labels = ['GPU (Taichi)', 'CPU (1-Thread, NumPy)', f'CPU ({max(self.CPU_SCALABILITY_THREADS)})-Threads, SharedMem)']
-        ndvi_times = [np.mean(time_results['scalability']['NDVI'][str(self.STANDARD_TEST_SIZE)][l]) * 1000 for l in labels]
-        ndmi_times = [np.mean(time_results['scalability']['NDMI'][str(self.STANDARD_TEST_SIZE)][l]) * 1000 for l in labels]
+        ndvi_results = time_results['scalability']['NDVI'][str(self.STANDARD_TEST_SIZE)]
+        ndmi_results = time_results['scalability']['NDMI'][str(self.STANDARD_TEST_SIZE)]
+        # Starsze pliki wyników nie zawierają wszystkich konfiguracji.
+        labels = [c[0] for c in self._scalability_configs() if self._scalability_times(ndvi_results, c[0]) is not None]
+        ndvi_times = [np.mean(self._scalability_times(ndvi_results, l)) * 1000 for l in labels]
+        ndmi_times = [np.mean(self._scalability_times(ndmi_results, l)) * 1000 for l in labels]
         x = np.arange(len(labels)); width = 0.35
         rects1 = ax1.bar(x - width/2, ndvi_times, width, label='NDVI'); rects2 = ax1.bar(x + width/2, ndmi_times, width, label='NDMI')
         ax1.set_ylabel('Average Time (ms)'); ax1.set_xticks(x); ax1.set_xticklabels(labels, rotation=10); ax1.legend()
@@ -201,9 +245,12 @@ class TestController:
         fig2.suptitle("CPU Parallelization Scalability", fontsize=16)
         cpu_times_ndvi = [np.mean(time_results['cpu_scaling']['NDVI'][f'{t}-Threads']) * 1000 for t in self.CPU_SCALABILITY_THREADS]
         ax2.plot(self.CPU_SCALABILITY_THREADS, cpu_times_ndvi, marker='o', linestyle='-', label='Parallel CPU Time (NDVI)')
+        if time_results.get('cpu_thread_scaling', {}).get('NDVI'):
+            thread_times_ndvi = [np.mean(time_results['cpu_thread_scaling']['NDVI'][f'{t}-Threads']) * 1000 for t in self.CPU_SCALABILITY_THREADS]
+            ax2.plot(self.CPU_SCALABILITY_THREADS, thread_times_ndvi, marker='s', linestyle='-', label='Thread Pool CPU Time (NDVI)')
         single_thread_time = np.mean(time_results['scalability']['NDVI'][str(self.STANDARD_TEST_SIZE)]['CPU (1-Thread, NumPy)']) * 1000
         ax2.axhline(y=single_thread_time, color='gray', linestyle='--', label=f'Optimized Single-Thread Time ({single_thread_time:.1f} ms)')
-        ax2.set_xlabel('Number of Processes'); ax2.set_ylabel('Average Time (ms)'); ax2.set_xticks(self.CPU_SCALABILITY_THREADS); ax2.legend(); ax2.grid(True)
+        ax2.set_xlabel('Number of Processes / Threads'); ax2.set_ylabel('Average Time (ms)'); ax2.set_xticks(self.CPU_SCALABILITY_THREADS); ax2.legend(); ax2.grid(True)
         fig2.savefig(os.path.join(self.CHARTS_DIR, "02_cpu_scalability.png"), dpi=300)
         all_figures.append(fig2); all_descriptions.append("This chart analyzes the parallel CPU performance. The blue line shows that adding more processes reduces execution time, proving the implementation scales. However, it also shows that the parallel version starts with a high time cost (overhead) and never becomes faster than the superior, non-parallel single-thread approach (gray line) for this task.")
         plt.close(fig2)
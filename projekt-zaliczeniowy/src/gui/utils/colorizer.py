@@ -0,0 +1,148 @@
+# src/gui/utils/colorizer.py
+
+import threading
+import numpy as np
+import matplotlib.colors
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import cpu_count
+from typing import Dict, Sequence
+
+from src.core.processing.quantization import dequantize, quantized_format
+
+# Kolorowanie idzie blokami wierszy: tablice pomocnicze mają rozmiar bloku,
+# a bloki mogą być liczone równolegle w puli wątków.
+COLORIZE_BLOCK_ROWS = 256
+# Poniżej tej liczby pikseli kolorujemy w jednym wątku.
+PARALLEL_COLORIZE_PIXELS = 1024 * 1024
+# Do tylu granic przedziałów indeksy liczone są porównaniami zamiast searchsorted.
+MAX_COMPARE_BOUNDARIES = 16
+
+# Własna pula wątków (searchsorted/take zwalniają GIL); nie dzielimy puli
+# obliczeń, żeby kolorowanie nie zmieniało jej rozmiaru.
+_executor: ThreadPoolExecutor | None = None
+_executor_size = 0
+# Kolorują jednocześnie wątek renderowania i wątki nakładki kafelków: zmiana
+# rozmiaru puli nie może zamknąć puli, do której inne wywołanie zleca bloki.
+_lock = threading.RLock()
+
+
+def _get_executor(n_jobs: int) -> ThreadPoolExecutor:
+    global _executor, _executor_size
+    with _lock:
+        if _executor is None or _executor_size != n_jobs:
+            if _executor is not None:
+                _executor.shutdown(wait=True)
+            _executor = ThreadPoolExecutor(max_workers=n_jobs, thread_name_prefix="colorize")
+            _executor_size = n_jobs
+        return _executor
+
+
+def shutdown_pool() -> None:
+    """Zamyka pulę wątków kolorowania. Bezpieczne do wielokrotnego wywołania."""
+    global _executor, _executor_size
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+            _executor_size = 0
+
+
+def build_lut(colors: Sequence[str], boundaries: Sequence[float]) -> Dict[str, np.ndarray]:
+    """
+    Przygotowuje tablicę kolorów RGBA (uint8) dla dyskretnej palety.
+    Kolory przedziałów są liczone raz przez matplotlib (ListedColormap +
+    BoundaryNorm), więc wynik jest taki sam jak `colormap(norm(dane))`:
+
+      table[0]          - poniżej pierwszej granicy,
+      table[1 .. n-1]   - przedziały [b[i-1], b[i]),
+      table[n]          - od ostatniej granicy w górę (także NaN, jak w BoundaryNorm).
+    """
+    cmap = matplotlib.colors.ListedColormap(colors)
+    boundaries = np.asarray(boundaries, dtype=np.float64)
+    norm = matplotlib.colors.BoundaryNorm(boundaries, cmap.N)
+    probes = np.concatenate((
+        [boundaries[0] - 1.0],
+        (boundaries[:-1] + boundaries[1:]) / 2,
+        [boundaries[-1]],
+    ))
+    rgba = cmap(norm(probes))
+    rgba[:, 3] = 1.0
+    # Piksel RGBA jako jedno uint32 - kolorowanie to indeksowanie 1D.
+    table = np.ascontiguousarray((rgba * 255).astype(np.uint8)).view(np.uint32).ravel()
+    return {"boundaries": boundaries, "table": table, "code_tables": {}}
+
+
+def _code_table(lut: Dict[str, np.ndarray], dtype: np.dtype) -> np.ndarray:
+    # Dla wyników skwantyzowanych (int16/uint8) kolor zależy tylko od kodu,
+    # więc kolorowanie to jedno indeksowanie tablicą wszystkich kodów.
+    table = lut["code_tables"].get(dtype)
+    if table is None:
+        info = np.iinfo(dtype)
+        codes = np.arange(info.min, info.max + 1, dtype=dtype)
+        table = lut["table"][_bin_indices(lut, dequantize(codes))]
+        lut["code_tables"][dtype] = table
+    return table
+
+
+def _bin_indices(lut: Dict[str, np.ndarray], values: np.ndarray) -> np.ndarray:
+    # Indeks = liczba granic <= wartość. Przy kilku granicach porównania
+    # w miejscu są ~3x szybsze od searchsorted. Granice są float64, jak
+    # w BoundaryNorm; NaN (żadne porównanie nieprawdziwe) trafia na koniec.
+    boundaries = lut["boundaries"]
+    if len(boundaries) > MAX_COMPARE_BOUNDARIES:
+        return np.searchsorted(boundaries, values, side="right").astype(np.uint8)
+    indices = np.full(values.shape, len(boundaries), dtype=np.uint8)
+    below = np.empty(values.shape, dtype=bool)
+    for boundary in boundaries:
+        np.less(values, boundary, out=below)
+        np.subtract(indices, below, out=indices, casting="unsafe")
+    return indices
+
+
+def _colorize_rows(lut, values: np.ndarray, data_mask: np.ndarray, out: np.ndarray, rows: slice):
+    block = values[rows]
+    if quantized_format(block.dtype) is not None:
+        offset = -int(np.iinfo(block.dtype).min)
+        np.take(_code_table(lut, block.dtype), block.astype(np.int32) + offset, out=out[rows])
+    else:
+        np.take(lut["table"], _bin_indices(lut, block), out=out[rows])
+    # Poza maską: przezroczysty piksel (0, 0, 0, 0).
+    out[rows][data_mask[rows] == 0] = 0
+
+
+def colorize(
+    values: np.ndarray,
+    data_mask: np.ndarray,
+    lut: Dict[str, np.ndarray],
+    out: np.ndarray = None,
+    n_jobs: int = None,
+) -> np.ndarray:
+    """
+    Koloruje wynik wskaźnika do bufora RGBA uint8 (h, w, 4): przedział
+    wartości -> indeks w tablicy kolorów -> kolor, z maską w tym samym
+    przebiegu. Przyjmuje float32 oraz wyniki skwantyzowane (int16/uint8).
+    Duże obrazy są dzielone na bloki wierszy liczone w puli wątków.
+    """
+    values = np.asarray(values)
+    h, w = values.shape
+    if out is None:
+        out = np.empty((h, w, 4), dtype=np.uint8)
+    elif out.shape != (h, w, 4) or out.dtype != np.uint8 or not out.flags.c_contiguous:
+        raise ValueError(f"Bufor 'out' musi być ciągłą tablicą uint8 o kształcie {(h, w, 4)}.")
+    pixels = out.view(np.uint32).reshape(h, w)
+
+    if quantized_format(values.dtype) is not None:
+        _code_table(lut, values.dtype)  # raz, przed podziałem na wątki
+    if n_jobs is None:
+        n_jobs = cpu_count()
+    blocks = [slice(start, min(start + COLORIZE_BLOCK_ROWS, h)) for start in range(0, h, COLORIZE_BLOCK_ROWS)]
+    if n_jobs == 1 or h * w < PARALLEL_COLORIZE_PIXELS or len(blocks) == 1:
+        for rows in blocks:
+            _colorize_rows(lut, values, data_mask, pixels, rows)
+    else:
+        with _lock:
+            executor = _get_executor(n_jobs)
+            futures = [executor.submit(_colorize_rows, lut, values, data_mask, pixels, rows) for rows in blocks]
+        for future in futures:
+            future.result()
+    return out
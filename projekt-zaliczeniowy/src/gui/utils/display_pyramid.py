@@ -0,0 +1,63 @@
+# src/gui/utils/display_pyramid.py
+
+import math
+import threading
+import numpy as np
+from typing import Dict, Tuple
+
+from src.core.processing.quantization import dequantize
+
+
+def reduce_masked_mean(values: np.ndarray, data_mask: np.ndarray, factor: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Zmniejsza wynik `factor` razy średnią z bloków factor x factor liczoną
+    tylko z pikseli z danymi (maska != 0, wartość skończona). Blok bez
+    takich pikseli dostaje maskę 0. Bloki na krawędziach mogą być niepełne.
+    """
+    values = dequantize(values)
+    valid = (data_mask != 0) & np.isfinite(values)
+    weighted = np.where(valid, values, np.float32(0))
+    rows = np.arange(0, values.shape[0], factor)
+    cols = np.arange(0, values.shape[1], factor)
+    sums = np.add.reduceat(np.add.reduceat(weighted, rows, axis=0), cols, axis=1)
+    counts = np.add.reduceat(np.add.reduceat(valid.astype(np.float32), rows, axis=0), cols, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        reduced = (sums / counts).astype(np.float32)
+    reduced_mask = (counts > 0).astype(np.uint8)
+    reduced[reduced_mask == 0] = np.nan
+    return reduced, reduced_mask
+
+
+class DisplayPyramid:
+    """
+    Zmniejszone wersje wyniku (co 2x) do wyświetlania. Poziom potrzebny
+    dla danego rozmiaru widżetu jest liczony przy pierwszym użyciu - z
+    najbliższego gotowego, dokładniejszego poziomu - i zapamiętywany,
+    więc zmiana rozmiaru okna koloruje tylko obraz wielkości widżetu.
+    Poziomy mogą być czytane z wielu wątków (render, kafelki mapy).
+    """
+
+    def __init__(self, values: np.ndarray, data_mask: np.ndarray):
+        self.shape = np.shape(values)
+        self._levels: Dict[int, Tuple[np.ndarray, np.ndarray]] = {1: (values, data_mask)}
+        self._lock = threading.Lock()
+
+    def factor_for(self, target_size: Tuple[int, int]) -> int:
+        """Największe zmniejszenie (potęga 2), po którym obraz nadal wypełnia `target_size`."""
+        target_w, target_h = target_size
+        h, w = self.shape
+        scale = min(target_w / w, target_h / h)
+        if scale >= 1:
+            return 1
+        return 2 ** int(math.floor(math.log2(1 / scale)))
+
+    def level(self, factor: int) -> Tuple[np.ndarray, np.ndarray]:
+        with self._lock:
+            if factor not in self._levels:
+                base = max(f for f in self._levels if f < factor and factor % f == 0)
+                values, data_mask = self._levels[base]
+                self._levels[factor] = reduce_masked_mean(values, data_mask, factor // base)
+            return self._levels[factor]
+
+    def level_for(self, target_size: Tuple[int, int]) -> Tuple[np.ndarray, np.ndarray]:
+        return self.level(self.factor_for(target_size))
@@ -0,0 +1,67 @@
+# src/gui/utils/render_worker.py
+
+import threading
+import traceback
+from typing import Any, Callable, Optional, Tuple
+
+
+class RenderWorker:
+    """
+    Jeden wątek w tle, który przygotowuje obrazy (PIL) do wyświetlenia.
+
+    Oczekuje co najwyżej jedno zadanie: nowe `submit` zastępuje zadanie,
+    które jeszcze nie ruszyło, a wynik zadania już trwającego jest
+    odrzucany (`is_current` zwraca False dla starszych generacji).
+    Wynik trafia do `on_done(generacja, wynik, błąd)` przez `deliver`,
+    które ma go przekazać do wątku Tk (np. `widget.after(0, ...)`).
+    """
+
+    def __init__(self, deliver: Callable[..., Any], name: str = "render"):
+        self.deliver = deliver
+        self._condition = threading.Condition()
+        self._pending: Optional[Tuple[int, Callable[[], Any], Callable]] = None
+        self._generation = 0
+        self._stopped = False
+        self._thread = threading.Thread(target=self._worker, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, render: Callable[[], Any], on_done: Callable[[int, Any, Optional[BaseException]], None]) -> int:
+        with self._condition:
+            self._generation += 1
+            self._pending = (self._generation, render, on_done)
+            self._condition.notify()
+            return self._generation
+
+    def cancel(self):
+        """Porzuca oczekujące zadanie i unieważnia wynik trwającego."""
+        with self._condition:
+            self._generation += 1
+            self._pending = None
+
+    def is_current(self, generation: int) -> bool:
+        return generation == self._generation
+
+    def shutdown(self):
+        with self._condition:
+            self._stopped = True
+            self._pending = None
+            self._condition.notify()
+
+    def _worker(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                generation, render, on_done = self._pending
+                self._pending = None
+
+            result, error = None, None
+            try:
+                result = render()
+            except Exception as e:
+                traceback.print_exc()
+                error = e
+            if self.is_current(generation):
+                self.deliver(on_done, generation, result, error)
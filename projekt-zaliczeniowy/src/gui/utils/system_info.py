@@ -1,4 +1,3 @@
-
 import platform
 from typing import Dict
 
@@ -12,6 +11,9 @@ try:
 except ImportError:
     psutil = None
 
+from src.core.system_info import get_cache_sizes
+
+
 def get_system_specs() -> Dict[str, str]:
     """
     Zbiera i formatuje kluczowe informacje o specyfikacji sprzętowej i systemowej.
@@ -20,20 +22,22 @@ def get_system_specs() -> Dict[str, str]:
 
     specs['OS'] = f"{platform.system()} {platform.release()} ({platform.machine()})"
 
+    cache_sizes = get_cache_sizes()
+    l2_cache_kb = cache_sizes['L2'] // 1024
+    l3_cache_mb = cache_sizes['L3'] // (1024 * 1024)
+
     if cpuinfo:
         info = cpuinfo.get_cpu_info()
-        l2_cache_kb = info.get('l2_cache_size', 0) // 1024
-        l3_cache_mb = info.get('l3_cache_size', 0) // (1024 * 1024)
-        
+
         specs['CPU'] = info.get('brand_raw', "N/A")
         specs['CPU Details'] = (
             f"Cores: {info.get('count', 'N/A')}, "
             f"Frequency: {info.get('hz_advertised_friendly', 'N/A')}, "
-            f"L2 Cache: {l2_cache_kb} KB, L3 Cache: {l3_cache_mb} MB" 
+            f"L2 Cache: {l2_cache_kb} KB, L3 Cache: {l3_cache_mb} MB"
         )
     else:
         specs['CPU'] = "N/A (required: 'py-cpuinfo')"
-        specs['CPU Details'] = "N/A"
+        specs['CPU Details'] = f"L2 Cache: {l2_cache_kb} KB, L3 Cache: {l3_cache_mb} MB"
 
     if psutil:
         ram_gb = psutil.virtual_memory().total / (1024**3)
@@ -43,4 +47,4 @@ def get_system_specs() -> Dict[str, str]:
 
     specs['GPU'] = "Device used by Taichi backend (e.g., NVIDIA, AMD, Intel)"
 
-    return specs
\ No newline at end of file
+    return specs
@@ -0,0 +1,216 @@
+# src/gui/utils/tile_overlay.py
+
+import collections
+import io
+import math
+import re
+import threading
+import urllib.request
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from PIL import Image
+from typing import Optional, Tuple
+
+from src.gui.utils import colorizer, visualizer
+from src.gui.utils.display_pyramid import DisplayPyramid
+
+TILE_SIZE = 256
+# Tyle gotowych kafelków (PNG) trzyma pamięć podręczna LRU (~kilkadziesiąt MB).
+TILE_CACHE_TILES = 1024
+# Wątki kolorujące kafelki (TkinterMapView pobiera kilka kafelków naraz).
+TILE_RENDER_WORKERS = 2
+# Limit czasu pobierania kafelka podkładu (s).
+BASE_TILE_TIMEOUT_S = 10
+
+_TILE_PATH = re.compile(r"^/(\d+)/(\d+)/(\d+)/(\d+)\.png$")
+
+
+def tile_pixel_coords(z: int, x: int, y: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Długości i szerokości geograficzne środków pikseli kafelka XYZ (Web Mercator)."""
+    n = TILE_SIZE * 2 ** z
+    offsets = np.arange(TILE_SIZE) + 0.5
+    lon = (x * TILE_SIZE + offsets) / n * 360.0 - 180.0
+    lat = np.degrees(np.arctan(np.sinh(np.pi * (1 - 2 * (y * TILE_SIZE + offsets) / n))))
+    return lon, lat
+
+
+def composite_tile(base: Optional[bytes], rgba: np.ndarray) -> bytes:
+    """Nakłada kafelek RGBA wyniku na kafelek podkładu (PNG/JPEG) i zwraca PNG."""
+    overlay = Image.fromarray(rgba, "RGBA")
+    if base is None:
+        image = overlay
+    else:
+        image = Image.open(io.BytesIO(base)).convert("RGBA")
+        if image.size != overlay.size:
+            image = image.resize(overlay.size, Image.LANCZOS)
+        image.alpha_composite(overlay)
+    buf = io.BytesIO()
+    image.save(buf, format="PNG", compress_level=1)
+    return buf.getvalue()
+
+
+class ResultTileSource:
+    """
+    Wynik wskaźnika (w siatce EPSG:4326 o zasięgu `bbox`) jako źródło
+    kafelków XYZ. Kafelek jest próbkowany z poziomu piramidy, którego piksel
+    odpowiada pikselowi kafelka, i kolorowany tylko w swoich 256x256
+    pikselach - pełny raster nigdy nie jest kolorowany.
+    """
+
+    def __init__(self, pyramid: DisplayPyramid, bbox: Tuple[float, float, float, float], index_type: str):
+        self.pyramid = pyramid
+        self.bbox = bbox
+        self.lut = visualizer.get_color_lut(index_type)
+
+    def render(self, z: int, x: int, y: int) -> Optional[np.ndarray]:
+        """Kafelek RGBA (256, 256, 4) albo None, gdy nie przecina wyniku."""
+        min_lon, min_lat, max_lon, max_lat = self.bbox
+        height, width = self.pyramid.shape
+        lon, lat = tile_pixel_coords(z, x, y)
+        cols = (lon - min_lon) / (max_lon - min_lon) * width
+        rows = (max_lat - lat) / (max_lat - min_lat) * height
+        col_valid = (cols >= 0) & (cols < width)
+        row_valid = (rows >= 0) & (rows < height)
+        if not col_valid.any() or not row_valid.any():
+            return None
+
+        # Ile pikseli wyniku przypada na piksel kafelka -> poziom piramidy.
+        step = min(cols[1] - cols[0], abs(rows[-1] - rows[0]) / (TILE_SIZE - 1))
+        factor = 2 ** int(math.floor(math.log2(step))) if step >= 2 else 1
+        values, data_mask = self.pyramid.level(factor)
+        level_rows = np.clip(rows // factor, 0, values.shape[0] - 1).astype(np.intp)
+        level_cols = np.clip(cols // factor, 0, values.shape[1] - 1).astype(np.intp)
+
+        tile_values = values[level_rows[:, None], level_cols[None, :]]
+        tile_mask = data_mask[level_rows[:, None], level_cols[None, :]] * (row_valid[:, None] & col_valid[None, :])
+        return colorizer.colorize(tile_values, tile_mask, self.lut, n_jobs=1)
+
+
+class TileOverlayServer:
+    """
+    Lokalny serwer HTTP (127.0.0.1, losowy port) udostępniający kafelki XYZ
+    podkładu `base_url` z nałożonym wynikiem - adres z `publish` ustawia się
+    przez `TkinterMapView.set_tile_server`. Nakładanie odbywa się tutaj, a nie
+    przez `set_overlay_tile_server`: TkinterMapView zapamiętuje kafelki już
+    z nakładką (zmiana adresu nakładki ich nie odświeża) i skaluje ją przez
+    `Image.ANTIALIAS`, którego nie ma w Pillow >= 10, więc kafelki wychodzą
+    puste. Kafelki są kolorowane na żądanie w małej puli wątków i trzymane
+    w pamięci LRU; kafelki poza wynikiem to niezmieniony podkład.
+
+    Każde `publish` zmienia adres kafelków (numer generacji w ścieżce), więc
+    mapa nie pokaże kafelków poprzedniego wyniku.
+    """
+
+    def __init__(self, base_url: str, cache_tiles: int = TILE_CACHE_TILES, n_workers: int = TILE_RENDER_WORKERS):
+        self.base_url = base_url
+        self.cache_tiles = cache_tiles
+        self._executor = ThreadPoolExecutor(max_workers=n_workers, thread_name_prefix="tiles")
+        self._lock = threading.Lock()
+        self._tiles: collections.OrderedDict = collections.OrderedDict()
+        self._source: Optional[ResultTileSource] = None
+        self._generation = 0
+        self._stats = collections.Counter()
+
+        overlay = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                match = _TILE_PATH.match(self.path)
+                if match is None:
+                    self.send_error(404)
+                    return
+                body = overlay.get_tile(*(int(part) for part in match.groups()))
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "image/png" if body.startswith(b"\x89PNG") else "image/jpeg")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="tile-server", daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def publish(self, pyramid: DisplayPyramid, bbox: Tuple[float, float, float, float], index_type: str) -> str:
+        """Ustawia nowy wynik i zwraca szablon adresu kafelków ({z}/{x}/{y})."""
+        source = ResultTileSource(pyramid, bbox, index_type)
+        with self._lock:
+            self._generation += 1
+            self._source = source
+            self._tiles.clear()
+            generation = self._generation
+        return f"http://127.0.0.1:{self.port}/{generation}/{{z}}/{{x}}/{{y}}.png"
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._source = None
+            self._tiles.clear()
+
+    def _fetch_base(self, z: int, x: int, y: int) -> Optional[bytes]:
+        url = self.base_url.replace("{x}", str(x)).replace("{y}", str(y)).replace("{z}", str(z))
+        request = urllib.request.Request(url, headers={"User-Agent": "TkinterMapView"})
+        try:
+            with urllib.request.urlopen(request, timeout=BASE_TILE_TIMEOUT_S) as response:
+                return response.read()
+        except OSError as e:
+            with self._lock:
+                self._stats["base_errors"] += 1
+            print(f"Nie udało się pobrać kafelka podkładu {z}/{x}/{y}: {e}")
+            return None
+
+    def get_tile(self, generation: int, z: int, x: int, y: int) -> Optional[bytes]:
+        """Kafelek PNG (podkład z wynikiem) albo None, gdy nie ma ani podkładu, ani wyniku."""
+        key = (generation, z, x, y)
+        with self._lock:
+            # Stara generacja albo brak wyniku: sam podkład.
+            source = self._source if generation == self._generation else None
+            tile = self._tiles.get(key) if source is not None else None
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                self._stats["hits"] += 1
+                return tile
+            self._stats["misses"] += 1
+        # Podkład pobierany w wątku żądania (czeka na sieć), kolorowanie w puli.
+        base = self._fetch_base(z, x, y)
+        if source is None:
+            return base
+        tile = self._executor.submit(self._render_png, source, base, z, x, y).result()
+        if tile is None:
+            return None
+        with self._lock:
+            if generation == self._generation:
+                self._tiles[key] = tile
+                while len(self._tiles) > self.cache_tiles:
+                    self._tiles.popitem(last=False)
+        return tile
+
+    def _render_png(self, source: ResultTileSource, base: Optional[bytes], z: int, x: int, y: int) -> Optional[bytes]:
+        rgba = source.render(z, x, y)
+        if rgba is None:
+            return base
+        try:
+            return composite_tile(base, rgba)
+        except OSError:
+            # Nieczytelny kafelek podkładu: sam wynik.
+            return composite_tile(None, rgba)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "cached_tiles": len(self._tiles)}
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._executor.shutdown(wait=False)
@@ -1,5 +1,6 @@
 # src/gui/utils/visualizer.py
 
+import functools
 import io
 import numpy as np
 import matplotlib.pyplot as plt
@@ -8,6 +9,8 @@ import matplotlib.cm
 from PIL import Image, ImageTk
 from typing import Tuple, List, Dict, Any
 
+from src.gui.utils import colorizer
+
 
 def _get_index_properties(index_type: str) -> Dict[str, Any]:
     """
@@ -55,6 +58,22 @@ def _get_index_properties(index_type: str) -> Dict[str, Any]:
             },
             "title": "NDMI (Wskaźnik Wilgotności)"
         }
+    elif index_type == "CHANGE":
+        # Różnica wartości wskaźnika między pierwszą a ostatnią datą.
+        rd_yl_gn_cmap = matplotlib.colormaps.get("RdYlGn").resampled(10)
+        return {
+            "colors": [
+                matplotlib.colors.rgb2hex(rd_yl_gn_cmap(i))
+                for i in np.linspace(0, 1, 10)
+            ],
+            "boundaries": [-1.0, -0.5, -0.3, -0.2, -0.1, 0.0, 0.1, 0.2, 0.3, 0.5, 1.0],
+            "labels": {
+                -0.5: "Silny Spadek",
+                0.0: "Bez Zmian",
+                0.5: "Silny Wzrost",
+            },
+            "title": "Zmiana Wskaźnika (ostatnia - pierwsza data)"
+        }
     else: # Domyślne wartości
         return {
             "colors": [matplotlib.colors.rgb2hex(c) for c in matplotlib.colormaps.get("viridis").colors],
@@ -74,27 +93,33 @@ def _create_discrete_cmap(
     return cmap, norm
 
 
-def create_heatmap_image(
-    index_data: np.ndarray, data_mask: np.ndarray, index_type: str
-) -> Image.Image:
-    """Tworzy obraz heatmapy (PIL.Image) na podstawie danych wskaźnika."""
+@functools.lru_cache(maxsize=32)
+def get_color_lut(index_type: str) -> Dict[str, np.ndarray]:
+    """Tablica kolorów (uint8 RGBA) palety wskaźnika, budowana raz."""
     props = _get_index_properties(index_type)
-    colormap, norm = _create_discrete_cmap(props["colors"], props["boundaries"])
-    
-    rgba_image = colormap(norm(index_data))
+    return colorizer.build_lut(props["colors"], props["boundaries"])
 
-    alpha_channel = np.full(index_data.shape, 1.0, dtype=np.float32)
-    alpha_channel[data_mask == 0] = 0.0
-    rgba_image[:, :, 3] = alpha_channel
 
-    rgb_image_uint8 = (rgba_image * 255).astype(np.uint8)
-    return Image.fromarray(rgb_image_uint8, "RGBA")
+def create_heatmap_image(
+    index_data: np.ndarray, data_mask: np.ndarray, index_type: str
+) -> Image.Image:
+    """
+    Tworzy obraz heatmapy (PIL.Image) na podstawie danych wskaźnika.
+    `index_data` może być dowolnym obiektem tablicopodobnym (np. SharedResult,
+    także skwantyzowanym) - jest czytany w miejscu, bez kopii. Kolory są
+    brane z tablicy palety prosto do bufora uint8 (colorizer).
+    """
+    rgba_image = colorizer.colorize(index_data, data_mask, get_color_lut(index_type))
+    return Image.fromarray(rgba_image, "RGBA")
 
 
-def create_legend_image(
-    index_type: str, width: int
-) -> ImageTk.PhotoImage:
-    """Tworzy obraz legendy (ImageTk.PhotoImage) dla danego wskaźnika."""
+@functools.lru_cache(maxsize=32)
+def render_legend_image(index_type: str, width: int) -> Image.Image:
+    """
+    Rysuje legendę wskaźnika jako obraz PIL (RGBA). Wynik jest zapamiętywany
+    dla pary (wskaźnik, szerokość) - matplotlib rysuje ją tylko raz. Nie
+    korzysta z Tk, więc może być wołana z wątku renderującego.
+    """
     props = _get_index_properties(index_type)
     colormap, norm = _create_discrete_cmap(props["colors"], props["boundaries"])
     
@@ -115,8 +140,16 @@ def create_legend_image(
     fig.savefig(buf, format="png", transparent=True, bbox_inches='tight', pad_inches=0.1)
     buf.seek(0)
     img = Image.open(buf)
+    img.load()
     plt.close(fig)
-    return ImageTk.PhotoImage(img)
+    return img
+
+
+def create_legend_image(
+    index_type: str, width: int
+) -> ImageTk.PhotoImage:
+    """Tworzy obraz legendy (ImageTk.PhotoImage) dla danego wskaźnika."""
+    return ImageTk.PhotoImage(render_legend_image(index_type, width))
 
 
 def create_heatmap_figure(
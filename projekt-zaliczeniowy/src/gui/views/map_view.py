@@ -14,9 +14,13 @@ from tkintermapview.utility_functions import osm_to_decimal
 from tkcalendar import DateEntry
 from pyproj import Geod
 
+from src.core.processing.indices import INDEX_EXPRESSIONS
 from src.gui.views.test_view import TestView
 # ZMIANA: Dodano import nowego modułu wizualizacji
 from src.gui.utils import visualizer
+from src.gui.utils.display_pyramid import DisplayPyramid
+from src.gui.utils.render_worker import RenderWorker
+from src.gui.utils.tile_overlay import TileOverlayServer
 
 if TYPE_CHECKING:
     from src.gui.app import MainApplication
@@ -47,6 +51,13 @@ class MapView(ttk.Frame):
     API_RESOLUTION_LIMIT_METERS = 1500.0
     VALIDATION_SAFETY_MARGIN = 1.10
     BACKGROUND_COLOR = "#333333" 
+    # Po tylu ms bez ruchu mapy widok jest przekazywany do prefetchera.
+    PREFETCH_DEBOUNCE_MS = 300
+    # Po tylu ms od ostatniej zmiany rozmiaru wynik jest rysowany ponownie.
+    RESIZE_RENDER_DEBOUNCE_MS = 150
+    # Podkład mapy; z włączoną nakładką mapa pobiera go przez TileOverlayServer.
+    BASE_TILE_SERVER = "https://mt1.google.com/vt/lyrs=s&x={x}&y={y}&z={z}"
+    MAX_MAP_ZOOM = 22
 
     def __init__(self, parent: "MainApplication", controller: "MapController", initial_position: tuple, initial_zoom: int, **kwargs):
         super().__init__(parent, padding=10, **kwargs)
@@ -58,8 +69,31 @@ class MapView(ttk.Frame):
         
         self.result_photo = None
         self.legend_photo = None
+        self._prefetch_after_id = None
+        # Zmniejszone wersje wyświetlanego wyniku (przeliczane tylko dla nowego wyniku).
+        self._pyramid = None
+        self._pyramid_source = None
+        self._displayed_index_type = None
+        self._rendered_size = None
+        self._resize_after_id = None
+        self._legend_key = None
+        # Kolorowanie i legenda liczone w tle; w wątku Tk powstaje tylko PhotoImage.
+        self.render_worker = RenderWorker(lambda callback, *args: self.after(0, callback, *args))
+        # Wynik jako nakładka kafelkowa na mapie (serwer startuje przy pierwszym użyciu).
+        self.tile_overlay: TileOverlayServer | None = None
+        self._overlay_key = None
 
         self._setup_ui()
+        self.bind("<Destroy>", self._on_destroy, add="+")
+
+    def _on_destroy(self, event):
+        """Zatrzymuje wątek renderowania i serwer nakładki razem z widokiem."""
+        if event.widget is not self:
+            return
+        self.render_worker.shutdown()
+        if self.tile_overlay is not None:
+            self.tile_overlay.shutdown()
+            self.tile_overlay = None
 
     def _setup_ui(self):
         self.grid_columnconfigure(0, weight=1)
@@ -84,23 +118,42 @@ class MapView(ttk.Frame):
         processor_frame.pack(side="left", fill="x", padx=10)
         
         self.processor_var = tk.StringVar(value="GPU")
+        auto_radio = ttk.Radiobutton(processor_frame, text="Auto", variable=self.processor_var, value="AUTO", command=self._on_processor_change)
+        auto_radio.pack(side="left", padx=(0, 5))
         gpu_radio = ttk.Radiobutton(processor_frame, text="GPU (Taichi)", variable=self.processor_var, value="GPU", command=self._on_processor_change)
         gpu_radio.pack(side="left")
-        cpu_radio = ttk.Radiobutton(processor_frame, text="CPU (Parallel)", variable=self.processor_var, value="CPU", command=self._on_processor_change)
+        cpu_radio = ttk.Radiobutton(processor_frame, text="CPU (Processes)", variable=self.processor_var, value="CPU", command=self._on_processor_change)
         cpu_radio.pack(side="left", padx=5)
+        cpu_threads_radio = ttk.Radiobutton(processor_frame, text="CPU (Threads)", variable=self.processor_var, value="CPU_THREADS", command=self._on_processor_change)
+        cpu_threads_radio.pack(side="left")
+        taichi_cpu_radio = ttk.Radiobutton(processor_frame, text="CPU (Taichi)", variable=self.processor_var, value="TAICHI_CPU", command=self._on_processor_change)
+        taichi_cpu_radio.pack(side="left", padx=5)
         
         ttk.Label(processor_frame, text="Threads:").pack(side="left", padx=(10, 2))
         self.thread_count_var = tk.IntVar(value=cpu_count())
         self.thread_spinbox = ttk.Spinbox(processor_frame, from_=1, to=cpu_count(), textvariable=self.thread_count_var, width=5)
         self.thread_spinbox.pack(side="left")
         
+        Tooltip(auto_radio, "Picks the fastest backend and thread count for the image size\nfrom a calibrated cost model. The first use runs a short benchmark\n(a few seconds, can be cancelled); run scripts/calibrate_backends\nfor a more detailed model.")
         Tooltip(gpu_radio, "Fast calculations on the graphics card.")
         Tooltip(cpu_radio, "Parallel calculations on the CPU cores.\nUI may freeze for a moment during processing.")
+        Tooltip(cpu_threads_radio, "Parallel calculations in a thread pool (no process startup or IPC).\nFastest CPU option for interactive-sized images.")
+        Tooltip(taichi_cpu_radio, "Compiled, fused Taichi kernel on all CPU cores (LLVM backend).\nUse on machines without a supported GPU.")
         Tooltip(self.thread_spinbox, "Number of CPU threads to use for calculation.")
 
         right_buttons_frame = ttk.Frame(top_controls_frame)
         right_buttons_frame.pack(side="right")
 
+        self.prefetch_var = tk.BooleanVar(value=False)
+        prefetch_check = ttk.Checkbutton(right_buttons_frame, text="Prefetch", variable=self.prefetch_var, command=lambda: self.controller.set_prefetch_enabled(self.prefetch_var.get()))
+        prefetch_check.pack(side="left", padx=(0, 10))
+        Tooltip(prefetch_check, "Download likely next areas (ahead of panning, around zooming out)\nin the background, within an hourly request budget.")
+
+        self.overlay_var = tk.BooleanVar(value=False)
+        overlay_check = ttk.Checkbutton(right_buttons_frame, text="Map Overlay", variable=self.overlay_var, command=self._update_overlay)
+        overlay_check.pack(side="left", padx=(0, 10))
+        Tooltip(overlay_check, "Draw the result on the map as tiles, colorized on demand\nfor the visible area and zoom level.")
+
         test_button = ttk.Button(right_buttons_frame, text="Performance Tests", command=lambda: self.app.view_controller.switch_to(TestView))
         test_button.pack(side="left", padx=(0, 20))
 
@@ -112,6 +165,20 @@ class MapView(ttk.Frame):
         self.ndmi_button = ttk.Button(right_buttons_frame, text="Calculate NDMI", command=lambda: self.controller.handle_calculate_index("NDMI"), state="disabled")
         self.ndmi_button.pack(side="left")
 
+        self.custom_index_var = tk.StringVar(value="SAVI")
+        self.custom_index_combo = ttk.Combobox(right_buttons_frame, textvariable=self.custom_index_var, values=[name for name in INDEX_EXPRESSIONS if name not in ("NDVI", "NDMI")], width=28, state="disabled")
+        self.custom_index_combo.pack(side="left", padx=(15, 5))
+        self.custom_index_button = ttk.Button(right_buttons_frame, text="Calculate", command=lambda: self.controller.handle_calculate_index(self.custom_index_var.get().strip()), state="disabled")
+        self.custom_index_button.pack(side="left")
+
+        self.change_button = ttk.Button(right_buttons_frame, text="NDVI Change", command=lambda: self.controller.handle_change_detection("NDVI"))
+        self.change_button.pack(side="left", padx=(15, 0))
+        self.cancel_button = ttk.Button(right_buttons_frame, text="Cancel", command=self.controller.handle_cancel, state="disabled")
+        self.cancel_button.pack(side="left", padx=(10, 0))
+        Tooltip(self.cancel_button, "Stop the running fetch or calculation.\nStarting a new request also cancels the previous one.")
+        Tooltip(self.change_button, "Splits the date range into periods, fetches them concurrently\nand maps the NDVI change between the first and last period.")
+        Tooltip(self.custom_index_combo, "Index from the library or a band-math expression,\ne.g. (B08 - B11) / (B08 + B11)")
+
         self.paned_window = ttk.PanedWindow(self, orient=tk.HORIZONTAL)
         self.paned_window.grid(row=1, column=0, sticky="nsew")
 
@@ -119,12 +186,13 @@ class MapView(ttk.Frame):
         map_frame.grid_rowconfigure(0, weight=1)
         map_frame.grid_columnconfigure(0, weight=1)
         self.map_widget = TkinterMapView(map_frame, corner_radius=0)
-        self.map_widget.set_tile_server("https://mt1.google.com/vt/lyrs=s&x={x}&y={y}&z={z}", max_zoom=22)
+        self.map_widget.set_tile_server(self.BASE_TILE_SERVER, max_zoom=self.MAX_MAP_ZOOM)
         self.map_widget.set_position(self.initial_position[0], self.initial_position[1])
         self.map_widget.set_zoom(self.initial_zoom)
         self.map_widget.grid(row=0, column=0, sticky="nsew")
         self.map_widget.bind("<B1-Motion>", self._on_map_interaction)
         self.map_widget.bind("<MouseWheel>", self._on_map_interaction)
+        self.map_widget.bind("<Configure>", self._on_display_resized, add="+")
         self.paned_window.add(map_frame, weight=1)
 
         result_frame = ttk.Frame(self.paned_window)
@@ -147,7 +215,7 @@ class MapView(ttk.Frame):
         self._on_processor_change()
 
     def _on_processor_change(self):
-        if self.processor_var.get() == "CPU":
+        if self.processor_var.get() in ("CPU", "CPU_THREADS", "TAICHI_CPU"):
             self.thread_spinbox.config(state="normal")
         else:
             self.thread_spinbox.config(state="disabled")
@@ -171,22 +239,33 @@ class MapView(ttk.Frame):
     def _on_map_interaction(self, event=None):
         self.set_fetch_button_state(True)
         self.set_status("Map moved. Click 'Fetch Data' to load new area.")
+        if self.prefetch_var.get():
+            # Zdarzenia ruchu przychodzą seriami - prefetcher dostaje tylko ostatnie.
+            if self._prefetch_after_id is not None:
+                self.after_cancel(self._prefetch_after_id)
+            self._prefetch_after_id = self.after(self.PREFETCH_DEBOUNCE_MS, self._notify_map_moved)
+
+    def _notify_map_moved(self):
+        self._prefetch_after_id = None
+        self.controller.handle_map_moved()
 
     # ZMIANA: Usunięto metodę _get_colormap_and_norm. Logika jest teraz w visualizer.py
 
     def get_view_parameters(self):
-        top_left, bottom_right, image_size, zoom = self._get_precise_view_data()
+        top_left, bottom_right, image_size, zoom = self.get_precise_view_data()
         is_valid, mpp = self._validate_resolution(top_left, bottom_right, image_size)
         if not is_valid:
             messagebox.showwarning("Zoom Level Too Low", f"The current map area is too large.\n\n" f"Estimated resolution: {mpp:.2f} m/pixel\n" f"API limit: {self.API_RESOLUTION_LIMIT_METERS:.2f} m/pixel\n\n" f"Please zoom in and try again.", parent=self)
             self.set_status("Validation failed: Map area too large.")
             return None
+        return top_left, bottom_right, image_size, self.get_time_interval(), zoom
+
+    def get_time_interval(self) -> tuple[str, str]:
         start_date = self.start_date_entry.get_date().strftime("%Y-%m-%d")
         end_date = self.end_date_entry.get_date().strftime("%Y-%m-%d")
-        time_interval = (start_date, end_date)
-        return top_left, bottom_right, image_size, time_interval, zoom
+        return start_date, end_date
 
-    def _get_precise_view_data(self) -> tuple:
+    def get_precise_view_data(self) -> tuple:
         self.map_widget.update_idletasks()
         upper_left_tile = self.map_widget.upper_left_tile_pos
         lower_right_tile = self.map_widget.lower_right_tile_pos
@@ -242,30 +321,104 @@ class MapView(ttk.Frame):
         draw.text(position, text, font=font, fill='white', align="center")
         return img
 
-    def display_result(self, index_type: str):
+    def _current_result_id(self) -> tuple:
+        return id(self.controller.index_result), id(self.controller.result_mask)
+
+    def _on_display_resized(self, event=None):
+        if self._displayed_index_type is None:
+            return
+        if self._resize_after_id is not None:
+            self.after_cancel(self._resize_after_id)
+        self._resize_after_id = self.after(self.RESIZE_RENDER_DEBOUNCE_MS, self._rerender_result)
+
+    def _rerender_result(self):
+        self._resize_after_id = None
+        if self._displayed_index_type is not None and self._pyramid_source == self._current_result_id():
+            self.display_result(self._displayed_index_type, resized=True)
+
+    def display_result(self, index_type: str, resized: bool = False):
+        """
+        Rysuje wynik w rozdzielczości widżetu: wynik i maska są najpierw
+        zmniejszane (średnia z bloków z pominięciem pikseli bez danych),
+        a kolorowany jest dopiero obraz wielkości ekranu. Poziomy są
+        zapamiętywane, więc zmiana rozmiaru okna nie przelicza całej sceny.
+        Obrazy powstają w wątku renderującym (`_render_images`); nowsze
+        zlecenie unieważnia starsze.
+        """
         if not self.winfo_exists():
             return
         self.update_idletasks()
         target_w = self.map_widget.winfo_width()
         target_h = self.map_widget.winfo_height()
-        if np.all(self.controller.result_mask == 0):
+        if resized and self._rendered_size == (target_w, target_h):
+            return
+        if self._pyramid_source != self._current_result_id():
+            self._pyramid = DisplayPyramid(self.controller.index_result, self.controller.result_mask)
+            self._pyramid_source = self._current_result_id()
+        self._displayed_index_type = index_type
+        self._rendered_size = (target_w, target_h)
+        self._update_overlay()
+
+        legend_width = self.result_image_label.winfo_width()
+        if legend_width <= 10 or self._legend_key == (index_type, legend_width):
+            legend_width = None
+        pyramid = self._pyramid
+        self.render_worker.submit(
+            lambda: self._render_images(pyramid, index_type, (target_w, target_h), legend_width),
+            lambda generation, images, error: self._show_rendered(generation, images, error, index_type, resized, legend_width),
+        )
+
+    def _update_overlay(self):
+        """
+        Publikuje wyświetlany wynik jako kafelki mapy albo usuwa nakładkę.
+        Mapa dostaje nowy serwer kafelków (set_tile_server czyści jej pamięć
+        kafelków i rysuje widok od nowa), więc nie zostają kafelki z
+        poprzednim wynikiem.
+        """
+        if self.overlay_var.get() and self._pyramid is not None and self.controller.result_bbox is not None:
+            key = (self._pyramid_source, self._displayed_index_type, self.controller.result_bbox)
+            if key == self._overlay_key:
+                return
+            if self.tile_overlay is None:
+                self.tile_overlay = TileOverlayServer(self.BASE_TILE_SERVER)
+            url = self.tile_overlay.publish(self._pyramid, self.controller.result_bbox, self._displayed_index_type)
+            self._overlay_key = key
+            self.map_widget.set_tile_server(url, max_zoom=self.MAX_MAP_ZOOM)
+        elif self._overlay_key is not None:
+            self.tile_overlay.clear()
+            self._overlay_key = None
+            self.map_widget.set_tile_server(self.BASE_TILE_SERVER, max_zoom=self.MAX_MAP_ZOOM)
+
+    def _render_images(self, pyramid: DisplayPyramid, index_type: str, target_size: tuple[int, int], legend_width: int | None) -> dict:
+        # Wątek renderujący: tylko PIL/NumPy, bez wywołań Tk.
+        values, data_mask = pyramid.level_for(target_size)
+        has_data = bool(np.any(data_mask))
+        if not has_data:
             placeholder_img = self._create_placeholder_image(512, 512, "No valid data in the selected area.\n(e.g., due to clouds or location)")
-            display_image = self._resize_image_with_aspect_ratio(placeholder_img, (target_w, target_h))
-            self.set_status(f"Calculation complete: No valid data found for {index_type}.")
+            display_image = self._resize_image_with_aspect_ratio(placeholder_img, target_size)
         else:
-            # ZMIANA: Użycie funkcji z modułu visualizer
-            heatmap = visualizer.create_heatmap_image(self.controller.index_result, self.controller.result_mask, index_type)
-            display_image = self._resize_image_with_aspect_ratio(heatmap, (target_w, target_h))
-            self.set_status(f"{index_type} visualization complete!")
-        
-        self.result_photo = ImageTk.PhotoImage(display_image)
+            heatmap = visualizer.create_heatmap_image(values, data_mask, index_type)
+            display_image = self._resize_image_with_aspect_ratio(heatmap, target_size)
+        legend_image = visualizer.render_legend_image(index_type, legend_width) if legend_width else None
+        return {"image": display_image, "legend": legend_image, "has_data": has_data}
+
+    def _show_rendered(self, generation: int, images: dict, error: Exception, index_type: str, resized: bool, legend_width: int | None):
+        if not self.winfo_exists() or not self.render_worker.is_current(generation):
+            return
+        if error is not None:
+            self.set_status(f"Error rendering {index_type}: {error}")
+            return
+        self.result_photo = ImageTk.PhotoImage(images["image"])
         self.result_image_label.configure(image=self.result_photo)
-        
-        legend_width = self.result_image_label.winfo_width()
-        if legend_width > 10:
-            # ZMIANA: Użycie funkcji z modułu visualizer
-            self.legend_photo = visualizer.create_legend_image(index_type, width=legend_width)
+        if images["legend"] is not None:
+            self.legend_photo = ImageTk.PhotoImage(images["legend"])
             self.legend_label.configure(image=self.legend_photo)
+            self._legend_key = (index_type, legend_width)
+        if not resized:
+            if images["has_data"]:
+                self.set_status(f"{index_type} visualization complete!")
+            else:
+                self.set_status(f"Calculation complete: No valid data found for {index_type}.")
 
     # ZMIANA: Usunięto metody create_heatmap i create_legend. Logika jest teraz w visualizer.py
 
@@ -275,11 +428,17 @@ class MapView(ttk.Frame):
     def set_fetch_button_state(self, is_enabled: bool):
         state = "normal" if is_enabled else "disabled"
         self.fetch_button.config(state=state)
+        self.change_button.config(state=state)
 
     def set_calc_buttons_state(self, is_enabled: bool):
         state = "normal" if is_enabled else "disabled"
         self.ndvi_button.config(state=state)
         self.ndmi_button.config(state=state)
+        self.custom_index_combo.config(state=state)
+        self.custom_index_button.config(state=state)
+
+    def set_cancel_button_state(self, is_enabled: bool):
+        self.cancel_button.config(state="normal" if is_enabled else "disabled")
 
     def set_all_buttons_state(self, is_enabled: bool):
         self.set_fetch_button_state(is_enabled)
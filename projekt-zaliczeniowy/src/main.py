@@ -6,6 +6,9 @@ matplotlib.use("Agg")
 import tkinter as tk
 from src.gui.app import MainApplication
 from multiprocessing import freeze_support
+from src.core.processing.cpu_index_calculator import shutdown_pool
+from src.core.processing.cpu_threaded_calculator import shutdown_pool as shutdown_thread_pool
+from src.gui.utils.colorizer import shutdown_pool as shutdown_colorize_pool
 
 def main():
     # Create root window
@@ -15,7 +18,13 @@ def main():
     app = MainApplication(root)
     
     # Start the main loop
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        app.map_controller.shutdown()
+        shutdown_pool()
+        shutdown_thread_pool()
+        shutdown_colorize_pool()
 
 if __name__ == "__main__":
     freeze_support()
@@ -0,0 +1,116 @@
+# scripts/benchmark_cache_codecs.py
+
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import rasterio
+from rasterio.windows import Window
+
+from src.core.io.data_reader import read_geotiff_bands
+from src.core.io.data_writer import CACHE_CODECS, save_bands_to_geotiff
+from src.core.io.test_writer import save_test_results
+
+# --- Konfiguracja ---
+SOURCE_DATA_DIR = "data"
+RESULTS_FILE = "test_results/cache_codec_results.json"
+REPETITIONS = 3
+WINDOW_SIZE = 512
+PREVIEW_SIZE = 512
+
+
+def _synthetic_bands(size: int) -> dict:
+    """Gładkie pola z szumem - kompresują się podobnie jak prawdziwe sceny."""
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:size, 0:size] / size
+    bands = {}
+    for k, name in enumerate(("B04", "B08", "B11")):
+        field = 3000 + 2000 * np.sin(6 * x + k) * np.cos(4 * y - k) + rng.normal(0, 150, (size, size))
+        bands[name] = np.clip(field, 0, 10000).astype(np.uint16)
+    bands["dataMask"] = np.ones((size, size), dtype=np.uint16)
+    return bands
+
+
+def _best_time(func) -> float:
+    times = []
+    for _ in range(REPETITIONS):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _read_window(path: str):
+    with rasterio.open(path) as src:
+        size = min(WINDOW_SIZE, src.width, src.height)
+        col, row = (src.width - size) // 2, (src.height - size) // 2
+        src.read(window=Window(col, row, size, size))
+
+
+def _read_preview(path: str):
+    with rasterio.open(path) as src:
+        scale = max(1, max(src.width, src.height) // PREVIEW_SIZE)
+        src.read(out_shape=(src.count, src.height // scale, src.width // scale))
+
+
+def run_benchmark(bands: dict, bbox: tuple) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for codec in (None,) + CACHE_CODECS:
+            label = codec or "none"
+            path = os.path.join(tmp_dir, f"cache_{label}.tif")
+            print("\n" + "=" * 50 + f"\n KODEK: {label}\n" + "=" * 50)
+            write_time = _best_time(lambda: save_bands_to_geotiff(bands, bbox, path, codec=codec))
+            results[label] = {
+                "write_s": write_time,
+                "size_mb": os.path.getsize(path) / (1024 ** 2),
+                "read_full_s": _best_time(lambda: read_geotiff_bands(path)),
+                "read_window_s": _best_time(lambda: _read_window(path)),
+                "read_preview_s": _best_time(lambda: _read_preview(path)),
+            }
+    return results
+
+
+def main():
+    """
+    Porównuje kodeki formatu cache: czas zapisu, czas odczytu (cały plik,
+    okno, podgląd) i rozmiar pliku.
+    Uruchom: python -m src.scripts.benchmark_cache_codecs [plik.tif | --synthetic N]
+    """
+    parser = argparse.ArgumentParser(description="Benchmark kodeków plików cache.")
+    parser.add_argument("source", nargs="?", help="Plik GeoTIFF z pasmami (domyślnie pierwszy z 'data/').")
+    parser.add_argument("--synthetic", type=int, metavar="SIZE", help="Użyj syntetycznej sceny SIZE x SIZE.")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        bands = _synthetic_bands(args.synthetic)
+        bbox = (19.0, 50.0, 20.0, 51.0)
+        print(f"Używam syntetycznej sceny {args.synthetic}x{args.synthetic}")
+    else:
+        source = args.source
+        if source is None:
+            source_files = sorted(f for f in os.listdir(SOURCE_DATA_DIR) if f.endswith('.tif')) if os.path.isdir(SOURCE_DATA_DIR) else []
+            if not source_files:
+                print(f"BŁĄD: Nie znaleziono plików .tif w folderze '{SOURCE_DATA_DIR}'.")
+                print("Pobierz dane w aplikacji albo użyj opcji --synthetic.")
+                return
+            source = os.path.join(SOURCE_DATA_DIR, source_files[0])
+        bands = read_geotiff_bands(source)
+        with rasterio.open(source) as src:
+            bbox = tuple(src.bounds)
+
+    results = run_benchmark(bands, bbox)
+
+    print(f"\n{'Kodek':<10}{'Zapis [ms]':>12}{'Rozmiar [MB]':>14}{'Odczyt [ms]':>13}{'Okno [ms]':>11}{'Podgląd [ms]':>14}")
+    for label, r in results.items():
+        print(
+            f"{label:<10}{r['write_s'] * 1000:>12.1f}{r['size_mb']:>14.2f}{r['read_full_s'] * 1000:>13.1f}"
+            f"{r['read_window_s'] * 1000:>11.2f}{r['read_preview_s'] * 1000:>14.2f}"
+        )
+    save_test_results(results, RESULTS_FILE)
+    print(f"\nWyniki zapisane w: {RESULTS_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+# scripts/calibrate_backends.py
+
+import argparse
+
+from src.core.processing.backend_selector import (
+    BACKENDS,
+    CALIBRATION_REPETITIONS,
+    CALIBRATION_SIZES,
+    MODEL_FILE,
+    calibrate,
+)
+
+
+def main():
+    """
+    Kalibruje model kosztu używany przez tryb 'Auto'.
+    Uruchom: python -m src.scripts.calibrate_backends
+    """
+    parser = argparse.ArgumentParser(description="Kalibracja automatycznego wyboru backendu.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(CALIBRATION_SIZES))
+    parser.add_argument("--repetitions", type=int, default=CALIBRATION_REPETITIONS)
+    parser.add_argument("--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS))
+    parser.add_argument("--output", default=MODEL_FILE)
+    args = parser.parse_args()
+
+    calibrate(args.sizes, args.repetitions, args.backends, args.output)
+
+
+if __name__ == "__main__":
+    from multiprocessing import freeze_support
+    freeze_support()
+    main()
@@ -13,6 +13,10 @@ def run_gpu_calculation(bands_data, index_type):
     from src.core.processing.index_calculator import calculate_index
     calculate_index(bands_data, index_type)
 
+def run_taichi_cpu_calculation(bands_data, index_type, n_jobs):
+    from src.core.processing.index_calculator import calculate_index
+    calculate_index(bands_data, index_type, arch="cpu", n_jobs=n_jobs)
+
 def run_cpu_single_calculation(bands_data, index_type):
     from src.core.processing.cpu_single_thread_calculator import calculate_index
     calculate_index(bands_data, index_type)
@@ -21,6 +25,10 @@ def run_cpu_multi_calculation(bands_data, index_type, n_jobs):
     from src.core.processing.cpu_index_calculator import calculate_index
     calculate_index(bands_data, index_type, n_jobs=n_jobs)
 
+def run_cpu_threaded_calculation(bands_data, index_type, n_jobs):
+    from src.core.processing.cpu_threaded_calculator import calculate_index
+    calculate_index(bands_data, index_type, n_jobs=n_jobs)
+
 def run_profiling():
     from src.core.io.data_reader import read_geotiff_bands
     from multiprocessing import cpu_count, freeze_support
@@ -48,6 +56,13 @@ def run_profiling():
     results['GPU (Taichi)'] = max(mem_usage)
     print(f"Peak memory usage: {max(mem_usage):.2f} MiB")
 
+    # Test Taichi CPU
+    label = f'CPU ({max_threads}-Threads, Taichi)'
+    print("\n" + "="*50 + f"\n PROFILOWANIE PAMIĘCI: {label}\n" + "="*50)
+    mem_usage = memory_usage((run_taichi_cpu_calculation, (bands, index_type, max_threads)), interval=0.1, timeout=200)
+    results[label] = max(mem_usage)
+    print(f"Peak memory usage: {max(mem_usage):.2f} MiB")
+
     # Test CPU Single
     print("\n" + "="*50 + "\n PROFILOWANIE PAMIĘCI: CPU (1-Thread, NumPy)\n" + "="*50)
     mem_usage = memory_usage((run_cpu_single_calculation, (bands, index_type)), interval=0.1, timeout=200)
@@ -62,6 +77,12 @@ def run_profiling():
         results[label] = max(mem_usage)
         print(f"Peak memory usage (main process): {max(mem_usage):.2f} MiB")
 
+        label = f'CPU ({threads}-Threads, ThreadPool)'
+        print("\n" + "="*50 + f"\n PROFILOWANIE PAMIĘCI: {label}\n" + "="*50)
+        mem_usage = memory_usage((run_cpu_threaded_calculation, (bands, index_type, threads)), interval=0.1, timeout=200)
+        results[label] = max(mem_usage)
+        print(f"Peak memory usage: {max(mem_usage):.2f} MiB")
+
     os.makedirs(os.path.dirname(RESULTS_FILE), exist_ok=True)
     with open(RESULTS_FILE, 'w') as f:
         json.dump(results, f, indent=4)
@@ -0,0 +1,113 @@
+# tests/test_backends.py
+#
+# Wszystkie backendy (CPU jednowątkowy, pula wątków, pula procesów SharedMem
+# i Taichi w trybie CPU) muszą dawać to samo co wzór liczony wprost w NumPy
+# na pasmach uint16 - także dla wyrażeń stałych i dzielenia przez stałe zero.
+# Taichi na GPU nie jest tu testowane (wymaga urządzenia).
+
+import numpy as np
+import pytest
+
+from src.core.processing import (
+    cpu_index_calculator,
+    cpu_single_thread_calculator,
+    cpu_threaded_calculator,
+)
+from src.core.processing.quantization import dequantize, max_error
+
+# Boki nie są wielokrotnościami kafelków ani bloków wierszy.
+SHAPE = (301, 257)
+INDICES = [
+    "NDVI",
+    "NDMI",
+    "SAVI",
+    "(B08 - B04) / (B08 + B04)",  # to samo co NDVI, podane wyrażeniem
+    "2.5",
+    "B04 / 0",
+    "B04 / (0 * B08)",
+    "-B11 * 0.5 + 1",
+]
+
+
+def _reference(bands: dict, index_type: str) -> np.ndarray:
+    b04, b08, b11 = (bands[name].astype(np.float64) for name in ("B04", "B08", "B11"))
+
+    def safe_div(a, b):
+        return np.divide(a, b, out=np.zeros(SHAPE), where=np.abs(b) > 1e-6)
+
+    expected = {
+        "NDVI": safe_div(b08 - b04, b08 + b04),
+        "NDMI": safe_div(b08 - b11, b08 + b11),
+        "SAVI": 1.5 * (b08 - b04) / (b08 + b04 + 5000),
+        "(B08 - B04) / (B08 + B04)": safe_div(b08 - b04, b08 + b04),
+        "2.5": np.full(SHAPE, 2.5),
+        "B04 / 0": np.zeros(SHAPE),
+        "B04 / (0 * B08)": np.zeros(SHAPE),
+        "-B11 * 0.5 + 1": -b11 * 0.5 + 1,
+    }[index_type]
+    expected[bands["dataMask"] == 0] = np.nan
+    return expected
+
+
+@pytest.fixture(scope="module")
+def bands():
+    rng = np.random.default_rng(0)
+    bands = {name: rng.integers(0, 5000, SHAPE, dtype=np.uint16) for name in ("B04", "B08", "B11")}
+    # Zerowe mianowniki NDVI i NDMI.
+    bands["B04"][:3, :] = 0
+    bands["B08"][:3, :] = 0
+    bands["B11"][:3, :] = 0
+    mask = np.ones(SHAPE, dtype=np.uint16)
+    mask[100:140, 30:200] = 0
+    bands["dataMask"] = mask
+    return bands
+
+
+def _taichi(bands, index_types, result_dtype):
+    index_calculator = pytest.importorskip("src.core.processing.index_calculator")
+    return index_calculator.calculate_indices(bands, index_types, arch="cpu", n_jobs=2, result_dtype=result_dtype)
+
+
+BACKENDS = {
+    "single": lambda bands, types, dtype: cpu_single_thread_calculator.calculate_indices(bands, types, dtype),
+    "threads": lambda bands, types, dtype: cpu_threaded_calculator.calculate_indices(bands, types, n_jobs=2, result_dtype=dtype),
+    "processes": lambda bands, types, dtype: cpu_index_calculator.calculate_indices(bands, types, n_jobs=2, result_dtype=dtype),
+    "taichi_cpu": _taichi,
+}
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _shutdown_pools():
+    yield
+    cpu_index_calculator.shutdown_pool()
+    cpu_threaded_calculator.shutdown_pool()
+
+
+@pytest.mark.parametrize("result_dtype", ["float32", "int16", "uint8"])
+@pytest.mark.parametrize("backend", list(BACKENDS))
+def test_backend_matches_numpy_reference(bands, backend, result_dtype):
+    results, data_mask = BACKENDS[backend](bands, INDICES, result_dtype)
+    assert data_mask is bands["dataMask"] or np.array_equal(data_mask, bands["dataMask"])
+
+    for index_type in INDICES:
+        result = np.asarray(results[index_type])
+        assert result.shape == SHAPE
+        assert result.dtype == np.dtype(result_dtype)
+        expected = _reference(bands, index_type)
+        if result_dtype == "uint8":
+            # Tryb wyświetlania: wartości obcinane do [-1, 1].
+            expected = np.clip(expected, -1, 1)
+        elif result_dtype == "int16":
+            expected = np.clip(expected, -3.2767, 3.2767)
+        np.testing.assert_allclose(
+            dequantize(result), expected, rtol=1e-5, atol=max_error(result_dtype) + 1e-6,
+            equal_nan=True, err_msg=f"{backend}: {index_type}",
+        )
+
+
+def test_backends_agree_exactly_on_quantized_results(bands):
+    reference, _ = BACKENDS["single"](bands, INDICES, "int16")
+    for backend in ("threads", "processes"):
+        results, _ = BACKENDS[backend](bands, INDICES, "int16")
+        for index_type in INDICES:
+            np.testing.assert_array_equal(np.asarray(results[index_type]), reference[index_type], err_msg=backend)
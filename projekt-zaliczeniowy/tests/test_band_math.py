@@ -0,0 +1,140 @@
+# tests/test_band_math.py
+#
+# Kompilator wyrażeń algebry pasm: parsowanie, zwijanie stałych, wspólne
+# podwyrażenia i przydział rejestrów. Program jest wykonywany przez
+# evaluate_window i porównywany z rekurencyjnym obliczeniem drzewa w NumPy.
+
+import random
+
+import numpy as np
+import pytest
+
+from src.core.processing.band_math import (
+    DIVISION_EPSILON,
+    allocate_scratch,
+    compile_expressions,
+    evaluate_window,
+    parse_expression,
+)
+
+BAND_NAMES = ("B04", "B08", "B11")
+SHAPE = (37, 53)
+
+
+def _bands(seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    bands = {name: rng.integers(0, 4000, SHAPE, dtype=np.uint16) for name in BAND_NAMES}
+    # Kilka pikseli z zerowym mianownikiem w B08 - B04.
+    bands["B08"][0, :5] = bands["B04"][0, :5]
+    return bands
+
+
+def _reference(node: tuple, bands: dict) -> np.ndarray:
+    """Obliczenie drzewa wprost, z tą samą semantyką bezpiecznego dzielenia."""
+    kind = node[0]
+    if kind == "const":
+        return np.full(SHAPE, node[1], dtype=np.float32)
+    if kind == "band":
+        return bands[node[1]].astype(np.float32)
+    if kind == "neg":
+        return -_reference(node[1], bands)
+    a, b = _reference(node[1], bands), _reference(node[2], bands)
+    if kind == "add":
+        return a + b
+    if kind == "sub":
+        return a - b
+    if kind == "mul":
+        return a * b
+    safe = np.abs(b) > DIVISION_EPSILON
+    return np.divide(a, b, out=np.zeros(SHAPE, dtype=np.float32), where=safe)
+
+
+def _run(expressions, bands, window=(slice(0, SHAPE[0]), slice(0, SHAPE[1]))):
+    program = compile_expressions(tuple(expressions))
+    outputs = [np.full(SHAPE, -999.0, dtype=np.float32) for _ in expressions]
+    evaluate_window(program, bands, outputs, window, allocate_scratch(program, SHAPE))
+    return program, outputs
+
+
+def _random_expression(rng: random.Random, depth: int) -> str:
+    if depth == 0 or rng.random() < 0.2:
+        return rng.choice(BAND_NAMES + ("2", "0.5", "10000"))
+    if rng.random() < 0.1:
+        return f"-({_random_expression(rng, depth - 1)})"
+    op = rng.choice("+-*/")
+    return f"({_random_expression(rng, depth - 1)} {op} {_random_expression(rng, depth - 1)})"
+
+
+@pytest.mark.parametrize("expression", ["B08 **2", "abs(B04)", "B04 if B08 else B11", "B04 +", "'B04'"])
+def test_invalid_expressions_are_rejected(expression):
+    with pytest.raises(ValueError):
+        parse_expression(expression)
+
+
+def test_constants_are_folded():
+    assert parse_expression("2 * (3 + 1) / 4") == ("const", 2.0)
+    assert parse_expression("-(1 - 3)") == ("const", 2.0)
+    assert parse_expression("+B04") == ("band", "B04")
+    # Dzielenie stałej przez zero zwija się do 0, jak dzielenie w jądrach.
+    assert parse_expression("1 / 0") == ("const", 0.0)
+
+
+def test_common_subexpressions_are_computed_once():
+    ndvi = "(B08 - B04) / (B08 + B04)"
+    savi = "1.5 * (B08 - B04) / (B08 + B04 + 5000)"
+    program = compile_expressions((ndvi, savi))
+    assert program.bands == ("B08", "B04")
+    ops = [instruction[0] for instruction in program.instructions]
+    assert ops.count("load") == 2
+    assert ops.count("sub") == 1
+    assert ops.count("add") == 2  # B08 + B04 raz, potem + 5000
+
+
+def test_registers_are_reused():
+    # Długi łańcuch dodawań potrzebuje stałej liczby rejestrów: pasma są
+    # wczytywane raz i trzymane do ostatniego użycia, plus jeden akumulator.
+    chain = " + ".join(["B04", "B08", "B11"] * 10)
+    program = compile_expressions((chain,))
+    assert program.n_registers == len(BAND_NAMES) + 1
+    _, (result,) = _run([chain], _bands())
+    bands = _bands()
+    expected = (bands["B04"].astype(np.float32) + bands["B08"] + bands["B11"]) * 10
+    np.testing.assert_allclose(result, expected, rtol=1e-6)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_programs_match_reference(seed):
+    rng = random.Random(seed)
+    expressions = [_random_expression(rng, depth=4) for _ in range(rng.randint(1, 4))]
+    # Powtórzone wyrażenie dzieli rejestr wyniku.
+    expressions.append(expressions[0])
+    bands = _bands(seed)
+    _, outputs = _run(expressions, bands)
+    for expression, result in zip(expressions, outputs):
+        expected = _reference(parse_expression(expression), bands)
+        np.testing.assert_allclose(result, expected, rtol=1e-5, atol=1e-6, err_msg=expression)
+
+
+def test_constant_outputs_and_division_by_zero():
+    bands = _bands()
+    _, (constant, by_zero, by_register) = _run(["2.5", "B04 / 0", "B04 / (B08 - B04)"], bands)
+    assert (constant == 2.5).all()
+    assert (by_zero == 0.0).all()
+    assert (by_register[0, :5] == 0.0).all()
+
+
+def test_window_and_data_mask():
+    bands = _bands()
+    bands["dataMask"] = np.ones(SHAPE, dtype=np.uint8)
+    bands["dataMask"][10:12, :] = 0
+    window = (slice(5, 20), slice(10, 30))
+    _, (result,) = _run(["B08 - B04"], bands, window)
+
+    expected = bands["B08"].astype(np.float32) - bands["B04"]
+    inside = result[window]
+    assert np.isnan(inside[5:7]).all()
+    np.testing.assert_array_equal(np.delete(inside, [5, 6], axis=0), np.delete(expected[window], [5, 6], axis=0))
+    # Poza oknem nic nie jest zapisywane.
+    outside = result.copy()
+    outside[window] = -999.0
+    assert (outside == -999.0).all()
@@ -0,0 +1,82 @@
+# tests/test_cli.py
+#
+# Tryb manifestu CLI na scenach z cache (--offline, bez API): małe sceny
+# liczone w pamięci i duże strumieniowo muszą dawać te same wyniki.
+
+import json
+
+import numpy as np
+import pytest
+import rasterio
+
+from src import cli
+from src.core.io.scene_cache import SceneCache
+
+BBOX = [20.0, 50.0, 20.1, 50.1]
+SIZE = [320, 240]
+INTERVAL = ["2025-06-01", "2025-06-30"]
+INDICES = ["NDVI", "NDMI"]
+
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    width, height = SIZE
+    bands = {name: rng.integers(1, 3000, (height, width), dtype=np.uint16) for name in ("B04", "B08", "B11")}
+    mask = np.ones((height, width), dtype=np.uint16)
+    mask[40:90, 100:200] = 0
+    bands["dataMask"] = mask
+    path = tmp_path / "cache"
+    SceneCache(str(path)).put(bands, tuple(BBOX), tuple(SIZE), tuple(INTERVAL), -1)
+    return str(path)
+
+
+def _manifest(tmp_path, entries) -> str:
+    path = tmp_path / "manifest.jsonl"
+    path.write_text("\n".join(json.dumps(entry) for entry in entries) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def _run(tmp_path, cache_dir, manifest, out_name, dtype="float32"):
+    out = tmp_path / out_name
+    with pytest.raises(SystemExit) as exit_info:
+        cli.main([
+            "manifest", manifest, "--out", str(out), "--cache-dir", cache_dir,
+            "--offline", "--workers", "1", "--dtype", dtype,
+        ])
+    records = [json.loads(line) for line in (out / cli.SUMMARY_FILE).read_text(encoding="utf-8").splitlines()]
+    return exit_info.value.code, {record["name"]: record for record in records}, out
+
+
+@pytest.mark.parametrize("dtype", ["float32", "int16"])
+def test_streamed_entry_matches_in_memory_entry(tmp_path, cache_dir, monkeypatch, dtype):
+    manifest = _manifest(tmp_path, [{"name": "pole", "bbox": BBOX, "size": SIZE, "time_interval": INTERVAL}])
+    code, memory, memory_dir = _run(tmp_path, cache_dir, manifest, "memory", dtype)
+    assert code == 0
+
+    monkeypatch.setattr(cli, "STREAM_ENTRY_PIXELS", 1)
+    code, streamed, streamed_dir = _run(tmp_path, cache_dir, manifest, "streamed", dtype)
+    assert code == 0
+
+    assert memory["pole"]["status"] == streamed["pole"]["status"] == "ok"
+    for index_type in INDICES:
+        a, b = memory["pole"]["stats"][index_type], streamed["pole"]["stats"][index_type]
+        assert a["valid_fraction"] == pytest.approx(1 - 50 * 100 / (SIZE[0] * SIZE[1]))
+        assert a == pytest.approx(b)
+    with rasterio.open(memory_dir / "pole.tif") as a, rasterio.open(streamed_dir / "pole.tif") as b:
+        assert a.bounds == pytest.approx(b.bounds)
+        np.testing.assert_array_equal(a.read(), b.read())
+
+
+def test_offline_entry_outside_cache_is_reported(tmp_path, cache_dir):
+    manifest = _manifest(tmp_path, [
+        {"name": "pole", "bbox": BBOX, "size": SIZE, "time_interval": INTERVAL},
+        {"name": "brak", "bbox": BBOX, "size": SIZE, "time_interval": ["2024-01-01", "2024-01-31"]},
+    ])
+    code, records, out = _run(tmp_path, cache_dir, manifest, "out")
+
+    assert code == 1
+    assert records["pole"]["status"] == "ok"
+    assert records["brak"]["status"] == "error"
+    assert "--offline" in records["brak"]["error"]
+    assert not (out / "brak.tif").exists()
@@ -0,0 +1,184 @@
+# tests/test_data_loader.py
+#
+# Pobieranie kafelkami sprawdzane na lokalnym serwerze HTTP udającym
+# Sentinel Hub (token OAuth + Process API): SHConfig.sh_base_url wskazuje
+# na 127.0.0.1, więc testy nie potrzebują sieci ani konta.
+
+import io
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+
+sentinelhub = pytest.importorskip("sentinelhub")
+tifffile = pytest.importorskip("tifffile")
+
+from src.core.data_loader.data_loader import SentinelDataLoader
+
+BBOX = (20.0, 50.0, 20.3, 50.2)
+# Boki celowo nie są wielokrotnościami TILE_SIZE.
+IMAGE_SIZE = (150, 97)
+TILE_SIZE = 64
+TIME_INTERVAL = ("2025-06-01", "2025-06-30")
+# Czas odpowiedzi serwera - dość długi, żeby zapytania się nakładały.
+RESPONSE_DELAY_S = 0.1
+
+
+def _expected_bands(width: int, height: int) -> np.ndarray:
+    """(wysokość, szerokość, 4): kolumna, wiersz, ich kombinacja, dataMask."""
+    rows, cols = np.mgrid[0:height, 0:width]
+    return np.stack([cols, rows, (cols * 7 + rows * 13) % 1000, np.ones_like(cols)], axis=-1).astype(np.uint16)
+
+
+class FakeSentinelHub:
+    """
+    Odpowiada na zapytania Process API obrazem, którego piksele kodują swoje
+    położenie w siatce całego obszaru BBOX/IMAGE_SIZE, i liczy, ile zapytań
+    było obsługiwanych jednocześnie.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+        fake = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.startswith("/oauth/token"):
+                    fake._send(self, "application/json", json.dumps(
+                        {"access_token": "test", "token_type": "Bearer", "expires_in": 3600}
+                    ).encode())
+                elif self.path.startswith("/api/v1/process"):
+                    fake._send(self, "image/tiff", fake._process(json.loads(body)))
+                else:
+                    self.send_error(404)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, content_type: str, body: bytes):
+        handler.send_response(200)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _process(self, payload: dict) -> bytes:
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            time.sleep(RESPONSE_DELAY_S)
+            west, south, east, north = payload["input"]["bounds"]["bbox"]
+            width, height = payload["output"]["width"], payload["output"]["height"]
+            # Lewy górny piksel zapytania w siatce całego obszaru.
+            full_w, full_h = IMAGE_SIZE
+            col = round((west - BBOX[0]) / (BBOX[2] - BBOX[0]) * full_w)
+            row = round((BBOX[3] - north) / (BBOX[3] - BBOX[1]) * full_h)
+            data = _expected_bands(full_w, full_h)[row:row + height, col:col + width]
+            assert data.shape[:2] == (height, width)
+            buf = io.BytesIO()
+            tifffile.imwrite(buf, data)
+            return buf.getvalue()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def fake_hub(monkeypatch):
+    # oauthlib domyślnie odmawia pobrania tokenu przez http.
+    monkeypatch.setenv("OAUTHLIB_INSECURE_TRANSPORT", "1")
+    hub = FakeSentinelHub()
+    yield hub
+    hub.shutdown()
+
+
+@pytest.fixture
+def loader(fake_hub):
+    config = sentinelhub.SHConfig()
+    config.sh_base_url = fake_hub.url
+    config.sh_token_url = f"{fake_hub.url}/oauth/token"
+    config.sh_client_id = "test-client"
+    config.sh_client_secret = "test-secret"
+    config.max_download_attempts = 1
+    return SentinelDataLoader(config)
+
+
+def _stack(bands: dict) -> np.ndarray:
+    return np.stack([bands[name] for name in ("B04", "B08", "B11", "dataMask")], axis=-1)
+
+
+@pytest.mark.parametrize("image_size", [IMAGE_SIZE, (64, 64), (65, 1), (1, 130)])
+def test_plan_tiles_covers_image_without_gaps_or_overlaps(image_size):
+    width, height = image_size
+    tiles = SentinelDataLoader.plan_tiles(BBOX, image_size, TILE_SIZE)
+
+    coverage = np.zeros((height, width), dtype=np.int32)
+    for tile_bbox, (tile_w, tile_h), (row, col) in tiles:
+        assert 0 < tile_w <= TILE_SIZE and 0 < tile_h <= TILE_SIZE
+        coverage[row:row + tile_h, col:col + tile_w] += 1
+    assert (coverage == 1).all()
+
+    # Sąsiednie kafelki dzielą krawędź (te same liczby, nie tylko "prawie").
+    edges = {(row, col): tile_bbox for tile_bbox, _, (row, col) in tiles}
+    for tile_bbox, (tile_w, tile_h), (row, col) in tiles:
+        right = edges.get((row, col + tile_w))
+        if right is not None:
+            assert right[0] == tile_bbox[2]
+        below = edges.get((row + tile_h, col))
+        if below is not None:
+            assert below[3] == tile_bbox[1]
+
+    west = min(b[0] for b, _, _ in tiles)
+    south = min(b[1] for b, _, _ in tiles)
+    east = max(b[2] for b, _, _ in tiles)
+    north = max(b[3] for b, _, _ in tiles)
+    assert (west, north) == (BBOX[0], BBOX[3])
+    assert east == pytest.approx(BBOX[2], abs=1e-12)
+    assert south == pytest.approx(BBOX[1], abs=1e-12)
+
+
+def test_stitched_fetch_equals_single_request(loader, fake_hub):
+    single = _stack(loader.fetch_data(BBOX, IMAGE_SIZE, TIME_INTERVAL))
+    assert fake_hub.requests == 1
+
+    loader.MAX_REQUEST_SIZE = TILE_SIZE
+    stitched = _stack(loader.fetch_data(BBOX, IMAGE_SIZE, TIME_INTERVAL, max_workers=3))
+    assert fake_hub.requests == 1 + len(SentinelDataLoader.plan_tiles(BBOX, IMAGE_SIZE, TILE_SIZE))
+
+    np.testing.assert_array_equal(single, _expected_bands(*IMAGE_SIZE))
+    np.testing.assert_array_equal(stitched, single)
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_tiled_fetch_respects_max_workers(loader, fake_hub, max_workers):
+    loader.MAX_REQUEST_SIZE = TILE_SIZE
+    loader.fetch_data(BBOX, IMAGE_SIZE, TIME_INTERVAL, max_workers=max_workers)
+
+    assert fake_hub.max_in_flight <= max_workers
+    if max_workers > 1:
+        # Sześć kafelków po RESPONSE_DELAY_S: przy kilku wątkach zapytania się
+        # nakładają (ile dokładnie - zależy od planisty, więc tylko "więcej niż 1").
+        assert fake_hub.max_in_flight > 1
@@ -0,0 +1,147 @@
+# tests/test_prefetcher.py
+#
+# Prefetch sąsiednich widoków: przewidywanie obszarów, anulowanie całej
+# generacji zadań przy zmianie widoku, pauza i budżet zapytań. `fetch` to
+# funkcja testowa zamiast Sentinel Hub; sceny trafiają do prawdziwego cache.
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from src.core.cancellation import CancellationToken
+from src.core.data_loader.prefetcher import PREFETCH_MARGIN, Prefetcher, predict_viewports
+from src.core.io.scene_cache import SceneCache
+
+BBOX = (20.0, 50.0, 20.1, 50.1)
+SIZE = (40, 40)
+INTERVAL = ("2025-06-01", "2025-06-30")
+ZOOM = 12
+TIMEOUT_S = 5.0
+
+
+def _bands(size) -> dict:
+    width, height = size
+    bands = {name: np.full((height, width), 1000, dtype=np.uint16) for name in ("B04", "B08", "B11")}
+    bands["dataMask"] = np.ones((height, width), dtype=np.uint16)
+    return bands
+
+
+def _wait_for(condition, timeout: float = TIMEOUT_S):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("Przekroczono czas oczekiwania.")
+        time.sleep(0.01)
+
+
+class FakeFetch:
+    """Zapisuje zapytania; pierwsze (opcjonalnie) czeka na anulowanie swojego tokenu."""
+
+    def __init__(self, block_first: bool = False):
+        self.calls = []
+        self.block_first = block_first
+        self.started = threading.Event()
+        self._lock = threading.Lock()
+
+    def __call__(self, bbox, size, time_interval, cancel_token: CancellationToken):
+        with self._lock:
+            self.calls.append((bbox, size, cancel_token))
+            first = len(self.calls) == 1
+        self.started.set()
+        if first and self.block_first:
+            _wait_for(lambda: cancel_token.cancelled)
+        return _bands(size)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SceneCache(str(tmp_path))
+
+
+def _prefetcher(fetch, cache, **kwargs):
+    prefetcher = Prefetcher(fetch, cache, delay_s=0.0, **kwargs)
+    prefetcher.set_enabled(True)
+    return prefetcher
+
+
+def test_predictions_follow_movement():
+    assert predict_viewports(BBOX, SIZE, ZOOM, previous=(BBOX, ZOOM - 1)) == []
+
+    (zoomed_out, size), = predict_viewports(BBOX, SIZE, ZOOM, previous=(BBOX, ZOOM + 1))
+    assert size == (round(SIZE[0] * 2 * PREFETCH_MARGIN),) * 2
+    assert zoomed_out[0] < BBOX[0] and zoomed_out[2] > BBOX[2]
+
+    moved_east = (20.1, 50.0, 20.2, 50.1)
+    predictions = predict_viewports(moved_east, SIZE, ZOOM, previous=(BBOX, ZOOM))
+    # Najpierw dalej w kierunku ruchu.
+    first_bbox, _ = predictions[0]
+    assert first_bbox[0] > moved_east[0] and first_bbox[1] < moved_east[1] < first_bbox[3]
+    assert len(predict_viewports(BBOX, SIZE, ZOOM)) == 3
+
+
+def test_new_view_cancels_previous_generation(cache):
+    fetch = FakeFetch(block_first=True)
+    prefetcher = _prefetcher(fetch, cache)
+    try:
+        prefetcher.update_view(BBOX, SIZE, INTERVAL, ZOOM)
+        assert fetch.started.wait(TIMEOUT_S)
+        first_token = fetch.calls[0][2]
+
+        prefetcher.update_view((20.5, 50.5, 20.6, 50.6), SIZE, INTERVAL, ZOOM)
+        assert first_token.cancelled
+        _wait_for(lambda: prefetcher.stats().get("fetched") == 3)
+        stats = prefetcher.stats()
+        assert not any(token.cancelled for _, _, token in fetch.calls[1:])
+    finally:
+        prefetcher.shutdown()
+
+    # Anulowane: trwające pobieranie (wynik porzucony) i dwa oczekujące zadania.
+    assert stats["cancelled"] == 3
+    assert stats["pending"] == 0
+    first_bbox, first_size, _ = fetch.calls[0]
+    assert not cache.covers(first_bbox, first_size, INTERVAL)
+    for bbox, size, token in fetch.calls[1:]:
+        assert token is not first_token
+        assert cache.covers(bbox, size, INTERVAL)
+
+
+def test_pause_and_request_budget(cache):
+    fetch = FakeFetch()
+    prefetcher = _prefetcher(fetch, cache, requests_per_hour=2)
+    try:
+        prefetcher.pause()
+        prefetcher.update_view(BBOX, SIZE, INTERVAL, ZOOM)
+        time.sleep(0.2)
+        assert fetch.calls == []
+        prefetcher.resume()
+
+        # Budżet dwóch zapytań: trzecie przewidywanie jest porzucane.
+        _wait_for(lambda: prefetcher.stats().get("over_budget") == 1)
+        stats = prefetcher.stats()
+    finally:
+        prefetcher.shutdown()
+    prefetcher._thread.join(TIMEOUT_S)
+
+    assert not prefetcher._thread.is_alive()
+    assert len(fetch.calls) == 2
+    assert (stats["fetched"], stats["pending"]) == (2, 0)
+
+
+def test_cached_areas_are_not_fetched_again(cache):
+    first = _prefetcher(FakeFetch(), cache)
+    try:
+        first.update_view(BBOX, SIZE, INTERVAL, ZOOM)
+        _wait_for(lambda: first.stats().get("fetched") == 3)
+    finally:
+        first.shutdown()
+
+    fetch = FakeFetch()
+    second = _prefetcher(fetch, cache)
+    try:
+        second.update_view(BBOX, SIZE, INTERVAL, ZOOM)
+        _wait_for(lambda: second.stats().get("already_cached") == 3)
+    finally:
+        second.shutdown()
+    assert fetch.calls == []
@@ -0,0 +1,79 @@
+# tests/test_quantization.py
+#
+# Wyniki skwantyzowane (int16/uint8): błąd zaokrąglenia, obcinanie do
+# zakresu i brak danych po przejściu quantize -> dequantize.
+
+import numpy as np
+import pytest
+
+from src.core.processing.quantization import (
+    QUANTIZED_FORMATS,
+    RESULT_DTYPES,
+    dequantize,
+    fill_nodata,
+    max_error,
+    quantize,
+    quantize_into,
+    quantized_format,
+    validate_result_dtype,
+)
+
+
+def _range(result_dtype: str):
+    fmt = QUANTIZED_FORMATS[result_dtype]
+    return (fmt["q_min"] - fmt["zero"]) * fmt["scale"], (fmt["q_max"] - fmt["zero"]) * fmt["scale"]
+
+
+@pytest.mark.parametrize("result_dtype", list(QUANTIZED_FORMATS))
+def test_round_trip_error_within_half_step(result_dtype):
+    low, high = _range(result_dtype)
+    values = np.random.default_rng(0).uniform(low, high, 100_000).astype(np.float32)
+    values[:3] = (low, high, 0.0)
+
+    quantized = quantize(values, result_dtype)
+    assert quantized.dtype == QUANTIZED_FORMATS[result_dtype]["dtype"]
+    restored = dequantize(quantized)
+    assert restored.dtype == np.float32
+    # Zapas na zaokrąglenia float32 przy największych wartościach zakresu.
+    float32_slack = 4 * np.spacing(np.float32(high))
+    assert np.abs(restored - values).max() <= max_error(result_dtype) + float32_slack
+    assert restored[2] == 0.0
+
+
+@pytest.mark.parametrize("result_dtype", list(QUANTIZED_FORMATS))
+def test_out_of_range_is_clipped_and_nan_is_nodata(result_dtype):
+    fmt = QUANTIZED_FORMATS[result_dtype]
+    low, high = _range(result_dtype)
+    values = np.array([low - 10, high + 10, np.nan, -np.inf, np.inf], dtype=np.float32)
+
+    quantized = quantize(values, result_dtype)
+    assert quantized.tolist()[:3] == [fmt["q_min"], fmt["q_max"], fmt["nodata"]]
+    assert quantized.tolist()[3:] == [fmt["q_min"], fmt["q_max"]]
+    restored = dequantize(quantized)
+    np.testing.assert_allclose(restored[:2], [low, high], rtol=1e-6)
+    assert np.isnan(restored[2])
+    # Dane nigdy nie zamieniają się w brak danych.
+    assert (quantize(np.linspace(low - 1, high + 1, 1000, dtype=np.float32), result_dtype) != fmt["nodata"]).all()
+
+
+@pytest.mark.parametrize("result_dtype", RESULT_DTYPES)
+def test_quantize_into_tile_and_fill_nodata(result_dtype):
+    dtype = validate_result_dtype(result_dtype)
+    values = np.linspace(-1, 1, 64, dtype=np.float32).reshape(8, 8)
+    out = np.zeros((16, 16), dtype=dtype)
+    quantize_into(values, out[4:12, 4:12])
+    fill_nodata(out[4:12, 4:12], values < -0.9)
+
+    restored = dequantize(out[4:12, 4:12])
+    assert np.isnan(restored[values < -0.9]).all()
+    np.testing.assert_allclose(restored[values >= -0.9], values[values >= -0.9], atol=max_error(result_dtype) + 1e-7)
+    assert (out[:4] == 0).all()
+
+
+def test_float32_passes_through_and_unknown_dtype_is_rejected():
+    values = np.array([0.25, np.nan], dtype=np.float32)
+    assert quantized_format(values.dtype) is None
+    assert dequantize(values) is values
+    assert max_error("float32") == 0.0
+    with pytest.raises(ValueError):
+        validate_result_dtype("float16")
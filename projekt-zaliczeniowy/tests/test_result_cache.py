@@ -0,0 +1,149 @@
+# tests/test_result_cache.py
+#
+# Dwupoziomowa pamięć wyników: RAM i skwantyzowane GeoTIFF-y na dysku, typ
+# wyniku zgodny z kluczem, a wyniki w pamięci współdzielonej wypadające
+# z RAM muszą zwalniać swoje segmenty.
+
+import os
+
+import numpy as np
+import pytest
+
+from src.core.io.result_cache import ResultCache
+from src.core.processing import shared_result
+from src.core.processing.quantization import dequantize, quantize
+from src.core.processing.shared_result import SharedResult
+
+BBOX = (20.0, 50.0, 20.01, 50.01)
+SHAPE = (64, 64)
+SHM_DIR = "/dev/shm"
+
+
+def _shared(value: float) -> SharedResult:
+    result = SharedResult(SHAPE, np.float32)
+    result.array[:] = value
+    return result
+
+
+def _live_segments(results) -> int:
+    return sum(os.path.exists(os.path.join(SHM_DIR, r.name)) for r in results)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    # Miejsce na dokładnie trzy wyniki w RAM.
+    cache = ResultCache(str(tmp_path), max_memory_bytes=3 * SHAPE[0] * SHAPE[1] * 4)
+    yield cache
+    cache.flush()
+
+
+def _values(seed: int = 0) -> np.ndarray:
+    values = np.random.default_rng(seed).uniform(-1, 1, SHAPE).astype(np.float32)
+    values[:4, :4] = np.nan
+    return values
+
+
+def test_memory_hit_then_disk_hit_in_new_session(tmp_path):
+    values = _values()
+    cache = ResultCache(str(tmp_path))
+    key = cache.make_key("scene", "NDVI")
+    assert key == cache.make_key("scene", "(B08 - B04) / (B08 + B04)")
+    assert cache.get(key) is None
+    cache.put(key, values, BBOX)
+    np.testing.assert_array_equal(cache.get(key), values)
+    cache.flush()
+
+    # Nowa sesja: pusty RAM, wynik odczytany z dysku i przeniesiony do RAM.
+    reopened = ResultCache(str(tmp_path))
+    restored = reopened.get(key)
+    assert restored.dtype == np.float32
+    # Kwantyzacja do int16 w zakresie wyniku: błąd <= pół kroku.
+    step = (np.nanmax(values) - np.nanmin(values)) / 65534
+    np.testing.assert_allclose(restored, values, atol=step, equal_nan=True)
+    assert reopened.get(key) is restored
+    stats = reopened.stats()
+    assert (stats["disk_hits"], stats["memory_hits"]) == (1, 1)
+    assert cache.stats()["misses"] == 1
+
+
+@pytest.mark.parametrize("precision", ["int16", "uint8"])
+def test_quantized_results_keep_their_dtype_on_disk(tmp_path, precision):
+    quantized = quantize(_values(), precision)
+    cache = ResultCache(str(tmp_path))
+    key = cache.make_key("scene", "NDVI", precision)
+    cache.put(key, quantized, BBOX)
+    cache.flush()
+
+    restored = ResultCache(str(tmp_path)).get(key)
+    assert restored.dtype == quantized.dtype
+    np.testing.assert_array_equal(restored, quantized)
+    # Ta sama scena i wskaźnik w innej precyzji to osobny wpis.
+    assert ResultCache(str(tmp_path)).get(cache.make_key("scene", "NDVI")) is None
+
+
+def test_float32_key_reads_back_float32_from_quantized_file(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    float_key = cache.make_key("scene", "NDVI", "float32")
+    int_key = cache.make_key("scene", "NDVI", "int16")
+    cache.put(float_key, _values(), BBOX)
+    cache.put(int_key, quantize(_values(), "int16"), BBOX)
+    cache.flush()
+
+    reopened = ResultCache(str(tmp_path))
+    assert reopened.get(float_key).dtype == np.float32
+    assert reopened.get(int_key).dtype == np.int16
+    np.testing.assert_allclose(
+        dequantize(reopened.get(int_key)), reopened.get(float_key), atol=1e-4, equal_nan=True
+    )
+
+
+def test_disk_tier_is_bounded(tmp_path):
+    probe = ResultCache(str(tmp_path / "probe"))
+    probe.put(probe.make_key("scene", "NDVI"), _values(), BBOX)
+    probe.flush()
+    entry_bytes = sum(f.stat().st_size for f in (tmp_path / "probe" / "results").iterdir())
+
+    cache = ResultCache(str(tmp_path / "cache"), max_disk_bytes=int(entry_bytes * 2.5))
+    for i in range(5):
+        cache.put(cache.make_key(f"scene{i}", "NDVI"), _values(i), BBOX)
+    cache.flush()
+    files = list((tmp_path / "cache" / "results").iterdir())
+    assert len(files) <= 3
+    assert cache.stats()["disk_evictions"] >= 2
+
+
+@pytest.mark.skipif(not os.path.isdir(SHM_DIR), reason="brak /dev/shm")
+def test_evicted_shared_results_release_their_segments(cache):
+    results = []
+    for i in range(10):
+        result = _shared(i)
+        results.append(result)
+        cache.put(cache.make_key("scene", "NDVI", f"p{i}"), result, BBOX)
+        assert _live_segments(results) <= 3
+    cache.flush()
+
+    assert cache.stats()["memory_evictions"] == 7
+    assert all(r.closed for r in results[:7])
+    assert not any(r.closed for r in results[7:])
+    # Zapis w tle trzymał widoki - po jego zakończeniu nic nie zostaje osierocone.
+    _shared(0).close()
+    assert shared_result._orphaned_segments == []
+
+
+@pytest.mark.skipif(not os.path.isdir(SHM_DIR), reason="brak /dev/shm")
+def test_view_held_by_consumer_outlives_eviction(cache):
+    first = _shared(0.25)
+    cache.put(cache.make_key("scene", "NDVI", "first"), first, BBOX)
+    view = cache.get(cache.make_key("scene", "NDVI", "first"))
+    assert not isinstance(view, SharedResult)
+
+    for i in range(3):
+        cache.put(cache.make_key("scene", "NDVI", f"p{i}"), _shared(i), BBOX)
+    cache.flush()
+
+    assert first.closed
+    assert not os.path.exists(os.path.join(SHM_DIR, first.name))
+    np.testing.assert_array_equal(view, np.full(SHAPE, 0.25, np.float32))
+    del view
+    _shared(0).close()
+    assert shared_result._orphaned_segments == []
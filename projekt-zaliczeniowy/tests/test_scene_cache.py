@@ -0,0 +1,122 @@
+# tests/test_scene_cache.py
+#
+# Cache scen: trafienia dokładne i przestrzenne (R-tree, tolerancja
+# rozdzielczości), usuwanie LRU oraz scena znikająca w trakcie odczytu.
+
+import os
+import stat
+
+import numpy as np
+import pytest
+
+from src.core.io import scene_cache as scene_cache_module
+from src.core.io.data_reader import read_geotiff_bands, sidecar_path
+from src.core.io.data_writer import OUTPUT_FILE_MODE, save_band_sidecar
+from src.core.io.scene_cache import RESOLUTION_TOLERANCE, SceneCache
+
+BBOX = (20.0, 50.0, 20.2, 50.2)
+SIZE = (200, 200)
+INTERVAL = ("2025-06-01", "2025-06-30")
+ZOOM = 12
+
+
+def _bands(seed: int, size=SIZE) -> dict:
+    rng = np.random.default_rng(seed)
+    width, height = size
+    bands = {name: rng.integers(1, 3000, (height, width), dtype=np.uint16) for name in ("B04", "B08", "B11")}
+    bands["dataMask"] = np.ones((height, width), dtype=np.uint16)
+    return bands
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SceneCache(str(tmp_path))
+
+
+def test_exact_hit_and_miss(cache):
+    bands = _bands(0)
+    path = cache.put(bands, BBOX, SIZE, INTERVAL, ZOOM)
+    assert stat.S_IMODE(os.stat(path).st_mode) == OUTPUT_FILE_MODE
+
+    cached = cache.get(BBOX, SIZE, INTERVAL, ZOOM)
+    for name, band in bands.items():
+        np.testing.assert_array_equal(cached[name], band)
+    assert cache.get(BBOX, SIZE, ("2025-07-01", "2025-07-31"), ZOOM) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_spatial_hit_respects_resolution_tolerance(cache):
+    bands = _bands(0)
+    cache.put(bands, BBOX, SIZE, INTERVAL, ZOOM)
+    # Piksel sceny: 0.001 stopnia; wycinek 0.05 x 0.05 stopnia.
+    sub_bbox = (20.05, 50.05, 20.1, 50.1)
+    same = cache.get(sub_bbox, (50, 50), INTERVAL, ZOOM + 2)
+    np.testing.assert_array_equal(same["B08"], bands["B08"][100:150, 50:100])
+
+    # Żądany piksel mniejszy o mniej niż tolerancję - nadal trafienie.
+    finer = int(50 * (1 + RESOLUTION_TOLERANCE / 2))
+    assert cache.get(sub_bbox, (finer, finer), INTERVAL, ZOOM + 2) is not None
+    # Wyraźnie drobniejszy piksel albo obszar wykraczający poza scenę - chybienie.
+    assert cache.get(sub_bbox, (60, 60), INTERVAL, ZOOM + 2) is None
+    assert cache.get((20.15, 50.05, 20.25, 50.1), (100, 50), INTERVAL, ZOOM + 2) is None
+
+    stats = cache.stats()
+    assert (stats["spatial_hits"], stats["misses"]) == (2, 2)
+    assert cache.covers(sub_bbox, (50, 50), INTERVAL)
+
+
+def test_lru_eviction_keeps_recently_used(tmp_path):
+    probe = SceneCache(str(tmp_path / "probe"))
+    scene_bytes = os.path.getsize(probe.put(_bands(0), BBOX, SIZE, INTERVAL, ZOOM))
+    cache = SceneCache(str(tmp_path / "cache"), max_bytes=int(scene_bytes * 2.5))
+
+    intervals = [(f"2025-0{m}-01", f"2025-0{m}-28") for m in range(1, 5)]
+    for seed, interval in enumerate(intervals[:2]):
+        cache.put(_bands(seed), BBOX, SIZE, interval, ZOOM)
+    cache.get(BBOX, SIZE, intervals[0], ZOOM)  # pierwsza scena używana ostatnio
+    cache.put(_bands(2), BBOX, SIZE, intervals[2], ZOOM)
+    cache.put(_bands(3), BBOX, SIZE, intervals[3], ZOOM)
+
+    assert cache.stats()["evictions"] == 2
+    assert cache.stats()["total_bytes"] <= cache.max_bytes
+    assert cache.get(BBOX, SIZE, intervals[1], ZOOM) is None
+    assert cache.get(BBOX, SIZE, intervals[3], ZOOM) is not None
+
+
+def test_scene_removed_during_read_is_a_miss(cache, monkeypatch):
+    path = cache.put(_bands(0), BBOX, SIZE, INTERVAL, ZOOM)
+
+    def evicted_meanwhile(filepath, *args, **kwargs):
+        # Inny proces usuwa plik między transakcją a odczytem.
+        os.remove(filepath)
+        return read_geotiff_bands(filepath, *args, **kwargs)
+
+    monkeypatch.setattr(scene_cache_module, "read_geotiff_bands", evicted_meanwhile)
+    assert cache.get(BBOX, SIZE, INTERVAL, ZOOM) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (0, 1, 0)
+    assert not os.path.exists(path)
+
+
+def test_sidecar_read_honours_out(tmp_path):
+    cache = SceneCache(str(tmp_path), use_sidecars=True)
+    bands = _bands(0)
+    path = cache.put(bands, BBOX, SIZE, INTERVAL, ZOOM)
+    cache.get(BBOX, SIZE, INTERVAL, ZOOM)
+    assert os.path.exists(sidecar_path(path))
+
+    mapped = read_geotiff_bands(path)
+    assert isinstance(mapped["B04"], np.memmap)
+    out = np.empty((4, SIZE[1], SIZE[0]), dtype=np.uint16)
+    read = read_geotiff_bands(path, out=out)
+    assert all(np.shares_memory(read[name], out) for name in read)
+    np.testing.assert_array_equal(read["B11"], bands["B11"])
+    with pytest.raises(ValueError):
+        read_geotiff_bands(path, out=np.empty((4, 2, 2), dtype=np.uint16))
+
+
+def test_atomic_sidecar_has_default_mode(tmp_path):
+    path = str(tmp_path / "scene.tif")
+    sidecar = save_band_sidecar(_bands(0), path)
+    assert stat.S_IMODE(os.stat(sidecar).st_mode) == OUTPUT_FILE_MODE
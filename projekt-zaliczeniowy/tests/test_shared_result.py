@@ -0,0 +1,85 @@
+# tests/test_shared_result.py
+#
+# Czas życia wyników w pamięci współdzielonej: zwolnienie przez close(),
+# `with` i GC, widoki trwające dłużej niż wynik oraz wyniki puli procesów
+# zapisywane bez końcowej kopii.
+
+import gc
+import os
+
+import numpy as np
+import pytest
+
+from src.core.processing import cpu_index_calculator, shared_result
+from src.core.processing.shared_result import SharedResult
+
+SHM_DIR = "/dev/shm"
+
+pytestmark = pytest.mark.skipif(not os.path.isdir(SHM_DIR), reason="brak /dev/shm")
+
+
+def _exists(name: str) -> bool:
+    return os.path.exists(os.path.join(SHM_DIR, name))
+
+
+def _orphaned_names() -> list:
+    return [segment.name for segment in shared_result._orphaned_segments]
+
+
+def test_close_with_and_gc_release_the_segment():
+    result = SharedResult((8, 8), np.int16)
+    name = result.name
+    assert _exists(name) and result.dtype == np.int16
+    result.close()
+    result.close()  # wielokrotne zamknięcie jest bezpieczne
+    assert result.closed and not _exists(name)
+    with pytest.raises(ValueError):
+        np.asarray(result)
+
+    with SharedResult((8, 8)) as result:
+        name = result.name
+    assert not _exists(name)
+
+    result = SharedResult((8, 8))
+    name = result.name
+    del result
+    gc.collect()
+    assert not _exists(name)
+
+
+def test_views_stay_valid_after_close():
+    result = SharedResult((4, 4))
+    result.array[:] = 7.0
+    view = np.asarray(result)[1:3]
+    copy = np.asarray(result, copy=True)
+    name = result.name
+    result.close()
+
+    # Nazwa znika od razu, mapowanie żyje do zniknięcia widoku.
+    assert not _exists(name)
+    assert (view == 7.0).all() and (copy == 7.0).all()
+    assert name in _orphaned_names()
+    del view
+    SharedResult((1,)).close()
+    assert name not in _orphaned_names()
+
+
+def test_process_pool_writes_directly_into_shared_results():
+    bands = {name: np.full((64, 64), value, dtype=np.uint16) for name, value in (("B04", 1000), ("B08", 3000), ("B11", 2000))}
+    bands["dataMask"] = np.ones((64, 64), dtype=np.uint16)
+    try:
+        results, _ = cpu_index_calculator.calculate_indices(bands, ["NDVI", "NDMI"], n_jobs=1, return_shared=True)
+        target = SharedResult((64, 64))
+        given, _ = cpu_index_calculator.calculate_index(bands, "NDVI", n_jobs=1, out=target)
+    finally:
+        cpu_index_calculator.shutdown_pool()
+
+    assert all(isinstance(result, SharedResult) for result in results.values())
+    np.testing.assert_allclose(np.asarray(results["NDVI"]), 0.5)
+    np.testing.assert_allclose(np.asarray(results["NDMI"]), 0.2)
+    assert given is target
+    np.testing.assert_allclose(np.asarray(target), 0.5)
+    names = [result.name for result in results.values()] + [target.name]
+    for result in list(results.values()) + [target]:
+        result.close()
+    assert not any(_exists(name) for name in names)
@@ -0,0 +1,63 @@
+# tests/test_streaming.py
+#
+# Strumieniowanie okno po oknie musi dawać to samo co obliczenie całej
+# sceny w pamięci, a nieudany strumień nie może zostawić pliku wynikowego.
+
+import os
+
+import numpy as np
+import pytest
+import rasterio
+
+from src.core.io.data_writer import save_bands_to_geotiff
+from src.core.processing import cpu_single_thread_calculator, streaming
+from src.core.processing.quantization import dequantize
+
+BBOX = (20.0, 50.0, 20.1, 50.1)
+# Boki nie są wielokrotnościami bloków pliku ani okien strumienia.
+SHAPE = (300, 420)
+INDICES = ["NDVI", "NDMI"]
+
+
+@pytest.fixture
+def scene(tmp_path):
+    rng = np.random.default_rng(0)
+    bands = {name: rng.integers(1, 3000, SHAPE, dtype=np.uint16) for name in ("B04", "B08", "B11")}
+    mask = np.ones(SHAPE, dtype=np.uint16)
+    mask[50:120, 80:300] = 0
+    bands["dataMask"] = mask
+    path = str(tmp_path / "scene.tif")
+    save_bands_to_geotiff(bands, BBOX, path)
+    return bands, path
+
+
+@pytest.mark.parametrize("result_dtype", ["float32", "int16", "uint8"])
+def test_stream_equals_in_memory(scene, tmp_path, result_dtype):
+    bands, path = scene
+    expected, _ = cpu_single_thread_calculator.calculate_indices(bands, INDICES, result_dtype=result_dtype)
+
+    out = str(tmp_path / "out.tif")
+    seen = []
+    streaming.stream_indices_to_geotiff(
+        path, out, INDICES, n_jobs=2, window_pixels=128 * 128, result_dtype=result_dtype,
+        on_window=lambda window, result: seen.append(window),
+    )
+    assert len(seen) > 1
+    with rasterio.open(out) as dst:
+        assert dst.count == len(INDICES)
+        for band, index_type in enumerate(INDICES, start=1):
+            np.testing.assert_array_equal(
+                dequantize(dst.read(band)), dequantize(expected[index_type]), strict=False
+            )
+
+
+def test_failed_stream_leaves_no_output(scene, tmp_path):
+    _, path = scene
+    out = str(tmp_path / "out.tif")
+
+    def fail(window, result):
+        raise RuntimeError("zapis przerwany")
+
+    with pytest.raises(RuntimeError, match="zapis przerwany"):
+        streaming.stream_indices_to_geotiff(path, out, INDICES, n_jobs=2, window_pixels=128 * 128, on_window=fail)
+    assert os.listdir(tmp_path) == ["scene.tif"]
@@ -0,0 +1,86 @@
+# tests/test_tile_overlay.py
+#
+# Serwer nakładki pobiera kafelki podkładu z lokalnego serwera HTTP
+# (jednolity kolor) i nakłada na nie wynik - sprawdzane przez HTTP, tak
+# jak pobiera je TkinterMapView.
+
+import io
+import math
+import threading
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.gui.utils.display_pyramid import DisplayPyramid
+from src.gui.utils.tile_overlay import TileOverlayServer
+
+BASE_COLOR = (10, 200, 30)
+BBOX = (20.0, 50.0, 20.05, 50.03)
+ZOOM = 14
+
+
+def _tile_xy(lon: float, lat: float, z: int):
+    n = 2 ** z
+    return int((lon + 180) / 360 * n), int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+
+
+@pytest.fixture
+def base_server():
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            buf = io.BytesIO()
+            Image.new("RGB", (256, 256), BASE_COLOR).save(buf, format="JPEG", quality=100)
+            body = buf.getvalue()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/{{z}}/{{x}}/{{y}}"
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def overlay(base_server):
+    server = TileOverlayServer(base_server)
+    yield server
+    server.shutdown()
+
+
+def _get(url: str, x: int, y: int) -> np.ndarray:
+    tile_url = url.replace("{z}", str(ZOOM)).replace("{x}", str(x)).replace("{y}", str(y))
+    with urllib.request.urlopen(tile_url) as response:
+        return np.asarray(Image.open(io.BytesIO(response.read())).convert("RGB"))
+
+
+def _is_base(tile: np.ndarray) -> bool:
+    return bool((np.abs(tile.astype(int) - BASE_COLOR) <= 2).all())
+
+
+def test_tiles_are_composited_on_base_and_cleared(overlay):
+    values = np.full((300, 300), 0.8, dtype=np.float32)
+    url = overlay.publish(DisplayPyramid(values, np.ones((300, 300), np.uint8)), BBOX, "NDVI")
+    x0, y0 = _tile_xy(BBOX[0], BBOX[3], ZOOM)
+    x1, _ = _tile_xy(BBOX[2], BBOX[1], ZOOM)
+
+    # "Przesuwanie" mapy wzdłuż wiersza kafelków: poza wynikiem sam podkład.
+    assert _is_base(_get(url, x0 - 2, y0))
+    assert _is_base(_get(url, x1 + 2, y0))
+    inside = _get(url, x0 + 1, y0)
+    assert not _is_base(inside)
+    # Ponowne pobranie (pamięć LRU) daje ten sam kafelek.
+    np.testing.assert_array_equal(_get(url, x0 + 1, y0), inside)
+    assert overlay.stats()["hits"] == 1
+
+    # Po wyczyszczeniu (albo nowym publish) stary adres zwraca sam podkład.
+    overlay.clear()
+    assert _is_base(_get(url, x0 + 1, y0))
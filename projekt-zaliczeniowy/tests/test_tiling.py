@@ -0,0 +1,69 @@
+# tests/test_tiling.py
+#
+# Dobór kształtu kafelka do L2 i grupowanie kafelków w paczki.
+
+import numpy as np
+import pytest
+
+from src.core.processing.tiling import (
+    BATCHES_PER_WORKER,
+    COLUMN_ALIGNMENT,
+    L2_FRACTION,
+    MIN_TILE_PIXELS,
+    batch_tiles,
+    choose_tile_shape,
+    plan_tiles,
+)
+
+L2 = 1024 * 1024
+BYTES_PER_PIXEL = 30
+
+
+@pytest.mark.parametrize("height, width", [(10000, 10000), (2000, 300), (7, 50000), (1, 1), (513, 100000)])
+@pytest.mark.parametrize("cache_bytes", [256 * 1024, L2, 8 * L2])
+def test_tile_fits_in_cache_budget(height, width, cache_bytes):
+    tile_h, tile_w = choose_tile_shape(height, width, BYTES_PER_PIXEL, cache_bytes)
+    budget = max(MIN_TILE_PIXELS, int(cache_bytes * L2_FRACTION) // BYTES_PER_PIXEL)
+
+    assert 1 <= tile_h <= height and 1 <= tile_w <= width
+    assert tile_h * tile_w <= budget
+    # Kafelek węższy niż obraz ma szerokość wyrównaną do linii cache.
+    if tile_w < width:
+        assert tile_w % COLUMN_ALIGNMENT == 0
+
+
+def test_full_width_tiles_for_ordinary_images():
+    tile_h, tile_w = choose_tile_shape(2000, 300, BYTES_PER_PIXEL, L2)
+    assert tile_w == 300
+    assert tile_h == int(L2 * L2_FRACTION) // BYTES_PER_PIXEL // 300
+
+
+def test_short_wide_image_uses_whole_budget():
+    # Niski obraz: jeden rząd kafelków, poszerzonych do wykorzystania budżetu.
+    tile_h, tile_w = choose_tile_shape(7, 50000, BYTES_PER_PIXEL, L2)
+    budget = int(L2 * L2_FRACTION) // BYTES_PER_PIXEL
+    assert tile_h == 7
+    assert tile_h * tile_w > budget // 2
+
+
+@pytest.mark.parametrize("height, width, tile_shape", [(301, 257, (64, 128)), (5, 5, (64, 64)), (1000, 3, (7, 3))])
+def test_plan_tiles_covers_image_once(height, width, tile_shape):
+    coverage = np.zeros((height, width), dtype=np.int32)
+    for rows, cols in plan_tiles(height, width, tile_shape):
+        assert rows.stop - rows.start <= tile_shape[0] and cols.stop - cols.start <= tile_shape[1]
+        coverage[rows, cols] += 1
+    assert (coverage == 1).all()
+
+
+@pytest.mark.parametrize("n_tiles", [0, 1, 5, 63, 64, 65, 1000])
+@pytest.mark.parametrize("n_jobs", [1, 4])
+def test_batches_keep_order_and_count(n_tiles, n_jobs):
+    tiles = plan_tiles(n_tiles, 1, (1, 1))
+    batches = batch_tiles(tiles, n_jobs)
+
+    assert [tile for batch in batches for tile in batch] == tiles
+    assert all(batches)
+    assert len(batches) <= max(1, n_jobs * BATCHES_PER_WORKER)
+    if n_tiles >= n_jobs * BATCHES_PER_WORKER:
+        # Dość paczek, aby procesy mogły równoważyć obciążenie.
+        assert len(batches) > n_jobs * BATCHES_PER_WORKER // 2
@@ -0,0 +1,127 @@
+# tests/test_time_series.py
+#
+# Analiza zmian: przyrostowe różnica i trend niezależne od kolejności dat
+# i zgodne z regresją liczoną wprost, pomijanie pikseli bez danych oraz
+# przebieg serii z pobieraniem, brakującymi datami i anulowaniem.
+
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from src.core.cancellation import CancellationToken, OperationCancelled
+from src.core.processing.quantization import quantize
+from src.core.processing.time_series import ChangeAccumulator, run_time_series, split_interval
+
+SHAPE = (6, 7)
+ORIGIN = date(2024, 1, 1)
+DATES = [date(2024, 1, 1), date(2024, 3, 15), date(2024, 6, 1), date(2024, 9, 20), date(2025, 1, 10)]
+
+
+def _series(seed: int = 0):
+    rng = np.random.default_rng(seed)
+    values = rng.uniform(-1, 1, (len(DATES),) + SHAPE).astype(np.float32)
+    masks = (rng.random((len(DATES),) + SHAPE) > 0.3).astype(np.uint8)
+    values[1, 0, 0] = np.nan  # NaN z obliczeń też jest brakiem danych
+    return values, masks
+
+
+def _reference(values, masks):
+    years = np.array([(d - ORIGIN).days / 365.25 for d in DATES])
+    difference = np.full(SHAPE, np.nan, dtype=np.float32)
+    trend = np.full(SHAPE, np.nan, dtype=np.float32)
+    for i, j in np.ndindex(SHAPE):
+        valid = (masks[:, i, j] != 0) & np.isfinite(values[:, i, j])
+        t, y = years[valid], values[valid, i, j]
+        if len(t) >= 2:
+            difference[i, j] = y[np.argmax(t)] - y[np.argmin(t)]
+            trend[i, j] = np.polyfit(t, y.astype(np.float64), 1)[0]
+    return difference, trend
+
+
+@pytest.mark.parametrize("order", [[0, 1, 2, 3, 4], [4, 2, 0, 3, 1]])
+def test_matches_direct_regression_in_any_order(order):
+    values, masks = _series()
+    accumulator = ChangeAccumulator(SHAPE, ORIGIN)
+    for k in order:
+        accumulator.add(DATES[k], values[k], masks[k])
+
+    difference, trend = _reference(values, masks)
+    np.testing.assert_allclose(accumulator.difference(), difference, atol=1e-6, equal_nan=True)
+    np.testing.assert_allclose(accumulator.trend(), trend, rtol=1e-4, atol=1e-5, equal_nan=True)
+    expected_count = ((masks != 0) & np.isfinite(values)).sum(axis=0)
+    np.testing.assert_array_equal(accumulator.count, expected_count)
+
+
+def test_pixels_with_fewer_than_two_dates_are_nan():
+    accumulator = ChangeAccumulator((1, 3), ORIGIN)
+    accumulator.add(DATES[0], np.array([[0.1, 0.2, 0.3]], np.float32), np.array([[1, 1, 0]]))
+    accumulator.add(DATES[2], np.array([[0.5, 0.2, 0.9]], np.float32), np.array([[1, 0, 0]]))
+
+    assert accumulator.count.tolist() == [[2, 1, 0]]
+    difference, trend = accumulator.difference(), accumulator.trend()
+    assert difference[0, 0] == pytest.approx(0.4)
+    assert trend[0, 0] > 0
+    assert np.isnan(difference[0, 1:]).all() and np.isnan(trend[0, 1:]).all()
+
+
+def test_quantized_values_are_dequantized():
+    values, masks = _series(1)
+    exact, quantized = ChangeAccumulator(SHAPE, ORIGIN), ChangeAccumulator(SHAPE, ORIGIN)
+    for k, when in enumerate(DATES):
+        exact.add(when, values[k], masks[k])
+        quantized.add(when, quantize(values[k], "int16"), masks[k])
+    np.testing.assert_allclose(quantized.difference(), exact.difference(), atol=1e-4, equal_nan=True)
+    np.testing.assert_allclose(quantized.trend(), exact.trend(), atol=1e-3, equal_nan=True)
+
+
+def test_split_interval():
+    parts = split_interval(("2024-01-01", "2024-12-31"), 4)
+    assert parts[0][0] == "2024-01-01" and parts[-1][1] == "2024-12-31"
+    for (_, end), (start, _) in zip(parts, parts[1:]):
+        assert date.fromisoformat(start) == date.fromisoformat(end) + timedelta(days=1)
+    with pytest.raises(ValueError):
+        split_interval(("2024-01-01", "2024-01-02"), 3)
+
+
+def _calculate(bands, index_types):
+    return {index_types[0]: bands["value"]}, bands["dataMask"]
+
+
+def test_run_time_series_skips_missing_dates():
+    intervals = split_interval(("2024-01-01", "2024-12-31"), 4)
+    level = {interval: float(k) for k, interval in enumerate(intervals)}
+
+    def fetch_scene(interval):
+        if interval == intervals[1]:
+            return None
+        return {"value": np.full(SHAPE, level[interval], np.float32), "dataMask": np.ones(SHAPE, np.uint8)}
+
+    progress = []
+    result = run_time_series(
+        fetch_scene, _calculate, intervals, "NDVI",
+        on_date=lambda interval, done, total, acc: progress.append((done, total)),
+        keep_dates=True,
+    )
+
+    assert result["intervals"] == [intervals[0], intervals[2], intervals[3]]
+    assert (result["count"] == 3).all()
+    np.testing.assert_allclose(result["difference"], 3.0)
+    # Wartość rośnie o 1 na kwartał, czyli ok. 4 na rok.
+    np.testing.assert_allclose(result["trend"], 4.0, rtol=0.05)
+    assert sorted(result["dates"]) == result["intervals"]
+    assert len(progress) == 3 and all(total == 4 for _, total in progress)
+
+
+def test_run_time_series_errors_and_cancellation():
+    intervals = split_interval(("2024-01-01", "2024-12-31"), 3)
+    with pytest.raises(ValueError):
+        run_time_series(lambda interval: None, _calculate, intervals, "NDVI")
+    with pytest.raises(ValueError):
+        run_time_series(lambda interval: None, _calculate, intervals[:1], "NDVI")
+
+    token = CancellationToken()
+    token.cancel()
+    scene = {"value": np.zeros(SHAPE, np.float32), "dataMask": np.ones(SHAPE, np.uint8)}
+    with pytest.raises(OperationCancelled):
+        run_time_series(lambda interval: scene, _calculate, intervals, "NDVI", cancel_token=token)